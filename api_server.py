@@ -0,0 +1,308 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from embedding_server import EmbeddingBatcher, QueueFullError
+from metadata_schema import INFO_PREFIX, build_where
+from retriever import Retriever
+import tracing
+from tracing import span
+
+
+class SearchService:
+    """
+    Retrieval operations behind the HTTP API, independent of any UI rendering.
+
+    Embedding requests from all handler threads go through one `EmbeddingBatcher`
+    running on a private event loop, so concurrent API calls share model batches.
+    Request image paths must lie under `image_root`; without one they are rejected.
+    """
+
+    def __init__(self, retriever, max_batch=16, max_wait_ms=5.0, max_queue=256, image_root=None):
+        self.retriever = retriever
+        self.image_root = os.path.realpath(image_root) if image_root else None
+        self.db = retriever.db
+        self.batcher = EmbeddingBatcher(retriever, max_batch=max_batch, max_wait_ms=max_wait_ms, max_queue=max_queue)
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="api-embedding-loop", daemon=True).start()
+
+    def resolve_image_path(self, image_path):
+        """The real path of a request's `image_path`, relative ones taken from `image_root`."""
+        if not image_path:
+            return None
+        if self.image_root is None:
+            raise ValueError("Image paths are disabled; start the server with --image-root")
+        if not isinstance(image_path, str):
+            raise ValueError("'image_path' must be a string")
+        path = os.path.realpath(os.path.join(self.image_root, image_path))
+        if os.path.commonpath([self.image_root, path]) != self.image_root:
+            raise ValueError("'image_path' must be inside the image root")
+        return path
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def search(self, query, image_path=None, top_k=5, filters=None, mode="dense"):
+        """`mode` is 'dense', 'sparse' (BM25 keywords, skips the model) or 'hybrid'."""
+        if not query and not image_path:
+            raise ValueError("At least one of 'query' or 'image_path' is required")
+        if mode not in ("dense", "sparse", "hybrid"):
+            raise ValueError(f"Unknown search mode '{mode}'. Choose from: dense, sparse, hybrid")
+        build_where(filters)  # reject malformed filters before paying for the embedding
+        image_path = self.resolve_image_path(image_path)
+        if mode == "sparse":
+            if image_path:
+                raise ValueError("Sparse search takes a text 'query' only")
+            return self.retriever.search_sparse(query, top_k=top_k, filters=filters)
+        with span("embed_query"):
+            query_embedding = self._run(self.batcher.embed_query(query, image_path))
+        if mode == "hybrid":
+            return self.retriever.search_hybrid_by_embedding(query, query_embedding, top_k=top_k, filters=filters)
+        return self.retriever.search_by_embedding(query_embedding, top_k=top_k, filters=filters)
+
+    def search_batch(self, queries, top_k=5, filters=None):
+        """
+        Embeds all queries concurrently through the batcher, then runs one multi-query index lookup.
+
+        Returns (results per query in input order, timings in ms of the embed and search stages),
+        like `Retriever.search_batch`, which this mirrors without bypassing the shared batcher.
+        """
+        if not isinstance(queries, list) or not all(isinstance(q, dict) for q in queries):
+            raise ValueError("'queries' must be a list of objects")
+        for q in queries:
+            if not q.get("query") and not q.get("image_path"):
+                raise ValueError("Every query needs 'query' or 'image_path'")
+        image_paths = [self.resolve_image_path(q.get("image_path")) for q in queries]
+        build_where(filters)
+
+        async def embed_all():
+            return await asyncio.gather(*[
+                self.batcher.embed_query(q.get("query"), image_path) for q, image_path in zip(queries, image_paths)
+            ])
+
+        t_start = time.perf_counter()
+        embeddings = self._run(embed_all())
+        t_embedded = time.perf_counter()
+        results = self.db.query_many(embeddings, top_k=top_k, filters=filters) if queries else {
+            'ids': [], 'metadatas': [], 'distances': []}
+        t_searched = time.perf_counter()
+        timings = {
+            "n_queries": len(queries),
+            "embed_ms": (t_embedded - t_start) * 1000,
+            "search_ms": (t_searched - t_embedded) * 1000,
+        }
+        return [
+            [(1 - distance, dict(metadata, id=item_id)) for item_id, metadata, distance in zip(ids, metadatas, distances)]
+            for ids, metadatas, distances in zip(results['ids'], results['metadatas'], results['distances'])
+        ], timings
+
+    def add(self, item):
+        item_type = item.get("type")
+        title, content = item.get("title"), item.get("content")
+        if item_type not in ("text", "image", "image-text") or not title:
+            raise ValueError("'type' (text, image or image-text) and 'title' are required")
+        image_path = self.resolve_image_path(item.get("image_path")) if item_type != "text" else None
+        if item_type != "text" and (not image_path or not os.path.isfile(image_path)):
+            raise ValueError(f"'image_path' must point to an existing file for type '{item_type}'")
+        if item_type != "image" and not content:
+            raise ValueError(f"'content' is required for type '{item_type}'")
+
+        with span("embed"):
+            embedding = self._run(self.batcher.embed(
+                text=content if item_type != "image" else None,
+                image=image_path if item_type != "text" else None,
+                is_query=False,
+            ))
+        extracted_info = item.get("extracted_info", {})
+        return self.db.add(
+            item_type, title, content if item_type != "image" else "", image_path if item_type != "text" else "",
+            item.get("url", ""), datetime.now().isoformat(), embedding,
+            extracted_info if isinstance(extracted_info, str) else json.dumps(extracted_info)
+        )
+
+    def get(self, item_id):
+        found = self.db.get_item_by_id(item_id)
+        if not found["ids"]:
+            return None
+        return dict(found["metadatas"][0], id=found["ids"][0])
+
+    def stats(self):
+        return {
+            "items": len(self.db.backend),
+            "batcher": self.batcher.get_stats(),
+            "query_cache": self.retriever.query_cache_stats(),
+        }
+
+
+def result_to_json(similarity, item):
+    """One search hit as a plain JSON object (image paths only, no inlined image bytes)."""
+    # The promoted filter columns duplicate `extracted_info`, so leave them out
+    item = {key: value for key, value in item.items() if not key.startswith(INFO_PREFIX)}
+    try:
+        item["extracted_info"] = json.loads(item.get("extracted_info") or "{}")
+    except (json.JSONDecodeError, TypeError):
+        pass
+    item["score"] = float(similarity)
+    return item
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive; every response carries a Content-Length
+    service = None
+    slots = None  # threading.BoundedSemaphore limiting in-flight requests
+    response_started = False  # set once status and headers of the current response are sent
+
+    def log_message(self, format, *args):
+        pass  # keep stdout quiet under load; errors are printed explicitly
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.response_started = True
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_text(self, status, text, content_type="text/plain; charset=utf-8"):
+        body = text.encode("utf-8")
+        self.response_started = True
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @tracing.traced("render")
+    def _send_json_list(self, head, items, tail):
+        """
+        Sends `head`, the comma-separated JSON `items`, then `tail` as one 200 response.
+
+        The whole body is serialized before the headers go out, so an item that fails to
+        serialize still gets a proper error response.
+        """
+        body = head + ",".join(json.dumps(item, ensure_ascii=False) for item in items) + tail
+        self._send_text(200, body, "application/json; charset=utf-8")
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not isinstance(body, dict):
+            raise ValueError("Request body must be a JSON object")
+        return body
+
+    def _handle(self, route):
+        if not self.slots.acquire(blocking=False):
+            self._send_json(503, {"error": "Too many concurrent requests"}, {"Retry-After": "1"})
+            return
+        self.response_started = False
+        try:
+            with tracing.trace_request("api." + route.__name__.lstrip("_")):
+                route()
+        except Exception as e:
+            if self.response_started:
+                # Part of a response is already on the wire; a second one would corrupt it
+                print(traceback.format_exc(), file=sys.stderr)
+                self.close_connection = True
+            elif isinstance(e, (ValueError, json.JSONDecodeError)):
+                self._send_json(400, {"error": str(e)})
+            elif isinstance(e, QueueFullError):
+                self._send_json(503, {"error": str(e)}, {"Retry-After": "1"})
+            else:
+                print(traceback.format_exc(), file=sys.stderr)
+                self._send_json(500, {"error": f"Internal error: {e}"})
+        finally:
+            self.slots.release()
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/stats":
+            self._send_json(200, self.service.stats())
+        elif self.path == "/metrics":
+            self._send_text(200, tracing.prometheus_text(), "text/plain; version=0.0.4; charset=utf-8")
+        elif self.path.startswith("/items/"):
+            self._handle(self._get_item)
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        routes = {"/search": self._search, "/search/batch": self._search_batch, "/items": self._add_item}
+        if self.path in routes:
+            self._handle(routes[self.path])
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def _search(self):
+        request = self._read_json()
+        results = self.service.search(request.get("query"), request.get("image_path"), int(request.get("top_k", 5)),
+                                      request.get("filters"), request.get("mode", "dense"))
+        self._send_json_list('{"results":[', (result_to_json(sim, item) for sim, item in results), "]}")
+
+    def _search_batch(self):
+        request = self._read_json()
+        batches, timings = self.service.search_batch(request.get("queries", []), int(request.get("top_k", 5)),
+                                                     request.get("filters"))
+        rows = ({"results": [result_to_json(sim, item) for sim, item in results]} for results in batches)
+        self._send_json_list('{"batches":[', rows, '],"timings":' + json.dumps(timings) + "}")
+
+    def _add_item(self):
+        item_id = self.service.add(self._read_json())
+        self._send_json(201, {"id": item_id})
+
+    def _get_item(self):
+        item = self.service.get(self.path[len("/items/"):])
+        if item is None:
+            self._send_json(404, {"error": "Item not found"})
+        else:
+            self._send_json(200, item)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON HTTP search API on top of Retriever and Database.")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="Interface to bind. The API has no authentication, so expose it with care.")
+    parser.add_argument("--port", type=int, default=10100)
+    parser.add_argument("--max-concurrency", type=int, default=64, help="In-flight requests before answering 503.")
+    parser.add_argument("--max-batch", type=int, default=16, help="Largest coalesced embedding batch.")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="How long to wait to fill an embedding batch.")
+    parser.add_argument("--max-queue", type=int, default=256, help="Queued embed requests before shedding load.")
+    parser.add_argument("--image-root",
+                        help="Directory request image paths are resolved in; paths outside it are rejected. "
+                             "Without it, requests cannot reference images.")
+    parser.add_argument("--backend", default="chroma", help="Vector backend (chroma, numpy, numpy-fp16, flat, int8, pq, matryoshka).")
+    parser.add_argument("--lazy-load", action="store_true",
+                        help="Load the embedding model on the first dense query; sparse queries never need it.")
+    parser.add_argument("--trace", action="store_true",
+                        help="Record per-stage spans, exported in Prometheus format at GET /metrics.")
+    parser.add_argument("--trace-log", help="With --trace, append one JSON line per request trace to this file.")
+    args = parser.parse_args()
+
+    if args.trace or args.trace_log:
+        tracing.configure(enabled=True, trace_log=args.trace_log)
+
+    retriever = Retriever(vector_backend=args.backend, lazy_load=args.lazy_load)
+    ApiHandler.service = SearchService(retriever, args.max_batch, args.max_wait_ms, args.max_queue, args.image_root)
+    ApiHandler.slots = threading.BoundedSemaphore(args.max_concurrency)
+    server = ThreadingHTTPServer((args.host, args.port), ApiHandler)
+    server.daemon_threads = True
+    print(f"Search API listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
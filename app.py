@@ -1,6 +1,5 @@
 import gradio as gr
 from retriever import Retriever
-from database import Database
 import shutil
 import os
 from PIL import Image
@@ -10,7 +9,14 @@ import json
 from functools import partial
 import base64
 from io import BytesIO
-from openai_extractor import extract_information
+from openai_extractor import AsyncExtractor
+from extraction_cache import ExtractionCache
+from embedding_server import EmbeddingBatcher, QueueFullError
+from thumbnails import ThumbnailCache, image_mime_type
+from metadata_schema import build_where
+import tracing
+from tracing import span, traced
+import asyncio
 
 # --- OpenAI Configuration ---
 # Modify these values as needed
@@ -18,6 +24,33 @@ OPENAI_API_KEY = ""  # Use environment variable by default
 OPENAI_BASE_URL = ""  # e.g., "https://api.example.com/v1"
 OPENAI_MODEL_NAME = "chatgpt-4o-latest"
 OPENAI_RETRY_TIMES = 10
+OPENAI_MAX_CONCURRENCY = 8
+OPENAI_REQUESTS_PER_MINUTE = 500
+OPENAI_TOKENS_PER_MINUTE = 200000
+# Results for identical text/image/model/prompt/schema are reused instead of re-requested
+EXTRACTION_CACHE_PATH = "extraction_cache.sqlite"
+EXTRACTION_CACHE_MAX_ENTRIES = 100000
+
+# --- Embedding Micro-Batching ---
+# Concurrent requests are coalesced into one model call
+EMBED_MAX_BATCH = 16
+EMBED_MAX_WAIT_MS = 5
+EMBED_MAX_QUEUE = 256
+# Gradio runs one call per event at a time by default; allow enough in flight to form batches
+HANDLER_CONCURRENCY_LIMIT = 32
+
+# --- Result Thumbnails ---
+# "inline": small base64 previews in the HTML; "url": <img> links to the cached thumbnail files
+THUMBNAIL_MODE = "inline"
+THUMBNAIL_DIR = "thumbnails"
+THUMBNAIL_MAX_SIDE = 512
+THUMBNAIL_URL_PREFIX = "/gradio_api/file="  # Gradio's static file route ("/file=" on Gradio 4)
+
+# --- Tracing & Metrics ---
+# Per-stage spans (embedding, model, database, extraction, rendering); off by default, nothing is recorded
+TRACING_ENABLED = os.environ.get("GME_TRACING", "") not in ("", "0")
+TRACE_LOG_PATH = os.environ.get("GME_TRACE_LOG", "")  # one JSON line per request when set
+METRICS_PORT = 10102  # Prometheus text at http://host:METRICS_PORT/metrics while tracing is enabled
 
 # --- Feedback Persistence ---
 SEARCH_FEEDBACK_FILE = "search_feedback.json"
@@ -47,9 +80,7 @@ def image_to_base64(image_path):
     try:
         with open(image_path, "rb") as image_file:
             encoded_string = base64.b64encode(image_file.read()).decode()
-        # You might need to adjust the mime type depending on your images
-        # Common types: image/jpeg, image/png, image/gif
-        mime_type = "image/png"
+        mime_type = image_mime_type(image_path) or "image/png"
         return f"data:{mime_type};base64,{encoded_string}"
     except Exception as e:
         print(f"Error converting image to base64: {e}")
@@ -60,13 +91,40 @@ def image_to_base64(image_path):
 if not os.path.exists("data"):
     os.makedirs("data")
 
-db = Database()
+if TRACING_ENABLED:
+    tracing.configure(enabled=True, trace_log=TRACE_LOG_PATH or None)
+    tracing.serve_metrics(METRICS_PORT)
+
 retriever = Retriever()
+db = retriever.db
+embedding_service = EmbeddingBatcher(
+    retriever, max_batch=EMBED_MAX_BATCH, max_wait_ms=EMBED_MAX_WAIT_MS, max_queue=EMBED_MAX_QUEUE
+)
+thumbnail_cache = ThumbnailCache(THUMBNAIL_DIR, max_side=THUMBNAIL_MAX_SIDE)
+extractor = AsyncExtractor(
+    api_key=OPENAI_API_KEY,
+    base_url=OPENAI_BASE_URL,
+    model_name=OPENAI_MODEL_NAME,
+    max_concurrency=OPENAI_MAX_CONCURRENCY,
+    requests_per_minute=OPENAI_REQUESTS_PER_MINUTE,
+    tokens_per_minute=OPENAI_TOKENS_PER_MINUTE,
+    max_retries=OPENAI_RETRY_TIMES,
+    cache=ExtractionCache(EXTRACTION_CACHE_PATH, max_entries=EXTRACTION_CACHE_MAX_ENTRIES),
+)
+
+
+def thumbnail_src(image_path):
+    """`src` for a result image: a cached thumbnail, inline or by URL depending on THUMBNAIL_MODE."""
+    if THUMBNAIL_MODE == "url":
+        return thumbnail_cache.url(image_path, THUMBNAIL_URL_PREFIX)
+    return thumbnail_cache.data_uri(image_path)
+
 
 # --- Functions for Gradio Interface ---
 
 
-def add_item(item_type, title, content, url, image_path):
+@traced("add", request=True)
+async def add_item(item_type, title, content, url, image_path):
     """Adds a new item to the database after generating its embedding and extracting info."""
     try:
         print(f"--- Received request to add item of type: {item_type} ---")
@@ -77,13 +135,13 @@ def add_item(item_type, title, content, url, image_path):
 
         embedding = None
         saved_image_path = None
-        final_content = content
         text_for_extraction = content
         image_for_extraction = None
 
         if item_type == "text":
             print(f"Generating text embedding for title: {title}")
-            embedding = retriever.get_text_embedding(content)
+            with span("embed"):
+                embedding = await embedding_service.embed(text=content, is_query=False)
             print("Text embedding generated successfully.")
 
         elif item_type == "image":
@@ -93,9 +151,9 @@ def add_item(item_type, title, content, url, image_path):
                 return error_msg, error_msg, title, content, url, image_path
             saved_image_path = os.path.join("data", os.path.basename(image_path))
             shutil.copy(image_path, saved_image_path)
-            final_content = saved_image_path
             print(f"Generating image embedding for image: {saved_image_path}")
-            embedding = retriever.get_image_embedding(saved_image_path)
+            with span("embed"):
+                embedding = await embedding_service.embed(image=saved_image_path, is_query=False)
             print("Image embedding generated successfully.")
             text_for_extraction = title
             image_for_extraction = saved_image_path
@@ -107,33 +165,34 @@ def add_item(item_type, title, content, url, image_path):
                 return error_msg, error_msg, title, content, url, image_path
             saved_image_path = os.path.join("data", os.path.basename(image_path))
             shutil.copy(image_path, saved_image_path)
-            final_content = f"{content} | {saved_image_path}"
-            print(f"Generating image-text embedding for: {final_content}")
-            embedding = retriever.get_image_text_embedding(saved_image_path, content)
+            print(f"Generating image-text embedding for: {content} | {saved_image_path}")
+            with span("embed"):
+                embedding = await embedding_service.embed(text=content, image=saved_image_path, is_query=False)
             print("Image-text embedding generated successfully.")
             text_for_extraction = content
             image_for_extraction = saved_image_path
 
+        if saved_image_path is not None:
+            # Generate the thumbnail now so the first search showing this item does not pay for it
+            with span("thumbnail"):
+                await asyncio.to_thread(thumbnail_cache.get, saved_image_path)
+
         if embedding is not None:
             print("--- Starting Information Extraction ---")
-            extracted_info = extract_information(
-                text=text_for_extraction,
-                image_path=image_for_extraction,
-                api_key=OPENAI_API_KEY,
-                base_url=OPENAI_BASE_URL,
-                model_name=OPENAI_MODEL_NAME,
-                retry_times=OPENAI_RETRY_TIMES,
-            )
+            extracted_info = await extractor.extract(text_for_extraction, image_for_extraction)
             extracted_info_json = json.dumps(extracted_info) if extracted_info else "{}"
             print(f"--- Extraction Complete. Result: {extracted_info_json} ---")
 
             current_date = datetime.now().isoformat()
             print(f"Adding item to database...")
-            db.add(item_type, title, final_content, url, current_date, embedding, extracted_info_json)
+            item_text = content if item_type != "image" else ""
+            await asyncio.to_thread(
+                db.add, item_type, title, item_text, saved_image_path or "", url, current_date, embedding, extracted_info_json
+            )
             print("Item added to database successfully.")
             added_details = (
                 f"Type: {item_type}\nTitle: {title}\n"
-                f"Content: {final_content}\nURL: {url}\nDate: {current_date}\n"
+                f"Content: {item_text}\nImage: {saved_image_path or 'N/A'}\nURL: {url}\nDate: {current_date}\n"
                 f"Extracted Info: {json.dumps(extracted_info, indent=2)}"
             )
             # On success, clear all input fields for the next entry
@@ -143,6 +202,10 @@ def add_item(item_type, title, content, url, image_path):
         print("Failed to add item because embedding was not generated.")
         return "Failed to add item. Check logs.", "", title, content, url, image_path
 
+    except QueueFullError as e:
+        print(f"Rejected add_item under load: {e}")
+        return "Server is busy, please try again shortly.", str(e), title, content, url, image_path
+
     except Exception as e:
         print("!!!!!!!! AN ERROR OCCURRED IN add_item !!!!!!!!")
         print(traceback.format_exc())
@@ -221,45 +284,39 @@ def format_extracted_info_html(info_json_str: str) -> str:
         return "<div style='background-color:#fff3cd; border-left: 4px solid #ffc107; padding: 10px; margin-top: 10px; font-size: 0.9em;'><strong>Note:</strong> Could not parse extracted information.</div>"
 
 
-def search_items(query, image_query_path, top_k):
-    """Performs a search and returns formatted results."""
-    # Convert Gradio temp path to a usable path
-    temp_image_path = image_query_path  # gr.Image with type="filepath" gives a string path
+def search_filters(item_types, date_from, date_to, primary_task, model_name, datasets):
+    """Builds the `filters` dict of a search from the filter inputs; empty inputs are ignored."""
+    filters = {
+        "type": list(item_types or []),
+        "date_from": (date_from or "").strip(),
+        "date_to": (date_to or "").strip(),
+        "primary_task": (primary_task or "").strip(),
+        "model_name": (model_name or "").strip(),
+        "datasets_used": [d.strip() for d in (datasets or "").split(",") if d.strip()],
+    }
+    return {key: value for key, value in filters.items() if value} or None
 
-    results = retriever.search(query, temp_image_path, int(top_k))
-
-    if not results:
-        # If no results, hide the feedback buttons
-        return "<p>No results found.</p>", gr.update(visible=False), gr.update(visible=False), gr.update(visible=False)
 
+@traced("render")
+async def render_results(results):
+    """HTML of the result cards of a search."""
     output_html = "<div>"
     for sim, item in results:
         output_html += "<div style='border: 1px solid #ccc; padding: 10px; margin-bottom: 10px; border-radius: 5px;'>"
         output_html += f"<h3>{item.get('title', 'N/A')} (Score: {sim:.4f})</h3>"
 
-        item_content = item.get("content", "")
-        item_type = item.get("type", "")
+        item_text = item.get("text", "")
+        img_path = item.get("image_path", "")
 
-        if item_type == "image" or item_type == "image-text":
-            img_path = ""
-            if "|" in item_content:
-                text_part, img_part = item_content.split("|", 1)
-                img_path = img_part.strip()
-                output_html += f"<p><b>Content:</b> {text_part.strip()}</p>"
-            else:
-                img_path = item_content
-
-            if os.path.exists(img_path):
-                base64_image = image_to_base64(img_path)
-                if base64_image:
-                    output_html += f"<div style='text-align:center;'><img src='{base64_image}' width='500' style='display:inline-block; margin-bottom:10px;'></div>"
-                else:
-                    output_html += f"<p><i>Could not display image at {img_path}</i></p>"
+        if item_text:
+            output_html += f"<p><b>Content:</b> {item_text}</p>"
+        if img_path:
+            # The thumbnail cache returns nothing for missing or unreadable files
+            image_src = await asyncio.to_thread(thumbnail_src, img_path)
+            if image_src:
+                output_html += f"<div style='text-align:center;'><img src='{image_src}' width='500' style='display:inline-block; margin-bottom:10px;'></div>"
             else:
-                output_html += f"<p><i>Image not found at {img_path}</i></p>"
-
-        else:  # text
-            output_html += f"<p><b>Content:</b> {item_content}</p>"
+                output_html += f"<p><i>Could not display image at {img_path}</i></p>"
 
         # --- Display Extracted Info ---
         extracted_info_html = format_extracted_info_html(item.get("extracted_info", "{}"))
@@ -270,7 +327,42 @@ def search_items(query, image_query_path, top_k):
         )
         output_html += f"<p><b>Date:</b> {item.get('date', 'N/A')}</p>"
         output_html += "</div>"
+    return output_html
 
+
+@traced("search", request=True)
+async def search_items(query, image_query_path, top_k, item_types=None, date_from="", date_to="",
+                       primary_task="", model_name="", datasets="", mode="dense"):
+    """Performs a search and returns formatted results."""
+    try:
+        filters = search_filters(item_types, date_from, date_to, primary_task, model_name, datasets)
+        build_where(filters)
+    except ValueError as e:
+        return f"<p>Invalid filter: {e}</p>", gr.update(visible=False), gr.update(visible=False), gr.update(visible=False)
+    # Convert Gradio temp path to a usable path
+    temp_image_path = image_query_path  # gr.Image with type="filepath" gives a string path
+
+    if not query and not temp_image_path:
+        results = []
+    elif mode == "sparse":
+        # Keyword search runs on the BM25 index only, no embedding needed
+        results = await asyncio.to_thread(retriever.search_sparse, query, int(top_k), filters)
+    else:
+        try:
+            with span("embed_query"):
+                query_embedding = await embedding_service.embed_query(query, temp_image_path)
+        except QueueFullError:
+            return "<p>Server is busy, please try again shortly.</p>", gr.update(visible=False), gr.update(visible=False), gr.update(visible=False)
+        if mode == "hybrid":
+            results = await asyncio.to_thread(retriever.search_hybrid_by_embedding, query, query_embedding, int(top_k), filters)
+        else:
+            results = await asyncio.to_thread(retriever.search_by_embedding, query_embedding, int(top_k), filters)
+
+    if not results:
+        # If no results, hide the feedback buttons
+        return "<p>No results found.</p>", gr.update(visible=False), gr.update(visible=False), gr.update(visible=False)
+
+    output_html = await render_results(results)
     output_html += "</div>"
 
     # If there are results, show the feedback buttons
@@ -300,6 +392,7 @@ with gr.Blocks() as demo:
             add_item,
             inputs=[add_item_type, add_title, add_content, add_url, add_image],
             outputs=[add_status, add_output, add_title, add_content, add_url, add_image],
+            concurrency_limit=HANDLER_CONCURRENCY_LIMIT,
         )
 
     with gr.Tab("Search"):
@@ -323,6 +416,16 @@ with gr.Blocks() as demo:
                 search_query = gr.Textbox(label="Search Query (Text)")
                 search_image_query = gr.Image(type="filepath", label="Search Query (Image)")
                 search_top_k = gr.Slider(1, 20, value=5, step=1, label="Top K")
+                search_mode = gr.Radio(["dense", "hybrid", "sparse"], value="dense", label="Retrieval Mode",
+                                       info="sparse: BM25 keyword match only; hybrid: keywords fused with the embedding ranking")
+                with gr.Accordion("Filters", open=False):
+                    filter_types = gr.Dropdown(["text", "image", "image-text"], multiselect=True, label="Item Types")
+                    with gr.Row():
+                        filter_date_from = gr.Textbox(label="Added After (YYYY-MM-DD)")
+                        filter_date_to = gr.Textbox(label="Added Before (YYYY-MM-DD)")
+                    filter_primary_task = gr.Textbox(label="Primary Task (exact)")
+                    filter_model_name = gr.Textbox(label="Model Name (exact)")
+                    filter_datasets = gr.Textbox(label="Datasets Used (comma-separated, all required)")
                 search_button = gr.Button("Search")
 
                 with gr.Column(visible=False) as feedback_column:
@@ -351,8 +454,10 @@ with gr.Blocks() as demo:
 
         search_button.click(
             search_items,
-            inputs=[search_query, search_image_query, search_top_k],
+            inputs=[search_query, search_image_query, search_top_k, filter_types, filter_date_from, filter_date_to,
+                    filter_primary_task, filter_model_name, filter_datasets, search_mode],
             outputs=[search_results, feedback_column],  # The outputs list is simplified here for clarity
+            concurrency_limit=HANDLER_CONCURRENCY_LIMIT,
         )
 
         # --- Feedback Button Logic ---
@@ -378,4 +483,4 @@ with gr.Blocks() as demo:
         )
 
 if __name__ == "__main__":
-    demo.launch(share=True, server_name="0.0.0.0", server_port=10099, allowed_paths=["/"])
+    demo.launch(share=True, server_name="0.0.0.0", server_port=10099, allowed_paths=["/", os.path.abspath(THUMBNAIL_DIR)])
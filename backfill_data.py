@@ -3,14 +3,17 @@ from tqdm import tqdm
 import sys
 import os
 import argparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import time
 
 # Ensure the main project directory is in the Python path
 # This allows us to import our custom modules like `database` and `openai_extractor`
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from database import Database
-from openai_extractor import extract_information
+from openai_extractor import AsyncExtractor
+from extraction_cache import ExtractionCache
+from metadata_schema import promote_extracted_fields, read_metadata, upgrade_metadata
 
 # --- OpenAI Configuration ---
 # You can centralize this config or set it here for the script
@@ -18,59 +21,153 @@ from openai_extractor import extract_information
 OPENAI_API_KEY = ""
 OPENAI_BASE_URL = ""
 OPENAI_MODEL_NAME = "chatgpt-4o-latest"
-OPENAI_RETRY_TIMES = 3
+OPENAI_RETRY_TIMES = 6
+# Account limits; requests are paced to stay just under them
+OPENAI_REQUESTS_PER_MINUTE = 500
+OPENAI_TOKENS_PER_MINUTE = 200000
+# Shared with app.py, so items already extracted there (or in an earlier run) cost nothing
+EXTRACTION_CACHE_PATH = "extraction_cache.sqlite"
 
+# --- Backfill Progress ---
+JOURNAL_FILE = "backfill_journal.jsonl"
+PAGE_SIZE = 500  # items read per `collection.get`
+UPDATE_BATCH_SIZE = 100  # extracted items written per `collection.update`
 
-def process_item(item_id, metadata, collection):
+
+def needs_extraction(metadata):
+    """True if the item has no usable extraction result: missing, empty, unparsable or an error."""
+    try:
+        info = json.loads(metadata.get("extracted_info") or "{}")
+    except (json.JSONDecodeError, TypeError):
+        return True
+    return not isinstance(info, dict) or not info or "error" in info
+
+
+class BackfillJournal:
+    """
+    Append-only JSONL record of finished items: {"id": ..., "status": "done" | "failed", ...}.
+
+    An item is journaled as done only after its update has been written to the database,
+    so a resumed run skips exactly the work that is already durable.
+    """
+
+    def __init__(self, path, resume):
+        self.path = path
+        self.done = set()
+        self.failed = set()
+        if resume and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a torn last line from a crash
+                    if entry["status"] == "done":
+                        self.done.add(entry["id"])
+                        self.failed.discard(entry["id"])
+                    else:
+                        self.failed.add(entry["id"])
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def record(self, entries):
+        if not entries:
+            return
+        self._file.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        for entry in entries:
+            (self.done if entry["status"] == "done" else self.failed).add(entry["id"])
+
+    def close(self):
+        self._file.close()
+
+
+class BatchedUpdater:
+    """Buffers extracted metadata and writes it with one `Database.update_metadata` per `batch_size` items."""
+
+    def __init__(self, db, journal, batch_size):
+        self.db = db
+        self.journal = journal
+        self.batch_size = batch_size
+        self.ids = []
+        self.metadatas = []
+        self.written = 0
+        self.batches = 0
+
+    async def add(self, item_id, metadata):
+        self.ids.append(item_id)
+        self.metadatas.append(metadata)
+        if len(self.ids) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        if not self.ids:
+            return
+        ids, metadatas = self.ids, self.metadatas
+        self.ids, self.metadatas = [], []
+        await asyncio.to_thread(self.db.update_metadata, ids, metadatas)
+        self.journal.record([{"id": item_id, "status": "done"} for item_id in ids])
+        self.written += len(ids)
+        self.batches += 1
+
+
+def extraction_inputs(item_id, metadata):
+    """(title, text, image_path) to extract from; image-only items have no text of their own, so use the title."""
+    title = metadata.get("title", f"ID: {item_id}")
+    fields = read_metadata(metadata)
+    return title, fields.get("text") or title, fields.get("image_path") or None
+
+
+def item_outcome(item_id, metadata, title, extracted_info):
+    """Status tuple for one item: (status_string, item_id, details, new_metadata or None)."""
+    if extracted_info and "error" not in extracted_info:
+        # Upgrade first: promoting on a v1 record would write it back with its legacy `content` unsplit
+        upgraded = upgrade_metadata(metadata, read_images=False)
+        new_metadata = promote_extracted_fields(dict(upgraded, extracted_info=json.dumps(extracted_info)))
+        return ("Updated", item_id, title, new_metadata)
+    error_msg = (extracted_info or {}).get("error", "Unknown extraction error")
+    return ("Failed", item_id, f"{title} - Error: {error_msg}", None)
+
+
+async def process_item(item_id, metadata, extractor):
     """
-    Processes a single item: extracts info and updates the database.
-    Returns a status tuple: (status_string, item_id, title).
+    Processes a single item: extracts info and builds its updated metadata.
+    Returns a list with one status tuple (see `item_outcome`).
     """
     title = metadata.get("title", f"ID: {item_id}")
     try:
-        content = metadata.get("content", "")
-        item_type = metadata.get("type", "")
-        image_path = None
-        text_for_extraction = content
-
-        if item_type == "image":
-            image_path = content
-            text_for_extraction = title
-        elif item_type == "image-text":
-            if "|" in content:
-                text_part, img_part = content.split("|", 1)
-                text_for_extraction = text_part.strip()
-                image_path = img_part.strip()
-                if not os.path.exists(image_path):
-                    image_path = None
-            else:
-                text_for_extraction = title
-
-        extracted_info = extract_information(
-            text=text_for_extraction,
-            image_path=image_path,
-            api_key=OPENAI_API_KEY,
-            base_url=OPENAI_BASE_URL,
-            model_name=OPENAI_MODEL_NAME,
-            retry_times=OPENAI_RETRY_TIMES,
-        )
-
-        if extracted_info and "error" not in extracted_info:
-            new_metadata = metadata.copy()
-            new_metadata["extracted_info"] = json.dumps(extracted_info)
-            collection.update(ids=[item_id], metadatas=[new_metadata])
-            return ("Updated", item_id, title)
-        else:
-            error_msg = extracted_info.get("error", "Unknown extraction error")
-            return ("Failed", item_id, f"{title} - Error: {error_msg}")
+        title, text_for_extraction, image_path = extraction_inputs(item_id, metadata)
+        extracted_info = await extractor.extract(text_for_extraction, image_path)
+        return [item_outcome(item_id, metadata, title, extracted_info)]
+    except Exception as e:
+        return [("Exception", item_id, f"{title} - Error: {e}", None)]
+
 
+async def process_batch(items, extractor):
+    """Extracts several text-only (item_id, metadata) items with one request. Returns one status tuple per item."""
+    inputs = [extraction_inputs(item_id, metadata) for item_id, metadata in items]
+    try:
+        results = await extractor.extract_batch([text for _, text, _ in inputs])
     except Exception as e:
-        return ("Exception", item_id, f"{title} - Error: {e}")
+        return [("Exception", item_id, f"{title} - Error: {e}", None) for (item_id, _), (title, _, _) in zip(items, inputs)]
+    return [
+        item_outcome(item_id, metadata, title, extracted_info)
+        for (item_id, metadata), (title, _, _), extracted_info in zip(items, inputs, results)
+    ]
 
 
-def backfill_concurrently(force_refresh: bool, max_workers: int):
+async def backfill_concurrently(force_refresh: bool, concurrency: int, requests_per_minute: float, tokens_per_minute: float,
+                                use_cache: bool = True, resume: bool = False, retry_failed: bool = True,
+                                page_size: int = PAGE_SIZE, update_batch_size: int = UPDATE_BATCH_SIZE,
+                                journal_file: str = JOURNAL_FILE, extract_batch_size: int = 1):
     """
-    Fetches all items and processes them concurrently to backfill extracted information.
+    Pages through the collection and backfills extracted information concurrently.
+
+    Only one page of metadata and at most `2 * concurrency` items are held at a time.
+    Results are written in batched `collection.update` calls and recorded in the journal.
+    With `resume`, items the journal marks as done (and, unless `retry_failed`, failed)
+    are skipped, so an interrupted run continues where it stopped. With `extract_batch_size`
+    above 1, text-only items are sent that many per request (see `AsyncExtractor.extract_batch`).
     """
     print("Initializing database connection...")
     db = Database()
@@ -78,59 +175,109 @@ def backfill_concurrently(force_refresh: bool, max_workers: int):
     print("Database connected.")
 
     try:
-        all_items = collection.get(include=["metadatas"])
-        if not all_items or not all_items["ids"]:
-            print("Database is empty. Nothing to backfill.")
-            return
+        total = collection.count()
     except Exception as e:
-        print(f"Error fetching data from ChromaDB: {e}", file=sys.stderr)
+        print(f"Error reading from ChromaDB: {e}", file=sys.stderr)
+        return
+    if total == 0:
+        print("Database is empty. Nothing to backfill.")
         return
 
-    items_to_process = []
+    journal = BackfillJournal(journal_file, resume)
+    if resume:
+        print(f"Resuming: {len(journal.done)} items already done, {len(journal.failed)} failed earlier"
+              f"{' (will retry)' if retry_failed else ' (skipped)'}.")
     if force_refresh:
         print("Force refresh enabled: All items will be re-processed.")
-        for item_id, metadata in zip(all_items["ids"], all_items["metadatas"]):
-            items_to_process.append((item_id, metadata))
     else:
         print("Standard mode: Only processing items without valid extracted info.")
-        for item_id, metadata in zip(all_items["ids"], all_items["metadatas"]):
-            if (
-                not metadata.get("extracted_info")
-                or metadata["extracted_info"] == "{}"
-                or "error" in metadata["extracted_info"]
-            ):
-                items_to_process.append((item_id, metadata))
-
-    if not items_to_process:
-        print("No items require processing. Exiting.")
-        return
-
-    updated_count = 0
-    failed_count = 0
-
-    print(f"Found {len(items_to_process)} items to process. Starting concurrent backfill with {max_workers} workers...")
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_item = {
-            executor.submit(process_item, item_id, metadata, collection): metadata.get("title")
-            for item_id, metadata in items_to_process
-        }
+    extractor = AsyncExtractor(
+        api_key=OPENAI_API_KEY,
+        base_url=OPENAI_BASE_URL,
+        model_name=OPENAI_MODEL_NAME,
+        max_concurrency=concurrency,
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
+        max_retries=OPENAI_RETRY_TIMES,
+        cache=ExtractionCache(EXTRACTION_CACHE_PATH) if use_cache else None,
+    )
+    updater = BatchedUpdater(db, journal, update_batch_size)
+    counts = {"targeted": 0, "updated": 0, "failed": 0, "skipped": 0}
+    pending = set()
+    text_batch = []  # text-only items waiting to fill a batched request
 
-        with tqdm(total=len(items_to_process), desc="Processing items") as pbar:
-            for future in as_completed(future_to_item):
-                status, item_id, details = future.result()
+    async def collect(done_tasks, pbar):
+        failures = []
+        for task in done_tasks:
+            for status, item_id, details, new_metadata in task.result():
                 if status == "Updated":
-                    updated_count += 1
+                    counts["updated"] += 1
+                    await updater.add(item_id, new_metadata)
                 else:
-                    failed_count += 1
+                    counts["failed"] += 1
+                    failures.append({"id": item_id, "status": "failed", "error": details})
                     tqdm.write(f"  [!] {status} on item {details}")
-                pbar.update(1)
-                pbar.set_postfix_str(f"Updated: {updated_count}, Failed: {failed_count}")
+        journal.record(failures)
+        pbar.set_postfix_str(f"Updated: {counts['updated']}, Failed: {counts['failed']}")
+
+    async def submit(coroutine, pbar):
+        nonlocal pending
+        # Backpressure: keep enough queued to saturate the limiter, no more
+        while len(pending) >= 2 * concurrency:
+            done_tasks, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            await collect(done_tasks, pbar)
+        pending.add(asyncio.create_task(coroutine))
+
+    print(f"Scanning {total} items in pages of {page_size} with up to {concurrency} requests in flight...")
+    started = time.perf_counter()
+    try:
+        with tqdm(total=total, desc="Processing items") as pbar:
+            # Updates change metadata only, so offsets over the stored order stay stable
+            for offset in range(0, total, page_size):
+                page = await asyncio.to_thread(collection.get, include=["metadatas"], limit=page_size, offset=offset)
+                for item_id, metadata in zip(page["ids"], page["metadatas"]):
+                    metadata = metadata or {}
+                    if item_id in journal.done or (not retry_failed and item_id in journal.failed):
+                        counts["skipped"] += 1
+                    elif force_refresh or needs_extraction(metadata):
+                        counts["targeted"] += 1
+                        if extract_batch_size > 1 and not read_metadata(metadata).get("image_path"):
+                            text_batch.append((item_id, metadata))
+                            if len(text_batch) >= extract_batch_size:
+                                await submit(process_batch(text_batch, extractor), pbar)
+                                text_batch = []
+                        else:
+                            await submit(process_item(item_id, metadata, extractor), pbar)
+                    pbar.update(1)
+            if text_batch:
+                await submit(process_batch(text_batch, extractor), pbar)
+            while pending:
+                done_tasks, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                await collect(done_tasks, pbar)
+    finally:
+        # Everything already extracted is written even if the run is interrupted
+        for task in pending:
+            task.cancel()
+        await updater.flush()
+        journal.close()
+        await extractor.aclose()
 
     print("\n--- Backfill Summary ---")
-    print(f"Total items targeted for processing: {len(items_to_process)}")
-    print(f"Successfully updated: {updated_count} items.")
-    print(f"Failed or skipped due to errors: {failed_count} items.")
+    print(f"Total items targeted for processing: {counts['targeted']}")
+    print(f"Skipped (already done according to the journal): {counts['skipped']}")
+    print(f"Successfully updated: {counts['updated']} items in {updater.batches} batched writes.")
+    print(f"Failed or skipped due to errors: {counts['failed']} items.")
+    print(f"Served from extraction cache: {extractor.stats['cache_hits']}")
+    print(f"API requests: {extractor.stats['requests']}, retries: {extractor.stats['retries']}, "
+          f"rate limited: {extractor.stats['rate_limited']}, tokens: {extractor.stats['tokens']}")
+    if extract_batch_size > 1:
+        print(f"Batched requests: {extractor.stats['batch_requests']}, items answered in batches: "
+              f"{extractor.stats['batch_items']}, fell back to single calls: {extractor.stats['batch_fallbacks']}")
+    minutes = (time.perf_counter() - started) / 60
+    processed = counts["updated"] + counts["failed"]
+    if processed:
+        print(f"Tokens per item: {extractor.stats['tokens'] / processed:.0f}, items/minute: {processed / minutes:.0f}")
     print("-------------------------")
 
 
@@ -144,11 +291,43 @@ def main():
         help="If set, re-processes all items, ignoring existing extracted information.",
     )
     parser.add_argument(
-        "--workers", type=int, default=4, help="Number of concurrent threads to use for processing (default: 4)."
+        "--concurrency", "--workers", type=int, default=32,
+        help="Maximum extraction requests in flight (default: 32)."
+    )
+    parser.add_argument(
+        "--rpm", type=float, default=OPENAI_REQUESTS_PER_MINUTE, help="Requests-per-minute budget of the API account."
+    )
+    parser.add_argument(
+        "--tpm", type=float, default=OPENAI_TOKENS_PER_MINUTE, help="Tokens-per-minute budget of the API account."
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Always call the API, ignoring results cached for identical inputs (e.g. after changing the prompt by hand).",
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help=f"Continue an interrupted run, skipping items already recorded as done in the journal ({JOURNAL_FILE}).",
+    )
+    parser.add_argument(
+        "--skip-failed", action="store_true", help="With --resume, also skip items that failed in earlier runs."
+    )
+    parser.add_argument(
+        "--extract-batch-size", type=int, default=1,
+        help="Text-only items packed into one extraction request (default: 1, no batching).",
+    )
+    parser.add_argument("--journal", default=JOURNAL_FILE, help="Path of the progress journal.")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE, help="Items read per database call.")
+    parser.add_argument(
+        "--update-batch-size", type=int, default=UPDATE_BATCH_SIZE, help="Items written per database update."
     )
     args = parser.parse_args()
 
-    backfill_concurrently(args.force_refresh, args.workers)
+    asyncio.run(backfill_concurrently(
+        args.force_refresh, args.concurrency, args.rpm, args.tpm,
+        use_cache=not args.no_cache, resume=args.resume, retry_failed=not args.skip_failed,
+        page_size=args.page_size, update_batch_size=args.update_batch_size, journal_file=args.journal,
+        extract_batch_size=args.extract_batch_size,
+    ))
 
 
 if __name__ == "__main__":
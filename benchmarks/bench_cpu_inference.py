@@ -0,0 +1,146 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Never reach the network: every file must already be on disk or in the Hugging Face cache
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+import numpy as np
+import torch
+
+# Make the project modules importable when running from the benchmarks/ directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modeling_gme_qwen2vl import GmeQwen2VL, GmeQwen2VLConfig
+from retriever import load_model
+
+# --mode -> (dtype, quantize) as passed to retriever.load_model
+MODES = {
+    "float32": ("float32", None),
+    "bfloat16": ("bfloat16", None),
+    "int8": ("float32", "int8"),
+}
+
+
+def is_available_offline(name, files=("config.json", "preprocessor_config.json")):
+    """True if `name` is a local directory or a cached Hub repo holding `files`."""
+    if os.path.isdir(name):
+        return all(os.path.exists(os.path.join(name, f)) for f in files)
+    from huggingface_hub import try_to_load_from_cache
+    return all(isinstance(try_to_load_from_cache(name, f), str) for f in files)
+
+
+def tiny_config(hidden_size, num_layers):
+    """A GmeQwen2VL config small enough to benchmark on any CPU."""
+    num_heads = max(hidden_size // 64, 1)
+    head_dim = hidden_size // num_heads
+    # mrope sections must cover half of each attention head
+    half = head_dim // 2
+    mrope_section = [half - 2 * (half // 3), half // 3, half // 3]
+    return GmeQwen2VLConfig(
+        vocab_size=152064,
+        hidden_size=hidden_size,
+        intermediate_size=hidden_size * 4,
+        num_hidden_layers=num_layers,
+        num_attention_heads=num_heads,
+        num_key_value_heads=num_heads,
+        rope_scaling={"type": "mrope", "mrope_section": mrope_section},
+        vision_config={"depth": 1, "embed_dim": 64, "hidden_size": hidden_size, "num_heads": 2},
+    )
+
+
+def save_random_checkpoint(processor_name, hidden_size, num_layers, directory):
+    """Writes a randomly initialized GmeQwen2VL with the processor of `processor_name` to `directory`."""
+    config = tiny_config(hidden_size, num_layers)
+    # GmeQwen2VL loads its processor from the config path
+    config._name_or_path = processor_name
+    torch.manual_seed(0)
+    model = GmeQwen2VL(config)
+    model.save_pretrained(directory)
+    model.processor.save_pretrained(directory)
+
+
+def make_texts(n, words, seed=0):
+    rng = np.random.default_rng(seed)
+    vocabulary = ["vision", "transformer", "retrieval", "dataset", "image", "benchmark", "model", "training",
+                  "embedding", "query", "document", "layer", "attention", "accuracy", "scale", "token"]
+    return [" ".join(rng.choice(vocabulary, size=words)) for _ in range(n)]
+
+
+def run(model, texts, images, batch_size, iterations, warmup=2):
+    """Times `get_fused_embeddings` (processor, forward and pooling) per batch. Returns latencies in ms."""
+    batch_texts = texts[:batch_size]
+    batch_images = images[:batch_size] if images else None
+    latencies = []
+    for i in range(warmup + iterations):
+        t0 = time.perf_counter()
+        model.get_fused_embeddings(texts=batch_texts, images=batch_images, is_query=False, batch_size=batch_size)
+        if i >= warmup:
+            latencies.append((time.perf_counter() - t0) * 1000)
+    return np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="CPU latency/throughput of the embedding model as loaded by retriever.load_model."
+    )
+    parser.add_argument("--model", default="Alibaba-NLP/gme-Qwen2-VL-7B-Instruct",
+                        help="Local checkpoint directory or cached Hub model to benchmark.")
+    parser.add_argument("--random-init", metavar="HIDDEN,LAYERS",
+                        help="Benchmark a randomly initialized model of this size instead of the --model weights; "
+                             "only the processor files of --model are needed.")
+    parser.add_argument("--modes", default="float32,int8", help=f"Comma-separated modes from: {', '.join(MODES)}.")
+    parser.add_argument("--threads", type=int, help="CPU threads (default: GME_NUM_THREADS or torch's default).")
+    parser.add_argument("--batch-sizes", default="1,8")
+    parser.add_argument("--words", type=int, default=128, help="Words per synthetic document.")
+    parser.add_argument("--image", help="Also attach this image to every document (image-text embeddings).")
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    needed = ("preprocessor_config.json",) if args.random_init else ("config.json", "preprocessor_config.json")
+    if not is_available_offline(args.model, needed):
+        print(f"'{args.model}' is not available locally ({', '.join(needed)} not found in the directory or the "
+              f"Hugging Face cache). Download it first, e.g. `huggingface-cli download {args.model}`.",
+              file=sys.stderr)
+        sys.exit(1)
+
+    workdir = None
+    model_path = args.model
+    if args.random_init:
+        hidden_size, num_layers = (int(v) for v in args.random_init.split(","))
+        workdir = tempfile.mkdtemp(prefix="bench_cpu_inference_")
+        save_random_checkpoint(args.model, hidden_size, num_layers, workdir)
+        model_path = workdir
+
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+    texts = make_texts(max(batch_sizes), args.words)
+    images = [args.image] * max(batch_sizes) if args.image else None
+    try:
+        print(f"Model: {args.model}{' (random init ' + args.random_init + ')' if args.random_init else ''}, "
+              f"{args.words} words per document{', with image' if images else ''}\n")
+        rows = []
+        for mode in args.modes.split(","):
+            dtype, quantize = MODES[mode]
+            t0 = time.perf_counter()
+            model = load_model(model_path, device="cpu", dtype=dtype, num_threads=args.threads, quantize=quantize)
+            load_s = time.perf_counter() - t0
+            for batch_size in batch_sizes:
+                latencies = run(model, texts, images, batch_size, args.iterations)
+                p50, p95 = np.percentile(latencies, [50, 95])
+                rows.append((mode, load_s, torch.get_num_threads(), batch_size, p50, p95,
+                             batch_size / (latencies.mean() / 1000)))
+            del model
+
+        print(f"\n{'mode':<10}{'load s':>8}{'threads':>8}{'batch':>7}{'p50 ms':>10}{'p95 ms':>10}{'docs/s':>10}")
+        for mode, load_s, threads, batch_size, p50, p95, throughput in rows:
+            print(f"{mode:<10}{load_s:>8.1f}{threads:>8}{batch_size:>7}{p50:>10.1f}{p95:>10.1f}{throughput:>10.1f}")
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Make the project modules importable when running from the benchmarks/ directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openai_server import FakeOpenAIServer
+from openai_extractor import AsyncExtractor, extract_information
+
+SAMPLE_TEXT = (
+    "We introduce a new family of large language models trained on a 15T token dataset "
+    "and evaluated on the MMLU benchmark, improving few-shot performance."
+)
+
+
+def run_threaded(base_url, n_items, workers):
+    """The previous backfill path: blocking extract_information calls on a thread pool."""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            lambda i: extract_information(f"{SAMPLE_TEXT} #{i}", api_key="fake", base_url=base_url,
+                                          model_name="fake", retry_times=6),
+            range(n_items)
+        ))
+    return results
+
+
+async def run_async(base_url, n_items, concurrency, rpm, tpm, batch_size=1):
+    extractor = AsyncExtractor(api_key="fake", base_url=base_url, model_name="fake", max_concurrency=concurrency,
+                               requests_per_minute=rpm, tokens_per_minute=tpm)
+    texts = [f"{SAMPLE_TEXT} #{i}" for i in range(n_items)]
+    try:
+        if batch_size > 1:
+            batches = await asyncio.gather(*[
+                extractor.extract_batch(texts[start:start + batch_size]) for start in range(0, n_items, batch_size)
+            ])
+            results = [result for batch in batches for result in batch]
+        else:
+            results = await extractor.extract_many([(text, None) for text in texts])
+    finally:
+        await extractor.aclose()
+    return results, extractor.stats
+
+
+def report(name, results, seconds, server, extra=""):
+    ok = sum(1 for r in results if "error" not in r)
+    print(f"  {name:<30} {ok}/{len(results)} ok, {len(results) / seconds * 60:8.0f} items/min, "
+          f"server 429s: {server.counters['rate_limited']} {extra}")
+
+
+def token_report(stats, n_items):
+    return (f"requests: {stats['requests']}, tokens/item: {stats['tokens'] / n_items:.0f}, "
+            f"retries: {stats['retries']}, batch fallbacks: {stats['batch_fallbacks']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extraction throughput against a local fake OpenAI-compatible server.")
+    parser.add_argument("--num-items", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Fake server latency per request.")
+    parser.add_argument("--server-rpm", type=int, default=3000, help="Fake server requests-per-minute limit.")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Fraction of injected 500 errors.")
+    parser.add_argument("--workers", type=int, default=4, help="Thread pool size of the blocking baseline.")
+    parser.add_argument("--concurrency", type=int, default=64, help="In-flight requests of the async engine.")
+    parser.add_argument("--tpm", type=float, default=2_000_000, help="Tokens-per-minute budget of the async engine.")
+    parser.add_argument("--batch-size", type=int, default=8, help="Abstracts per request in batched mode.")
+    parser.add_argument("--batch-drop-rate", type=float, default=0.05,
+                        help="Fraction of batched reply elements the fake server drops or corrupts.")
+    args = parser.parse_args()
+
+    print(f"{args.num_items} items, {args.latency_ms:.0f} ms latency, server limit {args.server_rpm} RPM")
+
+    server = FakeOpenAIServer(latency_ms=args.latency_ms, requests_per_minute=args.server_rpm,
+                              error_rate=args.error_rate).start()
+    t0 = time.perf_counter()
+    results = run_threaded(server.base_url, args.num_items, args.workers)
+    report(f"threads ({args.workers} workers)", results, time.perf_counter() - t0, server)
+    server.shutdown()
+    server.server_close()
+
+    for batch_size in (1, args.batch_size):
+        # A fresh server so the rate-limit budget starts full
+        server = FakeOpenAIServer(latency_ms=args.latency_ms, requests_per_minute=args.server_rpm,
+                                  error_rate=args.error_rate, batch_drop_rate=args.batch_drop_rate).start()
+        t0 = time.perf_counter()
+        results, stats = asyncio.run(run_async(server.base_url, args.num_items, args.concurrency, args.server_rpm,
+                                               args.tpm, batch_size))
+        name = f"async, {batch_size} item(s)/request"
+        report(name, results, time.perf_counter() - t0, server, token_report(stats, args.num_items))
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# Make the project modules importable when running from the benchmarks/ directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from metadata_schema import build_where, make_metadata
+
+# (primary task, share of the corpus): filters from unselective to very selective
+TASKS = [("Text Generation", 0.6), ("Image Classification", 0.3), ("Object Detection", 0.09),
+         ("Depth Estimation", 0.01)]
+TYPES = ["text", "image", "image-text"]
+
+
+def random_unit_vectors(n, dim, rng):
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def synthetic_metadatas(n, rng):
+    """Columnar schema-3 metadata with a skewed primary task, random types and dates over one year."""
+    tasks = rng.choice(len(TASKS), size=n, p=[share for _, share in TASKS])
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(n):
+        info = {"model_name": f"model-{i % 50}", "primary_task": TASKS[tasks[i]][0],
+                "datasets_used": ["ImageNet"] if i % 7 == 0 else [], "evaluation_metrics": []}
+        date = (start + timedelta(minutes=int(rng.integers(0, 365 * 24 * 60)))).isoformat()
+        rows.append(make_metadata(TYPES[i % 3], f"Item {i}", f"Text {i}", "", "", date, json.dumps(info)))
+    return {field: [row.get(field, False) for row in rows] for field in set().union(*rows)}
+
+
+def matches(metadata, filters):
+    """Python-side check of the filters used in this benchmark, for the over-fetch baseline."""
+    if "primary_task" in filters and metadata.get("info_primary_task") != filters["primary_task"]:
+        return False
+    if "type" in filters and metadata.get("type") != filters["type"]:
+        return False
+    if "date_from" in filters and metadata.get("date", "") < filters["date_from"]:
+        return False
+    return True
+
+
+def over_fetch(db, queries, top_k, filters, factor):
+    """The old approach: ask for factor * top_k unfiltered neighbours, then filter in Python."""
+    results = db.query_many(queries, top_k=top_k * factor)
+    return [
+        [item_id for item_id, metadata in zip(ids, metadatas) if matches(metadata, filters)][:top_k]
+        for ids, metadatas in zip(results['ids'], results['metadatas'])
+    ]
+
+
+def pushdown(db, queries, top_k, filters):
+    return db.query_many(queries, top_k=top_k, filters=filters)['ids']
+
+
+def time_per_query(fn, db, queries, *args):
+    latencies, found = [], []
+    for query in queries:
+        t0 = time.perf_counter()
+        found.extend(fn(db, query[np.newaxis, :], *args))
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return np.array(latencies), found
+
+
+def recall(found_ids, exact_ids, top_k):
+    """Mean fraction of the exact filtered top-k that was returned (expected size capped by the matches)."""
+    return float(np.mean([len(set(found) & set(exact)) / max(min(top_k, len(exact)), 1)
+                          for found, exact in zip(found_ids, exact_ids)]))
+
+
+def report(name, latencies, found, exact, top_k):
+    p50, p95 = np.percentile(latencies, [50, 95])
+    full = np.mean([len(ids) >= min(top_k, len(ex)) for ids, ex in zip(found, exact)])
+    print(f"  {name:<26} ms p50 {p50:8.2f} p95 {p95:8.2f} | recall {recall(found, exact, top_k):.3f} "
+          f"| full result lists {full:.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Filtered search: pushdown into the backend vs over-fetch-and-filter.")
+    parser.add_argument("--num-vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--num-queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--over-fetch", type=int, default=10, help="Over-fetch factor of the baseline.")
+    parser.add_argument("--backends", default="chroma,numpy,flat")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    corpus = random_unit_vectors(args.num_vectors, args.dim, rng)
+    queries = random_unit_vectors(args.num_queries, args.dim, rng)
+    metadatas = synthetic_metadatas(args.num_vectors, rng)
+
+    workdir = tempfile.mkdtemp(prefix="bench_filtered_")
+    try:
+        db = Database(path=workdir, backend="numpy")
+        t0 = time.perf_counter()
+        ids = db.add_many(corpus, metadatas)
+        print(f"Corpus: {args.num_vectors} x {args.dim} ingested in {time.perf_counter() - t0:.1f}s, "
+              f"{args.num_queries} queries, top_k={args.top_k}\n")
+        row_of = {item_id: row for row, item_id in enumerate(ids)}
+
+        filter_sets = [{"primary_task": task} for task, _ in TASKS]
+        filter_sets.append({"type": "image", "date_from": "2024-12-01"})
+        for backend in args.backends.split(","):
+            db = Database(path=workdir, backend=backend)
+            print(f"--- backend: {backend} ---")
+            for filters in filter_sets:
+                allowed = sorted(row_of[item_id] for item_id in db.filter_ids(build_where(filters)))
+                exact_scores = queries @ corpus[allowed].T
+                exact = [[ids[allowed[col]] for col in np.argsort(-row)[:args.top_k]] for row in exact_scores]
+                print(f" filter {filters} ({len(allowed) / args.num_vectors:.1%} of items)")
+                latencies, found = time_per_query(over_fetch, db, queries, args.top_k, filters, args.over_fetch)
+                report(f"over-fetch x{args.over_fetch} + filter", latencies, found, exact, args.top_k)
+                latencies, found = time_per_query(pushdown, db, queries, args.top_k, filters)
+                report("pushdown", latencies, found, exact, args.top_k)
+            print()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
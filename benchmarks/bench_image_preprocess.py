@@ -0,0 +1,85 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+# Make the project modules importable when running from the benchmarks/ directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modeling_gme_qwen2vl import ImagePreprocessor, custom_collate_fn, fetch_image
+
+
+def make_images(directory, count, width, height, seed):
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(count):
+        pixels = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        path = os.path.join(directory, f"image_{i}.jpg")
+        Image.fromarray(pixels).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def timed(fn, repeat=1):
+    """Mean wall time of `fn` in ms over `repeat` runs."""
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) * 1000 / repeat
+
+
+def dataloader_fetch(paths, batch_size):
+    """The old path: a fresh multi-process DataLoader per call, then fetch_image on the calling thread."""
+    from torch.utils.data import DataLoader
+    loader = DataLoader(paths, batch_size=batch_size, shuffle=False, collate_fn=custom_collate_fn,
+                        num_workers=min(os.cpu_count() // 2, 8))
+    return [fetch_image(path) for batch in loader for path in batch]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Single-image and bulk latency of image preprocessing.")
+    parser.add_argument("--num-images", type=int, default=64)
+    parser.add_argument("--width", type=int, default=2048)
+    parser.add_argument("--height", type=int, default=1536)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_image_preprocess_")
+    try:
+        paths = make_images(workdir, args.num_images, args.width, args.height, args.seed)
+        print(f"{args.num_images} JPEGs of {args.width}x{args.height}\n")
+
+        print("--- single image (ms) ---")
+        print(f"fetch_image, calling thread  {timed(lambda: fetch_image(paths[0]), args.repeat):9.2f}")
+        try:
+            print(f"fresh DataLoader per call    {timed(lambda: dataloader_fetch(paths[:1], 1), args.repeat):9.2f}")
+        except ImportError:
+            print("fresh DataLoader per call    (torch not installed)")
+        cold = ImagePreprocessor(cache_bytes=0)
+        print(f"preprocessor, cache miss     {timed(lambda: cold.fetch(paths[0]), args.repeat):9.2f}")
+        warm = ImagePreprocessor()
+        warm.fetch(paths[0])
+        print(f"preprocessor, cache hit      {timed(lambda: warm.fetch(paths[0]), args.repeat):9.2f}")
+
+        print(f"\n--- bulk, {args.num_images} images (ms) ---")
+        print(f"fetch_image, sequential      {timed(lambda: [fetch_image(p) for p in paths]):9.2f}")
+        pool = ImagePreprocessor(cache_bytes=0)
+        print(f"preprocessor pool ({pool.max_workers} threads) {timed(lambda: pool.map(paths)):9.2f}")
+        # RGB bytes of every image, with headroom for rounding up to the patch grid
+        cached = ImagePreprocessor(cache_bytes=2 * args.num_images * args.width * args.height * 3)
+        cached.map(paths)
+        print(f"preprocessor, all cached     {timed(lambda: cached.map(paths)):9.2f}")
+        for preprocessor in (cold, warm, pool, cached):
+            preprocessor.shutdown()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Make the project modules importable when running from the benchmarks/ directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import MatryoshkaBackend, NumpyBackend, load_backend_from_collection
+from vector_store import FlatVectorStore
+
+
+def load_corpus(db_path):
+    """Reads every stored embedding from the Chroma collection at `db_path`."""
+    import chromadb
+    collection = chromadb.PersistentClient(path=db_path).get_or_create_collection(name="retrieval_collection")
+    backend = load_backend_from_collection(NumpyBackend(np.float32), collection)
+    return list(backend.ids), backend.matrix[:len(backend)].copy()
+
+
+def make_queries(ids, corpus, source, num_queries, noise, rng):
+    """
+    Returns (query vectors, the id each query came from, indexed ids, indexed vectors).
+
+    'held-out' removes the query documents from the index, so no query can find itself;
+    'perturbed' keeps them indexed but adds Gaussian noise of relative size `noise` to the
+    query, and the query's own id is excluded from both the ground truth and the results.
+    """
+    picked = rng.choice(len(ids), size=min(num_queries, len(ids) - 1), replace=False)
+    query_ids = [ids[i] for i in picked]
+    queries = corpus[picked]
+    if source == "held-out":
+        keep = np.ones(len(ids), dtype=bool)
+        keep[picked] = False
+        return queries, query_ids, [item_id for item_id, k in zip(ids, keep) if k], corpus[keep]
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    perturbation = rng.standard_normal(queries.shape).astype(np.float32)
+    perturbation *= noise / np.linalg.norm(perturbation, axis=1, keepdims=True)
+    return queries + perturbation, query_ids, ids, corpus
+
+
+def search_excluding(backend, query, top_k, own_id):
+    """Top-k ids for one query with `own_id` left out of the ranking."""
+    found = backend.search(query[np.newaxis, :], top_k + 1)['ids'][0]
+    return [item_id for item_id in found if item_id != own_id][:top_k]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Latency and recall@k of two-stage truncated-prefix search versus prefix width."
+    )
+    parser.add_argument("--db-path", default="./database", help="ChromaDB directory holding the imported corpus.")
+    parser.add_argument("--dims", default="128,256,512,1024,2048", help="Comma-separated prefix widths to try.")
+    parser.add_argument("--rerank-k", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--num-queries", type=int, default=100)
+    parser.add_argument("--queries", choices=["held-out", "perturbed"], default="held-out",
+                        help="Query documents removed from the index, or noisy copies of indexed documents.")
+    parser.add_argument("--noise", type=float, default=0.3, help="Relative noise norm of 'perturbed' queries.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    ids, corpus = load_corpus(args.db_path)
+    if len(ids) < 2:
+        print(f"Too few embeddings found in '{args.db_path}'. Run import_data.py first.", file=sys.stderr)
+        return
+
+    # A stored document used as its own query would always rank itself first and inflate recall
+    rng = np.random.default_rng(args.seed)
+    queries, query_ids, ids, corpus = make_queries(ids, corpus, args.queries, args.num_queries, args.noise, rng)
+    exact = NumpyBackend(np.float32)
+    exact.add(ids, corpus)
+    t0 = time.perf_counter()
+    exact_ids = [search_excluding(exact, query, args.top_k, own_id) for query, own_id in zip(queries, query_ids)]
+    exact_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+
+    print(f"Corpus: {len(ids)} x {corpus.shape[1]}, {len(queries)} {args.queries} queries, "
+          f"top_k={args.top_k}, rerank_k={args.rerank_k}\n")
+    print(f"{'prefix dim':>10}{'stage-1 MB':>12}{'recall@k':>10}{'ms/query':>10}")
+    print(f"{corpus.shape[1]:>10}{exact.matrix[:len(exact)].nbytes / 2**20:>12.1f}{1.0:>10.4f}{exact_ms:>10.3f}  (exact float32)")
+
+    workdir = tempfile.mkdtemp(prefix="bench_matryoshka_")
+    try:
+        store = FlatVectorStore(workdir)
+        store.append(ids, corpus)
+        for dim in (int(d) for d in args.dims.split(",")):
+            if dim >= corpus.shape[1]:
+                continue
+            backend = MatryoshkaBackend(store, prefix_dim=dim, rerank_k=args.rerank_k)
+            recalls, latencies = [], []
+            for query, own_id, truth in zip(queries, query_ids, exact_ids):
+                t0 = time.perf_counter()
+                found = search_excluding(backend, query, args.top_k, own_id)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                recalls.append(len(set(found) & set(truth)) / len(truth))
+            prefix_mb = backend.prefix_index.matrix[:len(ids)].nbytes / 2**20
+            print(f"{dim:>10}{prefix_mb:>12.1f}{np.mean(recalls):>10.4f}{np.mean(latencies):>10.3f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
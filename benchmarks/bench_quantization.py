@@ -0,0 +1,92 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+# Make the project modules importable when running from the benchmarks/ directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import NumpyBackend, QuantizedBackend
+from quantization import ProductQuantizer, ScalarInt8Quantizer
+from vector_store import FlatVectorStore
+
+
+def clustered_unit_vectors(n, dim, n_clusters, rng):
+    """Unit vectors drawn around random cluster centers, closer to real embeddings than pure noise."""
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, n_clusters, n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def recall_at_k(found_ids, exact_ids):
+    return float(np.mean([len(set(found) & set(exact)) / len(exact) for found, exact in zip(found_ids, exact_ids)]))
+
+
+def timed_search(backend, queries, top_k, **kwargs):
+    latencies, all_ids = [], []
+    for query in queries:
+        t0 = time.perf_counter()
+        results = backend.search(query[np.newaxis, :], top_k, **kwargs)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        all_ids.extend(results['ids'])
+    return np.array(latencies), all_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k, latency and memory of int8 / PQ indexes against exact float32 search.")
+    parser.add_argument("--num-vectors", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=3584)
+    parser.add_argument("--num-queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--pq-subspaces", type=int, default=128, help="Bytes per vector for PQ; must divide --dim.")
+    parser.add_argument("--rerank-k", type=int, default=200)
+    parser.add_argument("--train-size", type=int, default=8192)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    corpus = clustered_unit_vectors(args.num_vectors, args.dim, 256, rng)
+    queries = corpus[rng.integers(0, args.num_vectors, args.num_queries)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(args.dim)
+    ids = [str(uuid.uuid4()) for _ in range(args.num_vectors)]
+
+    exact = NumpyBackend(np.float32)
+    exact.add(ids, corpus)
+    exact_latencies, exact_ids = timed_search(exact, queries, args.top_k)
+    float_bytes = exact.matrix[:len(exact)].nbytes
+    print(f"Corpus: {args.num_vectors} x {args.dim}, {args.num_queries} queries, top_k={args.top_k}\n")
+    print(f"{'index':<22}{'RAM (MB)':>10}{'ratio':>8}{'recall@k':>10}{'p50 ms':>9}{'p95 ms':>9}")
+    print(f"{'float32 exact':<22}{float_bytes / 2**20:>10.1f}{1.0:>8.1f}{1.0:>10.4f}"
+          f"{np.percentile(exact_latencies, 50):>9.2f}{np.percentile(exact_latencies, 95):>9.2f}")
+
+    workdir = tempfile.mkdtemp(prefix="bench_quantization_")
+    try:
+        quantizers = {
+            'int8': ScalarInt8Quantizer(),
+            f'pq{args.pq_subspaces}': ProductQuantizer(n_subspaces=args.pq_subspaces),
+        }
+        for name, quantizer in quantizers.items():
+            store = FlatVectorStore(os.path.join(workdir, name))
+            store.append(ids, corpus)
+            t0 = time.perf_counter()
+            backend = QuantizedBackend(store, quantizer, train_size=args.train_size, rerank_k=args.rerank_k)
+            build_seconds = time.perf_counter() - t0
+            code_bytes = backend.memory_bytes()
+            for rerank in (False, True):
+                latencies, found_ids = timed_search(backend, queries, args.top_k, rerank=rerank)
+                label = f"{name}{' + rerank' if rerank else ''}"
+                print(f"{label:<22}{code_bytes / 2**20:>10.1f}{float_bytes / code_bytes:>8.1f}"
+                      f"{recall_at_k(found_ids, exact_ids):>10.4f}"
+                      f"{np.percentile(latencies, 50):>9.2f}{np.percentile(latencies, 95):>9.2f}")
+            print(f"  ({name} train + encode: {build_seconds:.1f}s)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
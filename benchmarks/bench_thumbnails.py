@@ -0,0 +1,88 @@
+import argparse
+import base64
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+# Make the project modules importable when running from the benchmarks/ directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from thumbnails import ThumbnailCache
+
+
+def make_images(directory, count, width, height, seed):
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(count):
+        # Smooth gradients plus noise compress roughly like photos do
+        base = np.linspace(0, 255, width, dtype=np.float32)[np.newaxis, :, np.newaxis]
+        pixels = np.clip(base + rng.normal(0, 20, (height, width, 3)), 0, 255).astype(np.uint8)
+        path = os.path.join(directory, f"image_{i}.png" if i % 2 else f"image_{i}.jpg")
+        Image.fromarray(pixels).save(path)
+        paths.append(path)
+    return paths
+
+
+def render_original(paths):
+    """The old search_items path: every full-size file base64-encoded into the HTML."""
+    html = ""
+    for path in paths:
+        with open(path, "rb") as f:
+            encoded = base64.b64encode(f.read()).decode()
+        html += f"<img src='data:image/png;base64,{encoded}' width='500'>"
+    return html
+
+
+def render_thumbnails(cache, paths, mode):
+    html = ""
+    for path in paths:
+        src = cache.url(path, "/gradio_api/file=") if mode == "url" else cache.data_uri(path)
+        html += f"<img src='{src}' width='500'>"
+    return html
+
+
+def timed(fn, repeat):
+    """(result of the last run, mean wall time in ms)."""
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - t0) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search-result HTML size and render latency with and without thumbnails.")
+    parser.add_argument("--top-k", type=int, default=20, help="Image hits per rendered response.")
+    parser.add_argument("--width", type=int, default=3000)
+    parser.add_argument("--height", type=int, default=2000)
+    parser.add_argument("--max-side", type=int, default=512)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_thumbnails_")
+    try:
+        paths = make_images(workdir, args.top_k, args.width, args.height, args.seed)
+        source_mb = sum(os.path.getsize(p) for p in paths) / 1e6
+        print(f"{args.top_k} images of {args.width}x{args.height}, {source_mb:.1f} MB on disk")
+
+        html, ms = timed(lambda: render_original(paths), args.repeat)
+        print(f"  original base64:       {len(html) / 1e6:8.2f} MB, {ms:8.1f} ms")
+
+        cache = ThumbnailCache(os.path.join(workdir, "thumbnails"), max_side=args.max_side)
+        html, ms = timed(lambda: render_thumbnails(cache, paths, "inline"), 1)
+        print(f"  inline, cold cache:    {len(html) / 1e6:8.2f} MB, {ms:8.1f} ms")
+        html, ms = timed(lambda: render_thumbnails(cache, paths, "inline"), args.repeat)
+        print(f"  inline, warm cache:    {len(html) / 1e6:8.2f} MB, {ms:8.1f} ms")
+        html, ms = timed(lambda: render_thumbnails(cache, paths, "url"), args.repeat)
+        print(f"  url, warm cache:       {len(html) / 1e6:8.2f} MB, {ms:8.1f} ms")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
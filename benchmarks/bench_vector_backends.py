@@ -0,0 +1,91 @@
+import argparse
+import os
+import sys
+import time
+import uuid
+
+import numpy as np
+
+# Make the project modules importable when running from the benchmarks/ directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chromadb
+from database import ChromaBackend, NumpyBackend
+
+
+def random_unit_vectors(n, dim, rng):
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def recall_at_k(found_ids, exact_ids):
+    """Mean fraction of the exact top-k ids that a backend also returned."""
+    hits = [len(set(found) & set(exact)) / len(exact) for found, exact in zip(found_ids, exact_ids) if exact]
+    return float(np.mean(hits)) if hits else 0.0
+
+
+def time_queries(backend, queries, top_k, batch_size):
+    """Returns (per-query latencies in ms, result ids) for the backend."""
+    latencies, all_ids = [], []
+    for start in range(0, len(queries), batch_size):
+        batch = queries[start:start + batch_size]
+        t0 = time.perf_counter()
+        results = backend.search(batch, top_k)
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        latencies.extend([elapsed_ms / len(batch)] * len(batch))
+        all_ids.extend(results['ids'])
+    return np.array(latencies), all_ids
+
+
+def report(name, build_seconds, latencies, recall):
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(f"{name:<14} build {build_seconds:7.2f}s | per-query ms p50 {p50:7.3f} p95 {p95:7.3f} p99 {p99:7.3f} | recall {recall:.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the exact NumPy backend against ChromaDB's HNSW index.")
+    parser.add_argument("--num-vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=3584, help="Embedding width (GME-Qwen2-VL-7B emits 3584).")
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=32, help="Queries per multi-query call for the batched runs.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    corpus = random_unit_vectors(args.num_vectors, args.dim, rng)
+    # Queries near corpus points, so the neighbourhoods are meaningful
+    anchors = corpus[rng.integers(0, args.num_vectors, args.num_queries)]
+    queries = anchors + 0.5 * random_unit_vectors(args.num_queries, args.dim, rng)
+    ids = [str(uuid.uuid4()) for _ in range(args.num_vectors)]
+
+    print(f"Corpus: {args.num_vectors} x {args.dim}, {args.num_queries} queries, top_k={args.top_k}\n")
+
+    backends = {}
+    for name, dtype in (("numpy-fp32", np.float32), ("numpy-fp16", np.float16)):
+        backend = NumpyBackend(dtype)
+        t0 = time.perf_counter()
+        backend.add(ids, corpus)
+        backends[name] = (backend, time.perf_counter() - t0)
+
+    client = chromadb.EphemeralClient()
+    collection = client.create_collection(name=f"bench_{uuid.uuid4().hex}", metadata={"hnsw:space": "cosine"})
+    chunk = client.get_max_batch_size()
+    t0 = time.perf_counter()
+    for start in range(0, args.num_vectors, chunk):
+        collection.add(ids=ids[start:start + chunk], embeddings=corpus[start:start + chunk].tolist())
+    backends["chroma-hnsw"] = (ChromaBackend(collection), time.perf_counter() - t0)
+
+    exact_backend = backends["numpy-fp32"][0]
+    exact_ids = exact_backend.search(queries, args.top_k)['ids']
+
+    for batch_size in (1, args.batch_size):
+        print(f"--- {batch_size} quer{'y' if batch_size == 1 else 'ies'} per call ---")
+        for name, (backend, build_seconds) in backends.items():
+            latencies, found_ids = time_queries(backend, queries, args.top_k, batch_size)
+            report(name, build_seconds, latencies, recall_at_k(found_ids, exact_ids))
+        print()
+
+
+if __name__ == "__main__":
+    main()
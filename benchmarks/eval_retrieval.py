@@ -0,0 +1,226 @@
+import argparse
+import json
+import math
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Make the project modules importable when running from the benchmarks/ directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fake_embedder import HashingEmbedder
+from import_data import import_batch
+from retriever import Retriever
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def load_corpus(path):
+    """
+    Reads (title, abstract, url) documents from data.json (CSL-JSON with `abstract`) or
+    imported_data.json (records with `content`); records missing a title or abstract are skipped.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    corpus = []
+    for record in records:
+        title = (record.get("title") or "").strip()
+        abstract = (record.get("abstract") or record.get("content") or "").strip()
+        if title and abstract:
+            corpus.append({"title": title, "abstract": abstract, "url": record.get("URL") or record.get("url") or ""})
+    return corpus
+
+
+def build_queries(corpus, query_set, seed=0):
+    """
+    Returns [(query_text, relevant_doc_index), ...].
+
+    'title': each title is the query for its own abstract. Only the abstract is embedded, but
+    titles are part of the BM25 index, so this set favours the sparse and hybrid modes.
+    'sentence': one random sentence of each abstract (of at least two sentences) as a
+    partial-match query for the whole abstract.
+    """
+    rng = random.Random(seed)
+    if query_set == "title":
+        return [(doc["title"], i) for i, doc in enumerate(corpus)]
+    if query_set == "sentence":
+        queries = []
+        for i, doc in enumerate(corpus):
+            sentences = [s for s in SENTENCE_END.split(doc["abstract"]) if len(s.split()) >= 5]
+            if len(sentences) >= 2:
+                queries.append((rng.choice(sentences), i))
+        return queries
+    raise ValueError(f"Unknown query set '{query_set}'. Choose from: title, sentence")
+
+
+def recall_at_k(ranked, relevant, k):
+    return len(set(ranked[:k]) & relevant) / len(relevant)
+
+
+def reciprocal_rank(ranked, relevant, k):
+    for rank, item_id in enumerate(ranked[:k], start=1):
+        if item_id in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def ndcg_at_k(ranked, relevant, k):
+    """Binary-relevance nDCG: gains of 1 discounted by log2(rank + 1), over the ideal ordering."""
+    dcg = sum(1.0 / math.log2(rank + 1) for rank, item_id in enumerate(ranked[:k], start=1) if item_id in relevant)
+    ideal = sum(1.0 / math.log2(rank + 1) for rank in range(1, min(len(relevant), k) + 1))
+    return dcg / ideal if ideal else 0.0
+
+
+def quality_metrics(ranked_lists, relevant_sets, ks=(1, 5, 10)):
+    metrics = {}
+    for k in ks:
+        metrics[f"recall@{k}"] = float(np.mean([recall_at_k(r, rel, k) for r, rel in zip(ranked_lists, relevant_sets)]))
+    k = max(ks)
+    metrics[f"mrr@{k}"] = float(np.mean([reciprocal_rank(r, rel, k) for r, rel in zip(ranked_lists, relevant_sets)]))
+    metrics[f"ndcg@{k}"] = float(np.mean([ndcg_at_k(r, rel, k) for r, rel in zip(ranked_lists, relevant_sets)]))
+    return metrics
+
+
+def percentiles(latencies_ms):
+    if not latencies_ms:
+        return {}
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {"p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99), "mean_ms": float(np.mean(latencies_ms))}
+
+
+def make_retriever(embedder, db_path, backend, dim, latency_ms, item_latency_ms):
+    """A Retriever on a fresh database, with the GME model or the CPU hashing stand-in; caches are off."""
+    model = None
+    if embedder == "hashing":
+        model = HashingEmbedder(dim=dim, latency_ms=latency_ms, item_latency_ms=item_latency_ms)
+    elif embedder != "gme":
+        raise ValueError(f"Unknown embedder '{embedder}'. Choose from: hashing, gme")
+    return Retriever(db_path=db_path, embedding_cache_dir=None, query_cache_size=0, vector_backend=backend,
+                     model=model)
+
+
+def ingest(retriever, corpus, batch_size):
+    """Adds the abstracts through the import path. Returns (doc index -> item id, stats)."""
+    records = [(i, doc["title"], doc["abstract"], doc["url"]) for i, doc in enumerate(corpus)]
+    ids = {}
+    batch_ms = []
+    t_start = time.perf_counter()
+    for start in range(0, len(records), batch_size):
+        t0 = time.perf_counter()
+        for index, record in import_batch(retriever, retriever.db, records[start:start + batch_size], None):
+            ids[index] = record["id_in_db"]
+        batch_ms.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - t_start
+    return ids, dict(docs=len(records), seconds=elapsed, docs_per_second=len(records) / elapsed,
+                     batch_latency=percentiles(batch_ms))
+
+
+def run_queries(retriever, queries, top_k, mode):
+    """Runs each query on its own, timing the embedding and index stages. Returns (ranked ids, latencies)."""
+    ranked, stages = [], {"embed": [], "search": [], "total": []}
+    for query, _ in queries:
+        t0 = time.perf_counter()
+        embedding = retriever.embed_query(query) if mode != "sparse" else None
+        t1 = time.perf_counter()
+        if mode == "sparse":
+            results = retriever.search_sparse(query, top_k=top_k)
+        elif mode == "hybrid":
+            results = retriever.search_hybrid_by_embedding(query, embedding, top_k=top_k)
+        else:
+            results = retriever.search_by_embedding(embedding, top_k=top_k)
+        t2 = time.perf_counter()
+        ranked.append([item["id"] for _, item in results])
+        if mode != "sparse":
+            stages["embed"].append((t1 - t0) * 1000)
+        stages["search"].append((t2 - t1) * 1000)
+        stages["total"].append((t2 - t0) * 1000)
+    return ranked, {stage: percentiles(values) for stage, values in stages.items()}
+
+
+def run_batch(retriever, queries, top_k, batch_size):
+    """One `search_batch` over all queries. Returns (ranked ids, timings with queries per second)."""
+    results, timings = retriever.search_batch([q for q, _ in queries], top_k=top_k, batch_size=batch_size)
+    timings["queries_per_second"] = len(queries) / (timings["total_ms"] / 1000) if timings["total_ms"] else 0.0
+    return [[item["id"] for _, item in hits] for hits in results], timings
+
+
+def print_report(report):
+    ingestion = report["ingestion"]
+    print(f"\nIngestion: {ingestion['docs']} docs in {ingestion['seconds']:.2f}s "
+          f"({ingestion['docs_per_second']:.1f} docs/s), batch p50 {ingestion['batch_latency']['p50_ms']:.1f} ms")
+    for name, run in report["runs"].items():
+        quality = "  ".join(f"{metric} {value:.3f}" for metric, value in run["quality"].items())
+        print(f"\n[{name}] {quality}")
+        for stage, stats in run["latency"].items():
+            if stats:
+                print(f"  {stage:<7} p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms")
+    batch = report.get("batch")
+    if batch:
+        print(f"\n[dense, search_batch] {batch['timings']['queries_per_second']:.1f} queries/s "
+              f"(embed {batch['timings']['embed_ms']:.1f} ms, search {batch['timings']['search_ms']:.1f} ms, "
+              f"total {batch['timings']['total_ms']:.1f} ms)  "
+              + "  ".join(f"{metric} {value:.3f}" for metric, value in batch["quality"].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Offline retrieval quality (recall@k, MRR, nDCG) and latency evaluation on a fresh database."
+    )
+    parser.add_argument("--data", default="data.json", help="data.json or imported_data.json style corpus.")
+    parser.add_argument("--query-set", default="title", choices=["title", "sentence"])
+    parser.add_argument("--embedder", default="hashing", choices=["hashing", "gme"],
+                        help="'hashing' runs on CPU without model weights; 'gme' loads GME-Qwen2-VL.")
+    parser.add_argument("--dim", type=int, default=512, help="Width of the hashing embedder.")
+    parser.add_argument("--fake-latency-ms", type=float, default=0.0, help="Per-call delay of the hashing embedder.")
+    parser.add_argument("--fake-item-latency-ms", type=float, default=0.0, help="Per-input delay of the hashing embedder.")
+    parser.add_argument("--backend", default="numpy", help="Vector backend of the evaluation database.")
+    parser.add_argument("--modes", default="dense,sparse,hybrid", help="Comma-separated search modes to evaluate.")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--max-queries", type=int, default=None)
+    parser.add_argument("--ingest-batch-size", type=int, default=16)
+    parser.add_argument("--query-batch-size", type=int, default=32, help="Batch size of the search_batch run.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the full report as JSON to this file.")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.data)
+    queries = build_queries(corpus, args.query_set, args.seed)
+    if args.max_queries:
+        queries = random.Random(args.seed).sample(queries, min(args.max_queries, len(queries)))
+    print(f"Corpus: {len(corpus)} documents from {args.data}; {len(queries)} '{args.query_set}' queries; "
+          f"embedder={args.embedder}, backend={args.backend}")
+
+    db_path = tempfile.mkdtemp(prefix="eval_retrieval_")
+    try:
+        retriever = make_retriever(args.embedder, db_path, args.backend, args.dim,
+                                   args.fake_latency_ms, args.fake_item_latency_ms)
+        # Create the BM25 index up front so ingestion pays for keeping it current, as in a running app
+        retriever.db.sparse_index
+        doc_ids, ingestion = ingest(retriever, corpus, args.ingest_batch_size)
+        relevant = [{doc_ids[index]} for _, index in queries]
+        report = {"config": vars(args), "ingestion": ingestion, "runs": {}}
+        for mode in args.modes.split(","):
+            ranked, latency = run_queries(retriever, queries, args.top_k, mode)
+            report["runs"][mode] = {"quality": quality_metrics(ranked, relevant, ks=(1, 5, args.top_k)),
+                                    "latency": latency}
+        ranked, timings = run_batch(retriever, queries, args.top_k, args.query_batch_size)
+        report["batch"] = {"quality": quality_metrics(ranked, relevant, ks=(1, 5, args.top_k)), "timings": timings}
+    finally:
+        shutil.rmtree(db_path, ignore_errors=True)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import time
+import zlib
+
+import numpy as np
+import torch
+
+from embedding_cache import read_image_bytes
+from sparse_index import tokenize
+
+
+class HashingEmbedder:
+    """
+    CPU stand-in for GmeQwen2VL: feature-hashed unigrams and bigrams, L2-normalized.
+
+    Exposes the `get_*_embeddings` methods the Retriever calls and returns torch tensors,
+    so caching, batching, indexing and search run unchanged without the 7B weights.
+    Texts sharing words get similar vectors, which keeps quality metrics meaningful;
+    images are embedded from a hash of their bytes. `latency_ms` adds a fixed delay per
+    call plus `item_latency_ms` per input, to mimic model cost in latency runs.
+    """
+
+    default_instruction = "You are a helpful assistant."
+
+    def __init__(self, dim=512, latency_ms=0.0, item_latency_ms=0.0):
+        self.dim = dim
+        self.latency = latency_ms / 1000.0
+        self.item_latency = item_latency_ms / 1000.0
+        self.calls = 0
+
+    def _text_vector(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        tokens = tokenize(text)
+        for feature in tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]:
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        return vector
+
+    def _image_vector(self, image):
+        data = read_image_bytes(image) if isinstance(image, str) else None
+        rng = np.random.default_rng(zlib.crc32(data or repr(image).encode("utf-8")))
+        return rng.standard_normal(self.dim).astype(np.float32)
+
+    def get_fused_embeddings(self, texts=None, images=None, **kwargs):
+        n_items = len(texts) if texts is not None else len(images)
+        self.calls += 1
+        if self.latency or self.item_latency:
+            time.sleep(self.latency + self.item_latency * n_items)
+        vectors = np.zeros((n_items, self.dim), dtype=np.float32)
+        for i in range(n_items):
+            if texts is not None and texts[i]:
+                vectors[i] += self._text_vector(texts[i])
+            if images is not None and images[i] is not None:
+                vectors[i] += self._image_vector(images[i])
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return torch.from_numpy(vectors / np.maximum(norms, 1e-12))
+
+    def get_text_embeddings(self, texts, **kwargs):
+        return self.get_fused_embeddings(texts=texts, **kwargs)
+
+    def get_image_embeddings(self, images, **kwargs):
+        return self.get_fused_embeddings(images=images, **kwargs)
@@ -0,0 +1,168 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_extraction(text):
+    words = text.split()
+    return {
+        "model_name": words[0] if words else "N/A",
+        "primary_task": "Text Generation",
+        "key_contribution": " ".join(words[:12]),
+        "datasets_used": [],
+        "evaluation_metrics": [],
+        "one_sentence_summary": " ".join(words[:20]),
+    }
+
+
+BATCH_ITEM = re.compile(r"^### Item (\S+)\n(.*?)(?=\n\n### Item |\Z)", re.S | re.M)
+
+
+def fake_batch_extraction(text, drop_rate):
+    """Answers a batched prompt; `drop_rate` of the elements are left out or missing keys."""
+    results = []
+    for item_id, item_text in BATCH_ITEM.findall(text):
+        element = dict(fake_extraction(item_text), id=item_id)
+        roll = random.random()
+        if roll < drop_rate / 2:
+            continue
+        if roll < drop_rate:
+            del element["key_contribution"]
+        results.append(element)
+    return {"results": results}
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible `/v1/chat/completions` with latency, a requests-per-minute limit and injected errors."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        retry_after = server.admit()
+        if retry_after is not None:
+            self._send(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                       {"retry-after": f"{retry_after:.3f}"})
+            return
+        time.sleep(server.latency * random.uniform(0.5, 1.5))
+        if random.random() < server.error_rate:
+            server.count("errors")
+            self._send(500, {"error": {"message": "Injected server error"}})
+            return
+
+        user_content = request["messages"][-1]["content"]
+        texts = [part["text"] for part in user_content if part.get("type") == "text"] if isinstance(user_content, list) else [user_content]
+        text = " ".join(texts)
+        if text.startswith("### Item "):
+            content = json.dumps(fake_batch_extraction(text, server.batch_drop_rate))
+        else:
+            content = json.dumps(fake_extraction(text))
+        prompt_tokens = sum(len(m["content"]) if isinstance(m["content"], str) else 0 for m in request["messages"]) // 4
+        prompt_tokens += sum(len(t) for t in texts) // 4
+        server.count("completed")
+        self._send(200, {
+            "id": f"chatcmpl-{random.getrandbits(48):x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+                      "total_tokens": prompt_tokens + len(content) // 4},
+        })
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """Run in-process with `start()`; point clients at `base_url`."""
+
+    daemon_threads = True
+    request_queue_size = 256  # the default listen backlog of 5 resets connections under concurrent load
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=200.0, requests_per_minute=None, error_rate=0.0,
+                 batch_drop_rate=0.0):
+        super().__init__((host, port), FakeOpenAIHandler)
+        self.latency = latency_ms / 1000.0
+        self.requests_per_minute = requests_per_minute
+        self.error_rate = error_rate
+        self.batch_drop_rate = batch_drop_rate
+        # Continuously replenished request budget, like OpenAI's own limits
+        self.budget = float(requests_per_minute or 0)
+        self.refilled = time.monotonic()
+        self.counters = {"completed": 0, "rate_limited": 0, "errors": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def admit(self):
+        """None if the request is admitted, otherwise the seconds until a request fits the budget."""
+        if not self.requests_per_minute:
+            return None
+        rate = self.requests_per_minute / 60.0
+        with self._lock:
+            now = time.monotonic()
+            self.budget = min(self.requests_per_minute, self.budget + (now - self.refilled) * rate)
+            self.refilled = now
+            if self.budget >= 1:
+                self.budget -= 1
+                return None
+            self.counters["rate_limited"] += 1
+            return (1 - self.budget) / rate
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake OpenAI-compatible chat completions server for extraction tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Mean response latency.")
+    parser.add_argument("--rpm", type=int, default=None, help="Requests per minute before answering 429.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500.")
+    parser.add_argument("--batch-drop-rate", type=float, default=0.0,
+                        help="Fraction of batched reply elements left out or invalid.")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(args.host, args.port, args.latency_ms, args.rpm, args.error_rate, args.batch_drop_rate)
+    print(f"Fake OpenAI server at {server.base_url} (use any API key)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Served: {server.counters}")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+
+def load_queries(data_file, limit):
+    with open(data_file, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    queries = [r["title"] for r in records if r.get("title")][:limit]
+    if not queries:
+        raise ValueError(f"No titles found in {data_file}")
+    return queries
+
+
+def post_json(url, payload, timeout):
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode("utf-8"), headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.status, response.read()
+
+
+def worker(args, queries, offset, deadline, latencies, errors, lock):
+    url = args.url.rstrip("/") + ("/search/batch" if args.batch_size > 1 else "/search")
+    i = offset
+    while time.perf_counter() < deadline:
+        if args.batch_size > 1:
+            batch = [queries[(i + j) % len(queries)] for j in range(args.batch_size)]
+            payload = {"queries": [{"query": q} for q in batch], "top_k": args.top_k}
+        else:
+            payload = {"query": queries[i % len(queries)], "top_k": args.top_k}
+        i += args.concurrency * args.batch_size
+        t0 = time.perf_counter()
+        try:
+            post_json(url, payload, args.timeout)
+            elapsed = time.perf_counter() - t0
+            with lock:
+                latencies.append(elapsed)
+        except urllib.error.HTTPError as e:
+            with lock:
+                errors[e.code] = errors.get(e.code, 0) + 1
+        except Exception as e:
+            with lock:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Closed-loop load generator for api_server.py.")
+    parser.add_argument("--url", default="http://127.0.0.1:10100")
+    parser.add_argument("--data-file", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data.json"),
+                        help="JSON records whose titles are used as queries.")
+    parser.add_argument("--num-queries", type=int, default=1000, help="Distinct queries to cycle through.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent client threads.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run.")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=1, help="Queries per request; >1 uses /search/batch.")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    queries = load_queries(args.data_file, args.num_queries)
+    latencies, errors, lock = [], {}, threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    threads = [
+        threading.Thread(target=worker, args=(args, queries, i * args.batch_size, deadline, latencies, errors, lock))
+        for i in range(args.concurrency)
+    ]
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - t0
+
+    print(f"Concurrency {args.concurrency}, batch size {args.batch_size}, {wall:.1f}s")
+    print(f"  requests ok: {len(latencies)}, errors: {sum(errors.values())} {errors if errors else ''}")
+    if latencies:
+        ms = np.array(latencies) * 1000
+        print(f"  request QPS: {len(latencies) / wall:.1f}, query QPS: {len(latencies) * args.batch_size / wall:.1f}")
+        print(f"  latency ms: p50 {np.percentile(ms, 50):.1f}, p95 {np.percentile(ms, 95):.1f}, "
+              f"p99 {np.percentile(ms, 99):.1f}, max {ms.max():.1f}")
+
+
+if __name__ == "__main__":
+    main()
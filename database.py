@@ -1,36 +1,755 @@
 import chromadb
+import json
+import os
+import threading
 import uuid
 import numpy as np
+from vector_store import FlatVectorStore
+from quantization import QUANTIZERS
+from metadata_schema import build_where, make_metadata, read_metadata
+from sparse_index import BM25Index, document_text
+from tracing import span, traced
+
+
+class VectorBackend:
+    """
+    Nearest-neighbour index behind `Database.query`.
+
+    ChromaDB remains the store of record for ids, metadata and embeddings; a backend
+    only answers top-k queries. `search` returns a dict shaped like a Chroma query
+    result (`ids` and `distances`, one list per query, with similarity = 1 - distance).
+    It may also include `metadatas`; otherwise `Database` fetches them.
+
+    Filtered queries are pushed down: backends with `supports_where` receive the Chroma
+    `where` clause itself, the others receive `allowed_ids`, the ids that pass the filter,
+    and only score those rows.
+    """
+
+    supports_where = False
+
+    def add(self, ids, embeddings):
+        """Inserts or overwrites the given ids. `embeddings` is an (N, D) float32 matrix."""
+        raise NotImplementedError
+
+    def remove(self, ids):
+        raise NotImplementedError
+
+    def search(self, query_embeddings, top_k, allowed_ids=None):
+        """Returns the top_k neighbours of each row of the (Q, D) query matrix, among `allowed_ids` if given."""
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class ChromaBackend(VectorBackend):
+    """
+    Approximate search through the collection's own HNSW index.
+
+    Collections use Chroma's default squared-L2 space, whose distances are not
+    1 - cosine. There, `rescore_factor` * top_k hits are fetched with their embeddings
+    and rescored by exact cosine, which also corrects the order for vectors that are
+    not unit-length.
+    """
+
+    supports_where = True
+
+    def __init__(self, collection, rescore_factor=4):
+        self.collection = collection
+        self.rescore_factor = rescore_factor
+        self.space = (collection.metadata or {}).get("hnsw:space", "l2")
+
+    def add(self, ids, embeddings):
+        pass  # Chroma indexes the embeddings as part of `collection.add`
+
+    def remove(self, ids):
+        pass
+
+    def search(self, query_embeddings, top_k, allowed_ids=None, where=None):
+        if allowed_ids is not None:
+            raise ValueError("ChromaBackend filters with `where`, not `allowed_ids`")
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        if self.space == "cosine":
+            return self.collection.query(query_embeddings=queries.tolist(), n_results=top_k, where=where)
+        results = self.collection.query(
+            query_embeddings=queries.tolist(),
+            n_results=top_k * self.rescore_factor,
+            where=where,
+            include=["metadatas", "distances", "embeddings"]
+        )
+        normalized = NumpyBackend._normalize(queries)
+        for q, embeddings in enumerate(results['embeddings']):
+            if len(embeddings) == 0:
+                continue
+            similarities = NumpyBackend._normalize(np.asarray(embeddings, dtype=np.float32)) @ normalized[q]
+            order = np.argsort(-similarities, kind='stable')[:top_k]
+            results['ids'][q] = [results['ids'][q][i] for i in order]
+            results['metadatas'][q] = [results['metadatas'][q][i] for i in order]
+            results['distances'][q] = (1.0 - similarities[order]).tolist()
+        results['embeddings'] = None
+        return results
+
+    def __len__(self):
+        return self.collection.count()
+
+
+class NumpyBackend(VectorBackend):
+    """
+    Exact brute-force search over a contiguous matrix of L2-normalized vectors.
+
+    Scores are a single matmul per block followed by an `argpartition` top-k, so
+    results are exact and adds cost only a row copy. Rows are stored as float32 or
+    float16; float16 halves memory and is upcast block by block at query time.
+    """
+
+    def __init__(self, dtype=np.float32, block_rows=16384):
+        self.dtype = np.dtype(dtype)
+        self.block_rows = block_rows
+        self.matrix = None  # (capacity, D); only the first len(self.ids) rows are live
+        self.ids = []
+        self.rows = {}  # id -> row
+
+    @staticmethod
+    def _normalize(embeddings):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim == 1:
+            embeddings = embeddings[np.newaxis, :]
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
+    def _reserve(self, n_rows, dim):
+        if self.matrix is None:
+            self.matrix = np.empty((max(n_rows, 1024), dim), dtype=self.dtype)
+        elif n_rows > self.matrix.shape[0]:
+            grown = np.empty((max(n_rows, 2 * self.matrix.shape[0]), dim), dtype=self.dtype)
+            grown[:len(self.ids)] = self.matrix[:len(self.ids)]
+            self.matrix = grown
+
+    def add(self, ids, embeddings):
+        embeddings = self._normalize(embeddings)
+        self._reserve(len(self.ids) + len(ids), embeddings.shape[1])
+        for item_id, embedding in zip(ids, embeddings):
+            row = self.rows.get(item_id)
+            if row is None:
+                row = len(self.ids)
+                self.ids.append(item_id)
+                self.rows[item_id] = row
+            self.matrix[row] = embedding
+
+    def remove(self, ids):
+        for item_id in ids:
+            row = self.rows.pop(item_id, None)
+            if row is None:
+                continue
+            # Keep the matrix contiguous by moving the last live row into the hole
+            last = len(self.ids) - 1
+            if row != last:
+                moved_id = self.ids[last]
+                self.matrix[row] = self.matrix[last]
+                self.ids[row] = moved_id
+                self.rows[moved_id] = row
+            self.ids.pop()
+
+    def allowed_rows(self, allowed_ids):
+        """Sorted matrix rows of the given ids; ids not in the index are skipped."""
+        rows = np.fromiter((self.rows[item_id] for item_id in allowed_ids if item_id in self.rows), dtype=np.int64)
+        rows.sort()
+        return rows
+
+    def scores(self, query_embeddings, rows=None):
+        """Returns the (Q, N) cosine similarity matrix against every live row, or only against `rows`."""
+        queries = self._normalize(query_embeddings)
+        n_rows = len(self.ids) if rows is None else len(rows)
+        scores = np.empty((queries.shape[0], n_rows), dtype=np.float32)
+        for start in range(0, n_rows, self.block_rows):
+            end = min(start + self.block_rows, n_rows)
+            block = self.matrix[start:end] if rows is None else self.matrix[rows[start:end]]
+            if block.dtype != np.float32:
+                block = block.astype(np.float32)
+            scores[:, start:end] = queries @ block.T
+        return scores
+
+    def search(self, query_embeddings, top_k, allowed_ids=None):
+        # A filter gathers just the allowed rows, so the scan shrinks with its selectivity
+        rows = None if allowed_ids is None else self.allowed_rows(allowed_ids)
+        scores = self.scores(query_embeddings, rows)
+        top_cols = top_k_rows(scores, top_k)
+        return {
+            'ids': [[self.ids[col if rows is None else rows[col]] for col in cols] for cols in top_cols],
+            'distances': [
+                (1.0 - scores[q, cols]).tolist() for q, cols in enumerate(top_cols)
+            ],
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class FlatBackend(VectorBackend):
+    """
+    Exact search over a `FlatVectorStore`, scanning its memory-mapped segments in place.
+
+    Each segment is scored block by block, dead rows are masked out, and the per-segment
+    top-k lists are merged, so no vector is copied into process memory at startup.
+    """
+
+    # A filter passing fewer than this fraction of the rows gathers them; larger ones mask the full scan
+    gather_fraction = 0.25
+
+    def __init__(self, store, block_rows=16384):
+        self.store = store
+        self.block_rows = block_rows
+
+    def add(self, ids, embeddings):
+        self.store.append(ids, embeddings)
+
+    def remove(self, ids):
+        self.store.delete(ids)
+
+    def search(self, query_embeddings, top_k, allowed_ids=None):
+        queries = NumpyBackend._normalize(query_embeddings)
+        if allowed_ids is not None and len(allowed_ids) < self.gather_fraction * len(self.store):
+            return search_subset(self.store, queries, allowed_ids, top_k, self.block_rows)
+        n_queries = queries.shape[0]
+        best_scores = np.full((n_queries, 0), -np.inf, dtype=np.float32)
+        best_ids = np.empty((n_queries, 0), dtype=object)
+        with self.store._lock:
+            segments = list(self.store.segments)
+        for segment in segments:
+            for start in range(0, segment.count, self.block_rows):
+                end = min(start + self.block_rows, segment.count)
+                live = segment.live[start:end]
+                if allowed_ids is not None:
+                    live = live & np.fromiter((item_id in allowed_ids for item_id in segment.ids[start:end]),
+                                              dtype=bool, count=end - start)
+                if not live.any():
+                    continue
+                scores = queries @ np.asarray(segment.vectors[start:end], dtype=np.float32).T
+                scores[:, ~live] = -np.inf
+                rows = top_k_rows(scores, top_k)
+                block_ids = np.array(segment.ids[start:end], dtype=object)
+                # Merge this block's candidates into the running top-k
+                best_scores = np.concatenate([best_scores, np.take_along_axis(scores, rows, axis=1)], axis=1)
+                best_ids = np.concatenate([best_ids, block_ids[rows]], axis=1)
+                keep = top_k_rows(best_scores, top_k)
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_ids = np.take_along_axis(best_ids, keep, axis=1)
+
+        results = {'ids': [], 'distances': []}
+        for q in range(n_queries):
+            found = np.isfinite(best_scores[q])
+            results['ids'].append(best_ids[q][found].tolist())
+            results['distances'].append((1.0 - best_scores[q][found]).tolist())
+        return results
+
+    def __len__(self):
+        return len(self.store)
+
+
+class QuantizedBackend(VectorBackend):
+    """
+    Compressed in-memory index (int8 or product-quantized codes) with full-precision re-ranking.
+
+    Only the codes live in RAM. A query scores every code with asymmetric distance, keeps
+    the best `rerank_k` candidates, and re-scores them exactly against their float16 rows
+    in the memory-mapped `FlatVectorStore`. Until `train_size` vectors exist the quantizer
+    is untrained and queries fall back to an exact scan of the store.
+
+    With `path`, the codebook, codes and ids are saved there after training and loaded on
+    the next start; only rows appended to the store since the save are encoded. A saved
+    codebook whose settings or width no longer match is retrained, as with `retrain=True`.
+    """
+
+    def __init__(self, store, quantizer, train_size=4096, rerank_k=200, block_rows=65536, path=None,
+                 retrain=False):
+        self.store = store
+        self.quantizer = quantizer
+        self.train_size = train_size
+        self.rerank_k = rerank_k
+        self.block_rows = block_rows
+        self.path = path
+        self.codes = None  # (capacity, code width); only the first len(self.ids) rows are live
+        self.ids = []
+        self.rows = {}  # id -> row
+        self.exact = FlatBackend(store)
+        if not retrain and self._load():
+            return
+        if len(store) >= train_size:
+            self.train()
+
+    def train(self):
+        """(Re)trains the quantizer on a sample of the stored vectors and re-encodes all of them."""
+        sample, total = [], 0
+        for _, vectors in self.store.iter_live():
+            sample.append(vectors.astype(np.float32))
+            total += len(vectors)
+            if total >= self.train_size:
+                break
+        self.quantizer.train(np.concatenate(sample)[:self.train_size])
+        self._encode_store()
+
+    def _encode_store(self):
+        position = self.store.position()
+        self.codes, self.ids, self.rows = None, [], {}
+        for ids, vectors in self.store.iter_live():
+            self._add_codes(ids, self.quantizer.encode(vectors.astype(np.float32)))
+        self.save(position)
+
+    def save(self, position=None):
+        """
+        Writes the codebook, codes and ids to `path`. `position` is the store position the
+        codes are complete up to (default: the current one); later rows are encoded on load.
+        """
+        if self.path is None or not self.quantizer.trained:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        position = self.store.position() if position is None else position
+        n_rows = len(self.ids)
+        np.savez(os.path.join(self.path, "quantizer.tmp.npz"), **self.quantizer.state())
+        with open(os.path.join(self.path, "codes.tmp.npy"), "wb") as f:
+            np.save(f, self.codes[:n_rows])
+        with open(os.path.join(self.path, "ids.tmp"), "wb") as f:
+            f.write("".join(f"{item_id}\n" for item_id in self.ids).encode("utf-8"))
+        for name in ("quantizer.npz", "codes.npy", "ids"):
+            stem, ext = os.path.splitext(name)
+            os.replace(os.path.join(self.path, f"{stem}.tmp{ext}"), os.path.join(self.path, name))
+        manifest_file = os.path.join(self.path, "manifest.json")
+        with open(manifest_file + ".tmp", "w") as f:
+            json.dump({
+                "quantizer": type(self.quantizer).__name__,
+                "config": self.quantizer.config(),
+                "dim": self.store.dim,
+                "count": n_rows,
+                "store_generation": self.store.generation,
+                "store_position": list(position),
+            }, f)
+        # The manifest goes last: its count is what makes the other files valid together
+        os.replace(manifest_file + ".tmp", manifest_file)
+
+    def _load(self):
+        """Restores the saved index and catches up with the store. Returns False when there is nothing usable."""
+        manifest_file = os.path.join(self.path, "manifest.json") if self.path else None
+        if manifest_file is None or not os.path.exists(manifest_file):
+            return False
+        with open(manifest_file, "r") as f:
+            manifest = json.load(f)
+        if (manifest["quantizer"] != type(self.quantizer).__name__ or manifest["config"] != self.quantizer.config()
+                or manifest["dim"] != self.store.dim):
+            print(f"Saved {manifest['quantizer']} index in {self.path} does not match the current settings, retraining.")
+            return False
+        with np.load(os.path.join(self.path, "quantizer.npz")) as state:
+            self.quantizer.load_state({key: state[key] for key in state.files})
+        if manifest["store_generation"] != self.store.generation:
+            # A compaction rewrote the store since the save, so the saved position means nothing
+            self._encode_store()
+            return True
+
+        codes = np.load(os.path.join(self.path, "codes.npy"))
+        with open(os.path.join(self.path, "ids"), "rb") as f:
+            ids = [line.decode("utf-8") for line in f.read().split(b"\n")[:manifest["count"]]]
+        self.codes, self.ids = codes, ids
+        self.rows = {item_id: row for row, item_id in enumerate(ids)}
+        self.remove([item_id for item_id in ids if item_id not in self.store], from_store=False)
+        caught_up = 0
+        for new_ids, vectors in self.store.iter_live_since(manifest["store_position"]):
+            self._add_codes(new_ids, self.quantizer.encode(vectors.astype(np.float32)))
+            caught_up += len(new_ids)
+        if caught_up:
+            self.save()
+        return True
+
+    def _add_codes(self, ids, codes):
+        n_rows = len(self.ids) + len(ids)
+        if self.codes is None:
+            self.codes = np.empty((max(n_rows, 1024), codes.shape[1]), dtype=codes.dtype)
+        elif n_rows > self.codes.shape[0]:
+            grown = np.empty((max(n_rows, 2 * self.codes.shape[0]), codes.shape[1]), dtype=codes.dtype)
+            grown[:len(self.ids)] = self.codes[:len(self.ids)]
+            self.codes = grown
+        for item_id, code in zip(ids, codes):
+            row = self.rows.get(item_id)
+            if row is None:
+                row = len(self.ids)
+                self.ids.append(item_id)
+                self.rows[item_id] = row
+            self.codes[row] = code
+
+    def add(self, ids, embeddings):
+        self.store.append(ids, embeddings)
+        if self.quantizer.trained:
+            self._add_codes(list(ids), self.quantizer.encode(NumpyBackend._normalize(embeddings)))
+        elif len(self.store) >= self.train_size:
+            self.train()
+
+    def remove(self, ids, from_store=True):
+        if from_store:
+            self.store.delete(ids)
+        for item_id in ids:
+            row = self.rows.pop(item_id, None)
+            if row is None:
+                continue
+            last = len(self.ids) - 1
+            if row != last:
+                moved_id = self.ids[last]
+                self.codes[row] = self.codes[last]
+                self.ids[row] = moved_id
+                self.rows[moved_id] = row
+            self.ids.pop()
+
+    def approximate_scores(self, queries):
+        n_rows = len(self.ids)
+        scores = np.empty((queries.shape[0], n_rows), dtype=np.float32)
+        for start in range(0, n_rows, self.block_rows):
+            end = min(start + self.block_rows, n_rows)
+            scores[:, start:end] = self.quantizer.scores(queries, self.codes[start:end])
+        return scores
+
+    def search(self, query_embeddings, top_k, rerank=True, allowed_ids=None):
+        if not self.quantizer.trained:
+            return self.exact.search(query_embeddings, top_k, allowed_ids=allowed_ids)
+        queries = NumpyBackend._normalize(query_embeddings)
+        scores = self.approximate_scores(queries)
+        if allowed_ids is not None:
+            # Bitmap pre-filter: rows outside the filter can never become candidates
+            allowed = np.zeros(len(self.ids), dtype=bool)
+            allowed[[self.rows[item_id] for item_id in allowed_ids if item_id in self.rows]] = True
+            scores[:, ~allowed] = -np.inf
+        n_candidates = max(top_k, self.rerank_k) if rerank else top_k
+        candidate_rows = top_k_rows(scores, n_candidates)
+        if allowed_ids is not None:
+            candidate_rows = [rows[np.isfinite(scores[q, rows])] for q, rows in enumerate(candidate_rows)]
+
+        results = {'ids': [], 'distances': []}
+        for query, rows in zip(queries, candidate_rows):
+            candidate_ids = [self.ids[row] for row in rows]
+            if rerank:
+                ids, distances = rerank_exact(self.store, query, candidate_ids, top_k)
+            else:
+                scores = self.quantizer.scores(query[np.newaxis, :], self.codes[rows])[0]
+                order = top_k_rows(scores[np.newaxis, :], top_k)[0]
+                ids, distances = [candidate_ids[i] for i in order], (1.0 - scores[order]).tolist()
+            results['ids'].append(ids)
+            results['distances'].append(distances)
+        return results
+
+    def memory_bytes(self):
+        """Bytes of RAM held by the codes (the full-precision rows stay on disk)."""
+        return self.quantizer.code_bytes(len(self.ids)) if self.quantizer.trained else 0
+
+    def __len__(self):
+        return len(self.store)
+
+
+class MatryoshkaBackend(VectorBackend):
+    """
+    Two-stage search over truncated embedding prefixes.
+
+    Stage one scans a compact float16 index of the first `prefix_dim` dimensions of each
+    vector, renormalized. Stage two re-scores the best `rerank_k` candidates with their
+    full-width rows from the memory-mapped `FlatVectorStore`.
+    """
+
+    def __init__(self, store, prefix_dim=1024, rerank_k=300):
+        self.store = store
+        self.prefix_dim = prefix_dim
+        self.rerank_k = rerank_k
+        self.prefix_index = NumpyBackend(np.float16)
+        for ids, vectors in store.iter_live():
+            self.prefix_index.add(ids, vectors[:, :prefix_dim])
+
+    def add(self, ids, embeddings):
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        self.store.append(ids, embeddings)
+        self.prefix_index.add(ids, embeddings[:, :self.prefix_dim])
+
+    def remove(self, ids):
+        self.store.delete(ids)
+        self.prefix_index.remove(ids)
+
+    def search(self, query_embeddings, top_k, rerank_k=None, allowed_ids=None):
+        queries = NumpyBackend._normalize(query_embeddings)
+        n_candidates = max(top_k, rerank_k or self.rerank_k)
+        candidates = self.prefix_index.search(queries[:, :self.prefix_dim], n_candidates, allowed_ids=allowed_ids)['ids']
+        results = {'ids': [], 'distances': []}
+        for query, candidate_ids in zip(queries, candidates):
+            ids, distances = rerank_exact(self.store, query, candidate_ids, top_k)
+            results['ids'].append(ids)
+            results['distances'].append(distances)
+        return results
+
+    def __len__(self):
+        return len(self.store)
+
+
+def rerank_exact(store, query, candidate_ids, top_k):
+    """Re-scores candidates with their full-precision rows. Returns (ids, distances) of the best top_k."""
+    if not candidate_ids:
+        return [], []
+    scores = store.get_vectors(candidate_ids) @ query
+    order = top_k_rows(scores[np.newaxis, :], top_k)[0]
+    return [candidate_ids[i] for i in order], (1.0 - scores[order]).tolist()
+
+
+def search_subset(store, queries, allowed_ids, top_k, block_rows=16384):
+    """Exact top_k of each normalized query among the `allowed_ids` present in `store`, gathered block by block."""
+    ids = [item_id for item_id in allowed_ids if item_id in store]
+    n_queries = queries.shape[0]
+    best_scores = np.full((n_queries, 0), -np.inf, dtype=np.float32)
+    best_ids = np.empty((n_queries, 0), dtype=object)
+    for start in range(0, len(ids), block_rows):
+        block_ids = np.array(ids[start:start + block_rows], dtype=object)
+        scores = queries @ store.get_vectors(block_ids.tolist()).T
+        rows = top_k_rows(scores, top_k)
+        best_scores = np.concatenate([best_scores, np.take_along_axis(scores, rows, axis=1)], axis=1)
+        best_ids = np.concatenate([best_ids, block_ids[rows]], axis=1)
+        keep = top_k_rows(best_scores, top_k)
+        best_scores = np.take_along_axis(best_scores, keep, axis=1)
+        best_ids = np.take_along_axis(best_ids, keep, axis=1)
+    return {
+        'ids': [row.tolist() for row in best_ids],
+        'distances': [(1.0 - row).tolist() for row in best_scores],
+    }
+
+
+def top_k_rows(scores, top_k):
+    """Returns, per row of `scores`, the column indices of the top_k largest values in descending order."""
+    n_cols = scores.shape[1]
+    top_k = min(top_k, n_cols)
+    if top_k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    if top_k < n_cols:
+        candidates = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    else:
+        candidates = np.tile(np.arange(n_cols), (scores.shape[0], 1))
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def load_backend_from_collection(backend, collection, page_size=1024):
+    """Fills `backend` with every embedding stored in a Chroma collection, page by page."""
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings"], limit=page_size, offset=offset)
+        if not page['ids']:
+            break
+        backend.add(page['ids'], np.asarray(page['embeddings'], dtype=np.float32))
+        offset += len(page['ids'])
+    return backend
+
+
+def sync_store_with_collection(store, collection, page_size=1024):
+    """
+    Brings a `FlatVectorStore` in line with the Chroma collection, the store of record.
+
+    Items written while another backend was active are copied over, and ids no longer in
+    the collection are deleted. Lists every id of the collection, so `Database` only calls
+    it when the counts differ or a full sync is asked for. Returns (added, removed).
+    """
+    collection_ids = collection.get(include=[])['ids']
+    missing = [item_id for item_id in collection_ids if item_id not in store]
+    present = set(collection_ids)
+    stale = [item_id for item_id in store.locations if item_id not in present]
+    for start in range(0, len(missing), page_size):
+        page = collection.get(ids=missing[start:start + page_size], include=["embeddings"])
+        store.append(page['ids'], np.asarray(page['embeddings'], dtype=np.float32))
+    if stale:
+        store.delete(stale)
+    return len(missing), len(stale)
+
+
+# Backend name -> factory taking the Chroma collection
+BACKENDS = {
+    'chroma': ChromaBackend,
+    'numpy': lambda collection: load_backend_from_collection(NumpyBackend(np.float32), collection),
+    'numpy-fp16': lambda collection: load_backend_from_collection(NumpyBackend(np.float16), collection),
+    # These need the database path, see Database._create_backend
+    'flat': None,
+    'int8': None,
+    'pq': None,
+    'matryoshka': None,
+}
+
 
 class Database:
-    def __init__(self, path="./database", collection_name="retrieval_collection"):
+    def __init__(self, path="./database", collection_name="retrieval_collection", write_chunk_size=1024,
+                 backend='chroma', backend_options=None, full_sync=False):
         self.client = chromadb.PersistentClient(path=path)
         self.collection = self.client.get_or_create_collection(name=collection_name)
+        # Chroma rejects writes above its own batch limit, so never exceed it
+        self.write_chunk_size = min(write_chunk_size, self.client.get_max_batch_size())
+        self.path = path
+        self.backend = self._create_backend(backend, backend_options or {}, full_sync)
+        self._sparse_index = None
+        self._sparse_lock = threading.Lock()
 
-    def add(self, item_type, title, content, url, date, embedding, extracted_info="{}"):
-        item_id = str(uuid.uuid4())
-        metadatas = {
-            'type': item_type,
-            'title': title,
-            'content': content,
-            'url': url,
-            'date': date,
-            'extracted_info': extracted_info
-        }
-        
-        self.collection.add(
-            embeddings=[embedding.tolist()],
-            metadatas=[metadatas],
-            ids=[item_id]
-        )
-        return item_id
+    @property
+    def sparse_index(self):
+        """
+        BM25 index over titles, text and extracted fields.
 
-    def query(self, query_embedding, top_k=5):
-        results = self.collection.query(
-            query_embeddings=[query_embedding.tolist()],
-            n_results=top_k
-        )
+        Built from the collection on first use, so processes that never run keyword
+        queries pay nothing; from then on every write through this Database updates it.
+        """
+        if self._sparse_index is None:
+            with self._sparse_lock:
+                if self._sparse_index is None:
+                    index = BM25Index()
+                    offset, page_size = 0, 1024
+                    while True:
+                        page = self.collection.get(include=["metadatas"], limit=page_size, offset=offset)
+                        if not page['ids']:
+                            break
+                        index.add(page['ids'], [document_text(read_metadata(m or {})) for m in page['metadatas']])
+                        offset += len(page['ids'])
+                    self._sparse_index = index
+        return self._sparse_index
+
+    def _create_backend(self, backend, options, full_sync=False):
+        """
+        `options` are passed to the store-based backends, e.g. {'prefix_dim': 512} for 'matryoshka'.
+
+        The store-based backends are synced with the collection when their item counts
+        differ. Writes made through the 'chroma' backend that keep the count unchanged
+        (overwrites, or as many deletes as adds) are only picked up with `full_sync=True`.
+        """
+        if isinstance(backend, VectorBackend):
+            return backend
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown vector backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+        if backend in ('flat', 'int8', 'pq', 'matryoshka'):
+            store = FlatVectorStore(os.path.join(self.path, "flat_vectors"))
+            # Other processes may have written through the 'chroma' backend since the store was last
+            # opened, so copy what is missing; the first open of a collection exports all of it
+            if full_sync or len(store) != self.collection.count():
+                added, removed = sync_store_with_collection(store, self.collection)
+                if added or removed:
+                    print(f"Synced the flat vector store with the Chroma collection: {added} added, {removed} removed.")
+            if backend == 'flat':
+                return FlatBackend(store, **options)
+            if backend == 'matryoshka':
+                return MatryoshkaBackend(store, **options)
+            options = {'path': os.path.join(self.path, f"flat_vectors_{backend}"), **options}
+            return QuantizedBackend(store, QUANTIZERS[backend](), **options)
+        return BACKENDS[backend](self.collection)
+
+    def add(self, item_type, title, text, image_path, url, date, embedding, extracted_info="{}"):
+        metadata = make_metadata(item_type, title, text, image_path, url, date, extracted_info)
+        metadatas = {field: [value] for field, value in metadata.items()}
+        return self.add_many(np.asarray(embedding)[np.newaxis, :], metadatas)[0]
+
+    def add_many(self, embeddings, metadatas, chunk_size=None):
+        """
+        Adds N items in chunks, one `collection.add` per chunk.
+
+        Args:
+            embeddings (np.ndarray): (N, D) embedding matrix.
+            metadatas (dict): Columnar metadata, mapping each field name to a list of N values.
+            chunk_size (int): Rows written per call (default: `self.write_chunk_size`).
+
+        Returns:
+            list[str]: The generated ids, in row order.
+        """
+        ids = [str(uuid.uuid4()) for _ in range(len(embeddings))]
+        self._write_many(self.collection.add, ids, embeddings, metadatas, chunk_size)
+        return ids
+
+    def upsert_many(self, ids, embeddings, metadatas, chunk_size=None):
+        """Same as `add_many`, but inserts or overwrites the given ids. Returns the ids."""
+        ids = list(ids)
+        self._write_many(self.collection.upsert, ids, embeddings, metadatas, chunk_size)
+        return ids
+
+    @traced("db.write")
+    def _write_many(self, write_fn, ids, embeddings, metadatas, chunk_size):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2:
+            raise ValueError(f"Expected an (N, D) embedding matrix, got shape {embeddings.shape}")
+        n_rows = embeddings.shape[0]
+        if len(ids) != n_rows:
+            raise ValueError(f"Got {len(ids)} ids for {n_rows} embeddings")
+        for field, column in metadatas.items():
+            if len(column) != n_rows:
+                raise ValueError(f"Metadata column '{field}' has {len(column)} values, expected {n_rows}")
+
+        chunk_size = min(chunk_size or self.write_chunk_size, self.write_chunk_size)
+        for start in range(0, n_rows, chunk_size):
+            end = min(start + chunk_size, n_rows)
+            rows = [
+                {field: column[i] for field, column in metadatas.items()}
+                for i in range(start, end)
+            ]
+            with span("db.chroma_write"):
+                write_fn(
+                    embeddings=embeddings[start:end].tolist(),
+                    metadatas=rows,
+                    ids=ids[start:end]
+                )
+            with span("db.index_add"):
+                self.backend.add(ids[start:end], embeddings[start:end])
+            if self._sparse_index is not None:
+                with span("db.sparse_index_add"):
+                    self._sparse_index.add(ids[start:end], [document_text(row) for row in rows])
+
+    @traced("db.update_metadata")
+    def update_metadata(self, ids, metadatas):
+        """Overwrites the metadata of existing items (full records) and re-indexes their text."""
+        ids = list(ids)
+        for start in range(0, len(ids), self.write_chunk_size):
+            end = start + self.write_chunk_size
+            self.collection.update(ids=ids[start:end], metadatas=metadatas[start:end])
+        if self._sparse_index is not None:
+            self._sparse_index.add(ids, [document_text(read_metadata(metadata)) for metadata in metadatas])
+
+    def query(self, query_embedding, top_k=5, filters=None):
+        return self.query_many(np.asarray(query_embedding)[np.newaxis, :], top_k=top_k, filters=filters)
+
+    @traced("db.query")
+    def query_many(self, query_embeddings, top_k=5, filters=None):
+        """
+        Runs one index lookup for a (Q, D) matrix of queries. Returns a Chroma-style result with one list per query.
+
+        `filters` (see `metadata_schema.build_where`) restricts the candidates before scoring,
+        so a filtered query still returns up to top_k matching items.
+        """
+        where = build_where(filters)
+        allowed_ids = self.filter_ids(where) if where is not None and not self.backend.supports_where else None
+        with span("db.index_search"):
+            if where is None:
+                results = self.backend.search(query_embeddings, top_k)
+            elif self.backend.supports_where:
+                results = self.backend.search(query_embeddings, top_k, where=where)
+            else:
+                results = self.backend.search(query_embeddings, top_k, allowed_ids=allowed_ids)
+        return self._with_metadatas(results)
+
+    @traced("db.sparse_query")
+    def sparse_query(self, query_text, top_k=5, filters=None):
+        """
+        BM25 keyword search; needs no embedding. Returns a Chroma-style result for one query,
+        with `scores` (BM25, higher is better) in place of `distances`.
+        """
+        where = build_where(filters)
+        allowed_ids = self.filter_ids(where) if where is not None else None
+        ids, scores = self.sparse_index.search(query_text, top_k, allowed_ids)
+        return self._with_metadatas({'ids': [ids], 'scores': [scores]})
+
+    @traced("db.fetch_metadata")
+    def _with_metadatas(self, results):
+        if results.get('metadatas') is None:
+            all_ids = list(dict.fromkeys(item_id for ids in results['ids'] for item_id in ids))
+            found = self.collection.get(ids=all_ids, include=["metadatas"]) if all_ids else {'ids': [], 'metadatas': []}
+            by_id = dict(zip(found['ids'], found['metadatas']))
+            results['metadatas'] = [[by_id.get(item_id, {}) for item_id in ids] for ids in results['ids']]
+        results['metadatas'] = [[read_metadata(m or {}) for m in metadatas] for metadatas in results['metadatas']]
         return results
 
+    @traced("db.filter")
+    def filter_ids(self, where):
+        """Ids of the records matching a Chroma `where` clause, resolved by Chroma's metadata index."""
+        return set(self.collection.get(where=where, include=[])['ids'])
+
     def get_item_by_id(self, item_id):
-        return self.collection.get(ids=[item_id])
\ No newline at end of file
+        found = self.collection.get(ids=[item_id])
+        found['metadatas'] = [read_metadata(m or {}) for m in found['metadatas']]
+        return found
@@ -0,0 +1,299 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory lock, the per-row key check still applies
+    fcntl = None
+
+# Version of the on-disk layout; caches written by older versions are discarded
+INDEX_FORMAT = 2
+# Bytes of the key digest stored next to each row, checked on every read
+ROW_TAG_BYTES = 16
+
+
+def make_cache_key(model_name, instruction, is_query, modality, payload):
+    """
+    Hashes everything that determines an embedding into a hex digest.
+
+    Args:
+        model_name (str): Name of the embedding model.
+        instruction (str): The instruction actually used for the forward pass.
+        is_query (bool): Whether the input was embedded as a query.
+        modality (str): 'text', 'image' or 'image-text'.
+        payload (bytes): Raw content bytes (UTF-8 text and/or image file bytes).
+    """
+    header = json.dumps([model_name, instruction, bool(is_query), modality]).encode("utf-8")
+    digest = hashlib.sha256(header)
+    digest.update(b"\0")
+    digest.update(payload)
+    return digest.hexdigest()
+
+
+def read_image_bytes(image):
+    """Returns the bytes of a local image file, or None for URLs, data URIs and in-memory images."""
+    if not isinstance(image, str):
+        return None
+    if image.startswith("file://"):
+        image = image[7:]
+    elif image.startswith(("http://", "https://", "data:image")):
+        return None
+    try:
+        with open(image, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def content_payload(modality, text=None, image=None):
+    """Raw bytes identifying an input for `make_cache_key`, or None if its image cannot be read."""
+    if modality == 'text':
+        return text.encode("utf-8")
+    image_bytes = read_image_bytes(image)
+    if image_bytes is None or modality == 'image':
+        return image_bytes
+    return image_bytes + b"\0" + text.encode("utf-8")
+
+
+def row_tag(key):
+    """Short digest of a cache key, stored with its row so a reused row is never read as another key's."""
+    return np.frombuffer(hashlib.sha256(key.encode("utf-8")).digest()[:ROW_TAG_BYTES], dtype=np.uint8)
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache backed by a memory-mapped float16 matrix and a JSON index.
+
+    `vectors.f16` holds `capacity` fixed-size rows; `index.json` maps each content key to
+    its row, in least- to most-recently-used order. When full, the least recently used
+    entry is evicted and its row reused.
+
+    The index is flushed lazily, so after a crash it can map an evicted key to a row that
+    was rewritten since. `keys.tag` stores a digest of the owning key per row, and a lookup
+    whose digest does not match is a miss. A cache directory is used by one process at a
+    time: while another process holds its lock, this instance stays disabled.
+    """
+
+    def __init__(self, path="./embedding_cache", capacity=50000, flush_every=64):
+        self.path = path
+        self.capacity = capacity
+        self.flush_every = flush_every
+        self.vectors_file = os.path.join(path, "vectors.f16")
+        self.index_file = os.path.join(path, "index.json")
+        self.tags_file = os.path.join(path, "keys.tag")
+        os.makedirs(path, exist_ok=True)
+
+        self.dim = None
+        self.vectors = None
+        self.tags = None
+        self.entries = OrderedDict()  # key -> row, LRU order
+        self.free_rows = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._dirty = 0
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self.disabled = not self._lock_dir()
+        if not self.disabled:
+            self._load()
+
+    def _lock_dir(self):
+        """Takes an exclusive lock on the cache directory. Returns False if another process holds it."""
+        if fcntl is None:
+            return True
+        self._lock_file = open(os.path.join(self.path, "lock"), "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            print(f"Embedding cache '{self.path}' is in use by another process; running without it.")
+            return False
+        return True
+
+    def _load(self):
+        if not os.path.exists(self.index_file) or not os.path.exists(self.vectors_file):
+            return
+        try:
+            with open(self.index_file, "r") as f:
+                index = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Ignoring unreadable embedding cache index '{self.index_file}': {e}")
+            return
+        if index.get("format") != INDEX_FORMAT or not os.path.exists(self.tags_file):
+            print(f"Discarding embedding cache '{self.path}' written in an older format.")
+            return
+        # The matrix shape is fixed at creation time, so the stored capacity wins
+        self.capacity = index["capacity"]
+        self._open_vectors(index["dim"], mode="r+")
+        # Keep only entries whose row still carries their key: a row reused after the last
+        # index flush belongs to a key the index does not know about
+        self.entries = OrderedDict()
+        for key, row in index["entries"]:
+            if np.array_equal(self.tags[row], row_tag(key)):
+                self.entries[key] = row
+        used = set(self.entries.values())
+        self.free_rows = [row for row in range(self.capacity - 1, -1, -1) if row not in used]
+
+    def _open_vectors(self, dim, mode):
+        self.dim = dim
+        self.vectors = np.memmap(self.vectors_file, dtype=np.float16, mode=mode, shape=(self.capacity, dim))
+        self.tags = np.memmap(self.tags_file, dtype=np.uint8, mode=mode, shape=(self.capacity, ROW_TAG_BYTES))
+
+    def get(self, key):
+        """Returns the cached embedding as float32, or None on a miss."""
+        with self._lock:
+            row = self.entries.get(key)
+            if row is None or self.disabled:
+                self.misses += 1
+                return None
+            if not np.array_equal(self.tags[row], row_tag(key)):
+                # The row was rewritten for another key; drop the stale entry but not the row
+                del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return np.array(self.vectors[row], dtype=np.float32)
+
+    def put(self, key, embedding):
+        embedding = np.asarray(embedding, dtype=np.float16).reshape(-1)
+        with self._lock:
+            if self.disabled:
+                return
+            if self.vectors is None:
+                self.free_rows = list(range(self.capacity - 1, -1, -1))
+                self._open_vectors(embedding.shape[0], mode="w+")
+            if embedding.shape[0] != self.dim:
+                raise ValueError(f"Embedding has dimension {embedding.shape[0]}, cache holds {self.dim}")
+
+            row = self.entries.get(key)
+            if row is None:
+                if not self.free_rows:
+                    _, row = self.entries.popitem(last=False)
+                    self.evictions += 1
+                else:
+                    row = self.free_rows.pop()
+            # Clear the tag first, so a crash mid-write leaves the row owned by no key
+            self.tags[row] = 0
+            self.vectors[row] = embedding
+            self.tags[row] = row_tag(key)
+            self.entries[key] = row
+            self.entries.move_to_end(key)
+
+            self._dirty += 1
+            if self._dirty >= self.flush_every:
+                self._flush_locked()
+
+    def flush(self):
+        """Writes pending vectors and the index to disk."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self.vectors is None:
+            return
+        self.vectors.flush()
+        self.tags.flush()
+        tmp_file = self.index_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump({
+                "format": INDEX_FORMAT,
+                "dim": self.dim,
+                "capacity": self.capacity,
+                "entries": list(self.entries.items()),
+            }, f)
+        os.replace(tmp_file, self.index_file)
+        self._dirty = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "capacity": self.capacity,
+                "disabled": self.disabled,
+            }
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded in-process LRU cache for query embeddings, with an optional time-to-live.
+
+    Keys are small tuples such as ('text', query) or ('image', image_sha256); values are
+    numpy vectors. Entries older than `ttl` seconds are treated as misses and dropped.
+    """
+
+    def __init__(self, max_entries=1024, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (created_at, embedding), LRU order
+        self.bytes_held = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            created_at, embedding = entry
+            if self.ttl is not None and time.monotonic() - created_at > self.ttl:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, key, embedding):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (time.monotonic(), embedding)
+            self.bytes_held += embedding.nbytes
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, embedding = self.entries.pop(key)
+        self.bytes_held -= embedding.nbytes
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.bytes_held = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "bytes_held": self.bytes_held,
+                "ttl": self.ttl,
+            }
@@ -0,0 +1,128 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the embedding queue is at capacity and a request is shed."""
+
+
+class EmbedRequest:
+    __slots__ = ("text", "image", "is_query", "instruction", "future")
+
+    def __init__(self, text, image, is_query, instruction, future):
+        self.text = text
+        self.image = image
+        self.is_query = is_query
+        self.instruction = instruction
+        self.future = future
+
+    @property
+    def group(self):
+        """Requests can share a model call only if modality, query flag and instruction all match."""
+        modality = 'image-text' if self.image and self.text else ('image' if self.image else 'text')
+        return (modality, self.is_query, self.instruction)
+
+
+class EmbeddingBatcher:
+    """
+    Asyncio micro-batching front end for `Retriever.embed_batch`.
+
+    Concurrent `embed` calls are queued. A single worker takes the first waiting request,
+    keeps collecting for up to `max_wait_ms` (or until `max_batch` requests), then runs
+    each compatible group as one model call on a dedicated thread and resolves every
+    caller's future with its own row. When `max_queue` requests are already waiting,
+    new ones are rejected with `QueueFullError` instead of piling up latency.
+    """
+
+    def __init__(self, retriever, max_batch=16, max_wait_ms=5.0, max_queue=256):
+        self.retriever = retriever
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue = max_queue
+        # One thread: model calls stay serialized on the GPU, the event loop stays free
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-batcher")
+        self._queue = None
+        self._worker = None
+        self._loop = None
+        self.stats = {"requests": 0, "batches": 0, "batched_items": 0, "shed": 0, "max_queue_depth": 0}
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Queues are bound to the loop they are used on; (re)create them for this one
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._worker = loop.create_task(self._run())
+
+    async def embed(self, text=None, image=None, is_query=True, instruction=None):
+        """Returns the embedding (numpy vector) of one text, image or image-text input."""
+        if not text and not image:
+            raise ValueError("At least one of text or image is required")
+        self._ensure_started()
+        future = self._loop.create_future()
+        try:
+            self._queue.put_nowait(EmbedRequest(text, image, is_query, instruction, future))
+        except asyncio.QueueFull:
+            self.stats["shed"] += 1
+            raise QueueFullError(f"Embedding queue is full ({self.max_queue} requests waiting)")
+        self.stats["requests"] += 1
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self._queue.qsize())
+        return await future
+
+    async def embed_query(self, query, image_query_path=None):
+        """Batched counterpart of `Retriever.embed_query`, sharing its query cache."""
+        key = self.retriever._query_cache_key(query, image_query_path)
+        if key is not None:
+            cached = self.retriever.query_cache.get(key)
+            if cached is not None:
+                return cached
+        embedding = await self.embed(
+            text=query or None, image=image_query_path, is_query=True, instruction=self.retriever.search_instruction
+        )
+        if key is not None:
+            self.retriever.query_cache.put(key, embedding)
+        return embedding
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            remaining = deadline - self._loop.time()
+            if len(batch) >= self.max_batch or remaining <= 0:
+                break
+            # Short sleeps rather than wait_for(queue.get()), which can swallow cancellation
+            await asyncio.sleep(min(remaining, 0.001))
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.group, []).append(request)
+            for (modality, is_query, instruction), requests in groups.items():
+                texts = [r.text for r in requests] if modality != 'image' else None
+                images = [r.image for r in requests] if modality != 'text' else None
+                try:
+                    embeddings = await self._loop.run_in_executor(
+                        self._executor,
+                        lambda: self.retriever.embed_batch(texts, images, is_query=is_query, instruction=instruction),
+                    )
+                except Exception as e:
+                    for request in requests:
+                        if not request.future.done():
+                            request.future.set_exception(e)
+                    continue
+                self.stats["batches"] += 1
+                self.stats["batched_items"] += len(requests)
+                for request, embedding in zip(requests, embeddings):
+                    if not request.future.done():
+                        request.future.set_result(embedding)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["mean_batch_size"] = stats["batched_items"] / stats["batches"] if stats["batches"] else 0.0
+        stats["queue_depth"] = self._queue.qsize() if self._queue is not None else 0
+        return stats
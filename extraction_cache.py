@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from embedding_cache import read_image_bytes
+
+
+def make_extraction_key(model_name, system_prompt, schema, text, image_bytes=None):
+    """
+    Hashes everything that determines an extraction result into a hex digest.
+
+    Args:
+        model_name (str): Name of the extraction model.
+        system_prompt (str): The system prompt sent with the request.
+        schema (dict): The JSON schema the reply must follow.
+        text (str): The user text.
+        image_bytes (bytes): Raw bytes of the attached image, or None.
+    """
+    header = json.dumps([model_name, system_prompt, schema, text], sort_keys=True).encode("utf-8")
+    digest = hashlib.sha256(header)
+    digest.update(b"\0")
+    digest.update(image_bytes or b"")
+    return digest.hexdigest()
+
+
+STATS_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS extraction_stats ("
+    " id INTEGER PRIMARY KEY CHECK (id = 0), entries INTEGER NOT NULL, bytes INTEGER NOT NULL)",
+    "CREATE TRIGGER IF NOT EXISTS extractions_count_insert AFTER INSERT ON extractions BEGIN"
+    " UPDATE extraction_stats SET entries = entries + 1, bytes = bytes + new.size; END",
+    "CREATE TRIGGER IF NOT EXISTS extractions_count_delete AFTER DELETE ON extractions BEGIN"
+    " UPDATE extraction_stats SET entries = entries - 1, bytes = bytes - old.size; END",
+    "CREATE TRIGGER IF NOT EXISTS extractions_count_update AFTER UPDATE OF size ON extractions BEGIN"
+    " UPDATE extraction_stats SET bytes = bytes + new.size - old.size; END",
+)
+
+
+class ExtractionCache:
+    """
+    Persistent cache of successful extraction results in a SQLite file.
+
+    Each row keeps the result JSON, its size and when it was last used. When the cache
+    holds more than `max_entries` rows or `max_bytes` of results, the least recently
+    used rows are deleted. Triggers keep the row count and byte total in a one-row
+    `extraction_stats` table, so checking the bounds never scans the cache. Safe to
+    share between threads and processes.
+    """
+
+    def __init__(self, path="./extraction_cache.sqlite", max_entries=100000, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            " key TEXT PRIMARY KEY, result TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS extractions_last_used ON extractions (last_used)")
+        # Creating the stats table and seeding it from a cache written before it existed is
+        # one transaction, so another process cannot insert rows in between
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            for statement in STATS_SCHEMA:
+                self._conn.execute(statement)
+            self._conn.execute(
+                "INSERT OR IGNORE INTO extraction_stats (id, entries, bytes)"
+                " SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM extractions"
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def key_for(self, model_name, system_prompt, schema, text, image_path=None):
+        """Cache key of one request; reads the image file, so call it off the event loop."""
+        return make_extraction_key(model_name, system_prompt, schema, text, read_image_bytes(image_path))
+
+    def get(self, key):
+        """Returns the cached result dict, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM extractions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE extractions SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, result):
+        """Stores a successful result; results carrying an "error" are never cached."""
+        if not result or "error" in result:
+            return
+        payload = json.dumps(result, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            # An upsert rather than INSERT OR REPLACE, whose implicit delete fires no trigger
+            self._conn.execute(
+                "INSERT INTO extractions (key, result, size, created, last_used) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET result = excluded.result, size = excluded.size,"
+                " created = excluded.created, last_used = excluded.last_used",
+                (key, payload, len(payload.encode("utf-8")), now, now),
+            )
+            self._evict_locked()
+
+    def _evict_locked(self):
+        count, total = self._conn.execute("SELECT entries, bytes FROM extraction_stats").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Walk from the least recently used row until both bounds hold again
+        to_delete = []
+        for key, size in self._conn.execute("SELECT key, size FROM extractions ORDER BY last_used"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            to_delete.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM extractions WHERE key = ?", to_delete)
+        self.evictions += len(to_delete)
+
+    def stats(self):
+        with self._lock:
+            count, total = self._conn.execute("SELECT entries, bytes FROM extraction_stats").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": count,
+                "bytes": total,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
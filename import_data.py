@@ -1,17 +1,64 @@
 import json
 import argparse
 from retriever import Retriever
+from metadata_schema import make_metadata
 from datetime import datetime
 from tqdm import tqdm
 import sys
+import time
 
-def import_from_json(input_file, output_file):
+def make_length_buckets(records, batch_size):
+    """
+    Groups records into batches of similar abstract length to keep padding low.
+
+    Records are sorted by abstract length and then sliced into consecutive
+    batches, so each model call pads to a length close to its members' own.
+    """
+    ordered = sorted(records, key=lambda record: len(record[2]))
+    for start in range(0, len(ordered), batch_size):
+        yield ordered[start:start + batch_size]
+
+
+def import_batch(retriever, db, batch, token_budget=None):
+    """
+    Embeds one batch of abstracts in a single model call and writes it with a single `collection.add`.
+    Returns a list of (input_index, imported_record) pairs.
+    """
+    abstracts = [abstract for _, _, abstract, _ in batch]
+    # 1. Generate the document embeddings (is_query defaults to False)
+    embeddings = retriever.get_text_embeddings(abstracts, batch_size=len(abstracts), token_budget=token_budget)
+
+    # 2. Add the whole batch to the database
+    current_date = datetime.now().isoformat()
+    rows = [make_metadata('text', title, abstract, '', url, current_date) for _, title, abstract, url in batch]
+    item_ids = db.add_many(
+        embeddings,
+        {field: [row[field] for row in rows] for field in rows[0]},
+        chunk_size=len(batch)
+    )
+
+    # 3. Prepare the records for the output file
+    return [
+        (index, {
+            'id_in_db': item_id,
+            'title': title,
+            'content': abstract,
+            'url': url
+        })
+        for item_id, (index, title, abstract, url) in zip(item_ids, batch)
+    ]
+
+
+def import_from_json(input_file, output_file, batch_size=16, token_budget=None):
     """
     Imports data from a JSON file into the retrieval system's database.
 
     Args:
         input_file (str): Path to the input JSON file (e.g., 'data.json').
         output_file (str): Path to the output JSON file to save imported records.
+        batch_size (int): Number of abstracts embedded per model call.
+        token_budget (int): If set, split each batch by tokenized length so that no
+            model call pads to more than this many tokens.
     """
     try:
         with open(input_file, 'r', encoding='utf-8') as f:
@@ -28,12 +75,11 @@ def import_from_json(input_file, output_file):
     db = retriever.db
     print("Retriever initialized.")
 
-    successfully_imported = []
     skipped_count = 0
 
-    print(f"Starting import from '{input_file}'...")
-    for record in tqdm(data, desc="Importing records"):
-        # Validate that all required fields are present and not empty
+    # Validate that all required fields are present and not empty
+    valid_records = []
+    for index, record in enumerate(data):
         title = record.get("title")
         abstract = record.get("abstract")
         url = record.get("URL")
@@ -41,34 +87,25 @@ def import_from_json(input_file, output_file):
         if not all([title, abstract, url]):
             skipped_count += 1
             continue
+        valid_records.append((index, title, abstract, url))
 
-        try:
-            # 1. Generate the document embedding (is_query defaults to False)
-            embedding = retriever.get_text_embedding(abstract)
-
-            # 2. Add the item to the database
-            item_id = db.add(
-                item_type='text',
-                title=title,
-                content=abstract,
-                url=url,
-                date=datetime.now().isoformat(),
-                embedding=embedding
-            )
-
-            # 3. Prepare the record for the output file
-            imported_record = {
-                'id_in_db': item_id,
-                'title': title,
-                'content': abstract,
-                'url': url
-            }
-            successfully_imported.append(imported_record)
-
-        except Exception as e:
-            print(f"\nAn error occurred while processing record titled '{title}': {e}", file=sys.stderr)
-            skipped_count += 1
-            continue
+    print(f"Starting import from '{input_file}' (batch size: {batch_size})...")
+    start_time = time.perf_counter()
+    imported_with_index = []
+    with tqdm(total=len(valid_records), desc="Importing records") as pbar:
+        for batch in make_length_buckets(valid_records, batch_size):
+            try:
+                imported_with_index.extend(import_batch(retriever, db, batch, token_budget))
+            except Exception as e:
+                titles = ", ".join(f"'{title}'" for _, title, _, _ in batch)
+                print(f"\nAn error occurred while processing batch with records {titles}: {e}", file=sys.stderr)
+                skipped_count += len(batch)
+            pbar.update(len(batch))
+    elapsed = time.perf_counter() - start_time
+
+    # Keep the output file in the same order as the input file
+    imported_with_index.sort(key=lambda pair: pair[0])
+    successfully_imported = [record for _, record in imported_with_index]
 
     # Save the successfully imported records to the output file
     with open(output_file, 'w', encoding='utf-8') as f:
@@ -77,6 +114,8 @@ def import_from_json(input_file, output_file):
     print("\n--- Import Summary ---")
     print(f"Successfully imported: {len(successfully_imported)} records.")
     print(f"Skipped (missing fields or error): {skipped_count} records.")
+    if elapsed > 0:
+        print(f"Throughput: {len(successfully_imported) / elapsed:.2f} records/sec ({elapsed:.1f}s total).")
     print(f"Results of imported records saved to '{output_file}'.")
     print("----------------------")
 
@@ -93,9 +132,24 @@ def main():
         default='imported_data.json', 
         help="Path for the output JSON file (default: 'imported_data.json')."
     )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=16,
+        help="Number of abstracts embedded per model call (default: 16)."
+    )
+    parser.add_argument(
+        '--token-budget',
+        type=int,
+        default=None,
+        help="Optional cap on padded tokens (longest abstract x batch size) per model call."
+    )
     args = parser.parse_args()
 
-    import_from_json(args.input_file, args.output)
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+
+    import_from_json(args.input_file, args.output, args.batch_size, args.token_budget)
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -0,0 +1,194 @@
+import json
+import re
+from datetime import datetime, timedelta
+
+from PIL import Image
+
+from thumbnails import file_content_hash
+
+# Version 1: a single `content` field holding the text, the image path, or "text | path".
+# Version 2: separate `text`, `image_path`, `image_hash`, `image_width` and `image_height` fields.
+# Version 3: a numeric `date_ts` and the extracted fields promoted to filterable columns.
+SCHEMA_VERSION = 3
+
+# Chroma metadata values cannot be None, so absent fields use "" / 0
+EMPTY_IMAGE_FIELDS = {"image_path": "", "image_hash": "", "image_width": 0, "image_height": 0}
+
+# Scalar fields of `extracted_info`, each copied to an "info_<field>" column
+PROMOTED_SCALAR_FIELDS = ("model_name", "primary_task")
+# List fields of `extracted_info`. Chroma metadata values are scalars, so every list value
+# becomes a boolean "info_<field>:<value>" column (value lowercased) that a filter can match
+PROMOTED_LIST_FIELDS = ("datasets_used", "evaluation_metrics")
+INFO_PREFIX = "info_"
+
+# Filter keys accepted by `build_where`, besides the promoted fields
+FILTER_KEYS = ("type", "date_from", "date_to") + PROMOTED_SCALAR_FIELDS + PROMOTED_LIST_FIELDS
+# A calendar date without a time of day; as `date_to` it covers the whole day
+DATE_ONLY = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def image_fields(image_path):
+    """Path, content hash and dimensions of an image; empty values if there is no readable image."""
+    if not image_path:
+        return dict(EMPTY_IMAGE_FIELDS)
+    try:
+        with Image.open(image_path) as img:
+            width, height = img.size
+        return {"image_path": image_path, "image_hash": file_content_hash(image_path),
+                "image_width": width, "image_height": height}
+    except (OSError, ValueError):
+        return dict(EMPTY_IMAGE_FIELDS, image_path=image_path)
+
+
+def date_timestamp(date):
+    """POSIX timestamp of an ISO date string (or a number, returned as float); 0.0 if it cannot be parsed."""
+    if isinstance(date, (int, float)):
+        return float(date)
+    try:
+        return datetime.fromisoformat(str(date).strip()).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def list_value_column(field, value):
+    return f"{INFO_PREFIX}{field}:{str(value).strip().lower()}"
+
+
+def extracted_columns(extracted_info):
+    """Filterable columns derived from an `extracted_info` JSON string (or dict)."""
+    if isinstance(extracted_info, str):
+        try:
+            extracted_info = json.loads(extracted_info or "{}")
+        except ValueError:
+            extracted_info = {}
+    if not isinstance(extracted_info, dict) or "error" in extracted_info:
+        extracted_info = {}
+    columns = {}
+    for field in PROMOTED_SCALAR_FIELDS:
+        value = extracted_info.get(field)
+        columns[INFO_PREFIX + field] = value.strip() if isinstance(value, str) else ""
+    for field in PROMOTED_LIST_FIELDS:
+        values = extracted_info.get(field)
+        for value in values if isinstance(values, list) else []:
+            if isinstance(value, str) and value.strip():
+                columns[list_value_column(field, value)] = True
+    return columns
+
+
+def promote_extracted_fields(metadata):
+    """
+    Returns a copy of `metadata` whose promoted columns and `date_ts` match its `extracted_info` and `date`.
+
+    Chroma's `update` merges metadata, so list-value columns that no longer apply are
+    set to False rather than dropped; filters only ever match True.
+    """
+    promoted = {key: (False if isinstance(value, bool) and key.startswith(INFO_PREFIX) else value)
+                for key, value in metadata.items()}
+    promoted.update(extracted_columns(metadata.get("extracted_info")))
+    promoted["date_ts"] = date_timestamp(metadata.get("date", ""))
+    return promoted
+
+
+def make_metadata(item_type, title, text="", image_path="", url="", date="", extracted_info="{}"):
+    """Builds a current-version metadata record, reading the image once for its hash and size."""
+    metadata = {
+        "schema_version": SCHEMA_VERSION,
+        "type": item_type,
+        "title": title,
+        "text": text or "",
+        "url": url or "",
+        "date": date or "",
+        "extracted_info": extracted_info or "{}",
+    }
+    metadata.update(image_fields(image_path))
+    metadata["date_ts"] = date_timestamp(metadata["date"])
+    metadata.update(extracted_columns(metadata["extracted_info"]))
+    return metadata
+
+
+def split_legacy_content(item_type, content):
+    """Splits a version-1 `content` value into (text, image_path)."""
+    content = content or ""
+    if item_type == "image":
+        return "", content.strip()
+    if item_type == "image-text":
+        # The path was appended last, so split on the last separator; text may contain '|'
+        text, sep, image_path = content.rpartition("|")
+        if sep:
+            return text.strip(), image_path.strip()
+        return content, ""
+    return content, ""
+
+
+def upgrade_metadata(metadata, read_images=True):
+    """
+    Returns `metadata` converted to the current schema (a new dict; current records are copied as-is).
+
+    With `read_images=False` the image hash and size are left empty, which keeps the
+    conversion free of file I/O for read paths that only need the text and image path.
+    """
+    version = metadata.get("schema_version", 1)
+    if version == SCHEMA_VERSION:
+        return dict(metadata)
+    upgraded = {key: value for key, value in metadata.items() if key != "content"}
+    if version < 2:
+        text, image_path = split_legacy_content(metadata.get("type", ""), metadata.get("content"))
+        upgraded["text"] = text
+        upgraded.update(image_fields(image_path) if read_images else dict(EMPTY_IMAGE_FIELDS, image_path=image_path))
+    upgraded = promote_extracted_fields(upgraded)
+    upgraded["schema_version"] = SCHEMA_VERSION
+    return upgraded
+
+
+def read_metadata(metadata):
+    """Current-schema view of a stored record, for readers that may see unmigrated collections."""
+    if metadata.get("schema_version") == SCHEMA_VERSION:
+        return metadata
+    return upgrade_metadata(metadata, read_images=False)
+
+
+def _as_list(value):
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def build_where(filters):
+    """
+    Translates a filter dict into a Chroma `where` clause over the schema-3 columns. None if there is nothing to filter.
+
+    Keys:
+        type: an item type or a list of accepted types.
+        date_from / date_to: inclusive bounds, as ISO date strings or timestamps. A date_to
+            without a time of day includes that whole day.
+        model_name / primary_task: an exact value or a list of accepted values.
+        datasets_used / evaluation_metrics: a value or a list of values that must all be
+            listed (case-insensitive).
+    """
+    if not filters:
+        return None
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown filter keys: {', '.join(sorted(unknown))}. Choose from: {', '.join(FILTER_KEYS)}")
+    clauses = []
+    for field, column in [("type", "type")] + [(f, INFO_PREFIX + f) for f in PROMOTED_SCALAR_FIELDS]:
+        if filters.get(field) in (None, "", []):
+            continue
+        values = _as_list(filters[field])
+        clauses.append({column: values[0]} if len(values) == 1 else {column: {"$in": values}})
+    for field, operator in (("date_from", "$gte"), ("date_to", "$lte")):
+        if filters.get(field) in (None, ""):
+            continue
+        timestamp = date_timestamp(filters[field])
+        if timestamp == 0.0:
+            raise ValueError(f"Filter '{field}' is not an ISO date: {filters[field]!r}")
+        if field == "date_to" and DATE_ONLY.match(str(filters[field]).strip()):
+            # '2025-06-30' would be midnight; bound by the start of the next day instead
+            next_day = datetime.fromisoformat(filters[field].strip()) + timedelta(days=1)
+            operator, timestamp = "$lt", next_day.timestamp()
+        clauses.append({"date_ts": {operator: timestamp}})
+    for field in PROMOTED_LIST_FIELDS:
+        if filters.get(field) in (None, "", []):
+            continue
+        clauses.extend({list_value_column(field, value): True} for value in _as_list(filters[field]))
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
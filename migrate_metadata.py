@@ -0,0 +1,91 @@
+import argparse
+import os
+import sys
+
+from tqdm import tqdm
+
+# Ensure the main project directory is in the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import Database
+from metadata_schema import SCHEMA_VERSION, image_fields, upgrade_metadata
+
+
+def migrated_record(metadata):
+    """
+    The record to write back for one stored item, or None when it is already complete.
+
+    Also completes current-version records written without reading their image (the
+    backfill upgrades v1 records that way) and clears a leftover legacy `content`.
+    """
+    needs_image = metadata.get("image_path") and not metadata.get("image_hash")
+    if metadata.get("schema_version") == SCHEMA_VERSION and not metadata.get("content") and not needs_image:
+        return None
+    upgraded = upgrade_metadata(metadata)
+    if needs_image and metadata.get("schema_version") == SCHEMA_VERSION:
+        upgraded.update(image_fields(upgraded["image_path"]))
+    if "content" in metadata:
+        # `collection.update` merges keys, so an omitted `content` would survive the migration
+        upgraded["content"] = ""
+    return upgraded
+
+
+def migrate(db_path, collection_name, page_size, dry_run):
+    """
+    Upgrades every record of the collection to the current metadata schema, one page at a time.
+
+    Complete records (see `migrated_record`) are left untouched, so the migration can be re-run
+    safely after an interruption. Each page is written with a single `collection.update`,
+    which merges keys rather than replacing the record, so the legacy `content` field is
+    kept but set to "" (the current schema never reads it).
+    """
+    db = Database(path=db_path, collection_name=collection_name)
+    collection = db.collection
+    total = collection.count()
+    if total == 0:
+        print("Database is empty. Nothing to migrate.")
+        return
+
+    upgraded_count = 0
+    missing_images = 0
+    with tqdm(total=total, desc="Migrating metadata") as pbar:
+        # Updates change metadata only, so offsets over the stored order stay stable
+        for offset in range(0, total, page_size):
+            page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            ids, metadatas = [], []
+            for item_id, metadata in zip(page["ids"], page["metadatas"]):
+                upgraded = migrated_record(metadata or {})
+                if upgraded is None:
+                    continue
+                if upgraded["image_path"] and not upgraded["image_hash"]:
+                    missing_images += 1
+                    tqdm.write(f"  [!] Image not readable for item {item_id}: {upgraded['image_path']}")
+                ids.append(item_id)
+                metadatas.append(upgraded)
+            if ids and not dry_run:
+                collection.update(ids=ids, metadatas=metadatas)
+            upgraded_count += len(ids)
+            pbar.update(len(page["ids"]))
+
+    print("\n--- Migration Summary ---")
+    print(f"Records in collection: {total}")
+    print(f"{'Would upgrade' if dry_run else 'Upgraded'} to schema version {SCHEMA_VERSION}: {upgraded_count}")
+    print(f"Records whose image could not be read: {missing_images}")
+    print("-------------------------")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="One-shot migration of stored item metadata to the current schema version."
+    )
+    parser.add_argument("--db-path", default="./database", help="ChromaDB persistence directory.")
+    parser.add_argument("--collection", default="retrieval_collection", help="Collection to migrate.")
+    parser.add_argument("--page-size", type=int, default=1000, help="Records read and updated per call.")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing.")
+    args = parser.parse_args()
+
+    migrate(args.db_path, args.collection, args.page_size, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
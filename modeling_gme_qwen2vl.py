@@ -1,9 +1,14 @@
 from __future__ import annotations
 
 import base64
+import hashlib
 import logging
 import math
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from io import BytesIO
 from typing import Any, Dict, List, Optional, Union
 
@@ -21,12 +26,17 @@ from transformers.models.qwen2_vl.modeling_qwen2_vl import (
 )
 from transformers.utils.versions import require_version
 
+import tracing
+
 
 require_version(
     "transformers<4.52.0",
     "This code has some issues with transformers>=4.52.0, please downgrade: pip install transformers==4.51.3"
 )
 
+# Used for documents and for queries without their own instruction
+DEFAULT_INSTRUCTION = "You are a helpful assistant."
+
 
 class GmeQwen2VLConfig(Qwen2VLConfig):
     # model_type = ''
@@ -69,11 +79,18 @@ class GmeQwen2VL(PreTrainedModel):
         self.processor = AutoProcessor.from_pretrained(
             config._name_or_path, min_pixels=min_pixels, max_pixels=max_pixels, **kwargs
         )
+        self.min_pixels, self.max_pixels = min_pixels, max_pixels
         self.max_length: int = config.max_length
         self.normalize: bool = True
         self.processor.tokenizer.padding_side = "right"
-        self.default_instruction: str = "You are a helpful assistant."
+        self.default_instruction: str = DEFAULT_INSTRUCTION
         self.sep: str = " "
+        self.image_preprocessor = ImagePreprocessor()
+        # Set to None to always rerun the vision tower
+        self.visual_cache: Optional[VisualCache] = VisualCache()
+        # Token accounting of the most recent embed / get_fused_embeddings call
+        self.last_batch_tokens: tuple[int, int] = (0, 0)
+        self.last_padding_stats: Optional[Dict[str, Any]] = None
 
         # Initialize weights and apply final processing
         self.post_init()
@@ -90,13 +107,14 @@ class GmeQwen2VL(PreTrainedModel):
         image_grid_thw: Optional[torch.LongTensor] = None,
         # video_grid_thw: Optional[torch.LongTensor] = None,
         pooling_mask: Optional[torch.LongTensor] = None,
+        image_keys: Optional[List[str]] = None,
         **kwargs
     ) -> torch.Tensor:
         if inputs_embeds is None:
             inputs_embeds = self.model.get_input_embeddings()(input_ids)
             if pixel_values is not None:
                 pixel_values = pixel_values.type(self.visual.get_dtype())
-                image_embeds = self.visual(pixel_values, grid_thw=image_grid_thw).to(inputs_embeds.device)
+                image_embeds = self._visual_embeds(pixel_values, image_grid_thw, image_keys).to(inputs_embeds.device)
                 image_mask = input_ids == self.config.image_token_id
                 inputs_embeds[image_mask] = image_embeds
             # if pixel_values_videos is not None:
@@ -129,36 +147,84 @@ class GmeQwen2VL(PreTrainedModel):
             embeddings = torch.nn.functional.normalize(embeddings, p=2, dim=1)
         return embeddings.contiguous()
 
+    def _visual_embeds(
+        self, pixel_values: torch.Tensor, image_grid_thw: torch.LongTensor, image_keys: Optional[List[str]]
+    ) -> torch.Tensor:
+        """Runs the vision tower, reusing cached per-image outputs for images seen before."""
+        if self.visual_cache is None or image_keys is None:
+            return self.visual(pixel_values, grid_thw=image_grid_thw)
+
+        merge_factor = self.config.vision_config.spatial_merge_size ** 2
+        patch_counts = image_grid_thw.prod(dim=-1).tolist()
+        patch_offsets = [sum(patch_counts[:i]) for i in range(len(patch_counts))]
+        per_image = [self.visual_cache.get(key) for key in image_keys]
+        missing = [i for i, embeds in enumerate(per_image) if embeds is None]
+        hit_tokens = sum(patch_counts[i] // merge_factor for i, embeds in enumerate(per_image) if embeds is not None)
+
+        elapsed = 0.0
+        if missing:
+            start = time.perf_counter()
+            miss_pixels = torch.cat([pixel_values[patch_offsets[i]: patch_offsets[i] + patch_counts[i]] for i in missing])
+            miss_embeds = self.visual(miss_pixels, grid_thw=image_grid_thw[missing])
+            if miss_embeds.is_cuda:
+                torch.cuda.synchronize(miss_embeds.device)
+            elapsed = time.perf_counter() - start
+            splits = torch.split(miss_embeds, [patch_counts[i] // merge_factor for i in missing])
+            for i, embeds in zip(missing, splits):
+                per_image[i] = embeds
+                self.visual_cache.put(image_keys[i], embeds)
+            self.visual_cache.record_compute(elapsed, sum(patch_counts[i] // merge_factor for i in missing))
+        self.visual_cache.record_call(len(image_keys) - len(missing), len(missing), hit_tokens)
+        return torch.cat(per_image, dim=0)
+
+    @staticmethod
+    def _prompt(text: Optional[str], has_image: bool, instruction: str) -> str:
+        """The chat-template prompt of one input; its image placeholder expands to the vision tokens."""
+        input_str = '<|vision_start|><|image_pad|><|vision_end|>' if has_image else ''
+        if text is not None:
+            input_str += text
+        return f'<|im_start|>system\n{instruction}<|im_end|>\n<|im_start|>user\n{input_str}<|im_end|>\n<|im_start|>assistant\n<|endoftext|>'
+
     def embed(self, texts: list[str], images: list[Image.Image], is_query=True, instruction=None, **kwargs):
         self.eval()
         # Inputs must be batched
         input_texts, input_images = list(), list()
+        self.image_preprocessor.prefetch(images)  # decode the whole batch in parallel
+        if not is_query or instruction is None:
+            instruction = self.default_instruction
         for t, i in zip(texts, images):
-            if not is_query or instruction is None:
-                instruction = self.default_instruction
-            input_str = ''
             if i is None:
                 input_images = None  # All examples in the same batch are consistent
             else:
-                input_str += '<|vision_start|><|image_pad|><|vision_end|>'
-                i = fetch_image(i)
+                # Decoding runs on the preprocessor's pool (span "fetch_image"); this is the caller's wait
+                with tracing.span("fetch_image_wait"):
+                    i = self.image_preprocessor.fetch(i)
                 input_images.append(i)
-            if t is not None:
-                input_str += t
-            msg = f'<|im_start|>system\n{instruction}<|im_end|>\n<|im_start|>user\n{input_str}<|im_end|>\n<|im_start|>assistant\n<|endoftext|>'
-            input_texts.append(msg)
-
-        inputs = self.processor(
-            text=input_texts,
-            images=input_images,
-            padding=True,
-            truncation=True,
-            max_length=self.max_length,
-            return_tensors='pt'
-        )
+            input_texts.append(self._prompt(t, i is not None, instruction))
+
+        with tracing.span("processor"):
+            inputs = self.processor(
+                text=input_texts,
+                images=input_images,
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors='pt'
+            )
+        # Real vs. padded token counts of this batch, read back by get_fused_embeddings
+        attention_mask = inputs['attention_mask']
+        self.last_batch_tokens = (int(attention_mask.sum()), attention_mask.numel())
         inputs = {k: v.to(self.device) for k, v in inputs.items()}  # TODO
-        with torch.inference_mode():
+        if input_images and self.visual_cache is not None:
+            grids = inputs['image_grid_thw'].tolist()
+            inputs['image_keys'] = [
+                f"{image_content_hash(image)}:{'x'.join(map(str, grid))}" for image, grid in zip(input_images, grids)
+            ]
+        with tracing.span("forward"), torch.inference_mode():
             embeddings = self.forward(**inputs)
+            # CUDA kernels run asynchronously; wait for them so the span covers the real compute
+            if tracing.is_enabled() and embeddings.is_cuda:
+                torch.cuda.synchronize(embeddings.device)
         return embeddings
 
     def encode(self, sentences: list[str], *, prompt_name=None, **kwargs):
@@ -191,6 +257,10 @@ class GmeQwen2VL(PreTrainedModel):
         return self.get_fused_embeddings(texts=texts, **kwargs)
 
     def get_fused_embeddings(self, texts: list[str] = None, images: list[Image.Image] | DataLoader = None, **kwargs):
+        token_budget = kwargs.pop('token_budget', None)
+        if token_budget is not None and (texts is not None or images is not None) and not isinstance(images, DataLoader):
+            return self._get_length_sorted_embeddings(texts, images, token_budget, **kwargs)
+
         if isinstance(images, DataLoader):
             image_loader = images
             batch_size = image_loader.batch_size
@@ -200,13 +270,8 @@ class GmeQwen2VL(PreTrainedModel):
             if images is None:
                 image_loader = None
             else:
-                image_loader = DataLoader(
-                    images,
-                    batch_size=batch_size,
-                    shuffle=False,
-                    collate_fn=custom_collate_fn,
-                    num_workers=min(math.floor(os.cpu_count() / 2), 8),
-                )
+                # Plain list batches; images are decoded by the persistent preprocessor pool
+                image_loader = [images[n: n+batch_size] for n in range(0, len(images), batch_size)]
 
         if texts is None:
             assert image_loader is not None
@@ -219,16 +284,218 @@ class GmeQwen2VL(PreTrainedModel):
         none_batch = [None] * batch_size
         show_progress_bar = kwargs.pop('show_progress_bar', False)
         pbar = tqdm(total=n_batch, disable=not show_progress_bar, mininterval=1, miniters=10, desc='encode')
-        for n, img_batch in zip(range(0, n_batch * batch_size, batch_size), image_loader):
+        padding_stats = PaddingStats()
+        image_batches = list(image_loader) if isinstance(image_loader, list) else None
+        for batch_index, (n, img_batch) in enumerate(zip(range(0, n_batch * batch_size, batch_size), image_loader)):
+            # Decode and resize the next batch while the model runs on this one
+            if image_batches is not None and batch_index + 1 < len(image_batches) and image_batches[batch_index + 1]:
+                self.image_preprocessor.prefetch(image_batches[batch_index + 1])
             text_batch = none_batch if texts is None else texts[n: n+batch_size]
             img_batch = none_batch if img_batch is None else img_batch
             embeddings = self.embed(texts=text_batch, images=img_batch, **kwargs)
+            padding_stats.add(*self.last_batch_tokens)
             pbar.update(1)
             all_embeddings.append(embeddings.cpu())
         pbar.close()
+        self.last_padding_stats = padding_stats.summary()
         all_embeddings = torch.cat(all_embeddings, dim=0)
         return all_embeddings
 
+    def _image_token_count(self, image: Any) -> int:
+        """Vision tokens an image expands to: one per merged 28x28 patch of its size after both resizes."""
+        if isinstance(image, Image.Image):
+            width, height = image.size
+        else:
+            try:
+                path = image[7:] if image.startswith("file://") else image
+                with Image.open(path) as img:
+                    width, height = img.size  # reads the header only
+            except (OSError, ValueError):
+                # URLs and data URIs; the decoded image stays cached for `embed`
+                width, height = self.image_preprocessor.prefetch([image])[0].result().size
+        # `fetch_image` resizes within MIN/MAX_PIXELS, then the processor within its own bounds
+        height, width = smart_resize(height, width)
+        height, width = smart_resize(height, width, min_pixels=self.min_pixels, max_pixels=self.max_pixels)
+        return (height // IMAGE_FACTOR) * (width // IMAGE_FACTOR)
+
+    def _input_lengths(self, texts: Optional[list], images: Optional[list], is_query=True, instruction=None) -> list[int]:
+        """
+        Token length of each input as `embed` builds it: chat template and text, plus the
+        vision tokens of its image, capped at `max_length` like the processor's truncation.
+        """
+        if not is_query or instruction is None:
+            instruction = self.default_instruction
+        n_items = len(texts) if texts is not None else len(images)
+        texts = texts if texts is not None else [None] * n_items
+        images = images if images is not None else [None] * n_items
+        encoded = self.processor.tokenizer(
+            [self._prompt(t, i is not None, instruction) for t, i in zip(texts, images)], add_special_tokens=False
+        )
+        lengths = []
+        for ids, image in zip(encoded['input_ids'], images):
+            length = len(ids)
+            if image is not None:
+                length += self._image_token_count(image) - 1  # minus the placeholder itself
+            lengths.append(min(length, self.max_length))
+        return lengths
+
+    def _get_length_sorted_embeddings(self, texts: list[str] | None, images: list | None, token_budget: int, **kwargs):
+        """
+        Embeds inputs sorted by token length (template, text and image tokens), in batches
+        whose padded size (longest member x batch size) stays within `token_budget` tokens.
+        Embeddings are returned in the caller's original order.
+        """
+        max_batch_size = kwargs.pop('batch_size', 32)
+        kwargs.pop('show_progress_bar', None)
+        lengths = self._input_lengths(texts, images, kwargs.get('is_query', True), kwargs.get('instruction'))
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+
+        batches, current = [], []
+        for i in order:
+            # Sorted ascending, so the newest member is the longest one in the batch
+            if current and (len(current) >= max_batch_size or lengths[i] * (len(current) + 1) > token_budget):
+                batches.append(current)
+                current = []
+            current.append(i)
+        if current:
+            batches.append(current)
+
+        padding_stats = PaddingStats()
+        sorted_embeddings = []
+        for batch in batches:
+            text_batch = [None] * len(batch) if texts is None else [texts[i] for i in batch]
+            img_batch = [None] * len(batch) if images is None else [images[i] for i in batch]
+            embeddings = self.embed(texts=text_batch, images=img_batch, **kwargs)
+            padding_stats.add(*self.last_batch_tokens)
+            sorted_embeddings.append(embeddings.cpu())
+        self.last_padding_stats = padding_stats.summary()
+        logging.info(
+            f"Length-sorted batching: {len(batches)} batches, "
+            f"{self.last_padding_stats['padding_tokens']} padding tokens "
+            f"({self.last_padding_stats['padding_ratio']:.1%} of {self.last_padding_stats['total_tokens']})"
+        )
+
+        sorted_embeddings = torch.cat(sorted_embeddings, dim=0)
+        all_embeddings = torch.empty_like(sorted_embeddings)
+        all_embeddings[torch.tensor([i for batch in batches for i in batch])] = sorted_embeddings
+        return all_embeddings
+
+
+class VisualCache:
+    """
+    LRU cache of per-image vision-tower outputs, bounded by the bytes of the cached tensors.
+
+    Keys combine a hash of the preprocessed image with its `grid_thw`, so the same picture
+    embedded alone, fused with text, or re-added later skips the vision encoder. Time saved
+    is estimated from the measured vision-tower cost per output token.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 ** 2) -> None:
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict = OrderedDict()  # key -> tensor, LRU order
+        self.bytes_held = 0
+        self.hits = 0
+        self.misses = 0
+        self.compute_seconds = 0.0
+        self.computed_tokens = 0
+        self.saved_seconds = 0.0
+        self.last_call: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[torch.Tensor]:
+        with self._lock:
+            embeds = self.entries.get(key)
+            if embeds is not None:
+                self.entries.move_to_end(key)
+            return embeds
+
+    def put(self, key: str, embeds: torch.Tensor) -> None:
+        size = embeds.numel() * embeds.element_size()
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self.entries:
+                return
+            self.entries[key] = embeds.detach()
+            self.bytes_held += size
+            while self.bytes_held > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes_held -= evicted.numel() * evicted.element_size()
+
+    def record_compute(self, seconds: float, tokens: int) -> None:
+        self.compute_seconds += seconds
+        self.computed_tokens += tokens
+
+    def record_call(self, hits: int, misses: int, hit_tokens: int) -> None:
+        seconds_per_token = self.compute_seconds / self.computed_tokens if self.computed_tokens else 0.0
+        saved = hit_tokens * seconds_per_token
+        self.hits += hits
+        self.misses += misses
+        self.saved_seconds += saved
+        self.last_call = {"hits": hits, "misses": misses, "saved_ms": saved * 1000}
+        if hits:
+            logging.info(f"Vision cache: {hits}/{hits + misses} images reused, ~{saved * 1000:.1f} ms saved")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.entries),
+            "bytes_held": self.bytes_held,
+            "saved_seconds": self.saved_seconds,
+            "last_call": self.last_call,
+        }
+
+
+def image_content_hash(image: Image.Image) -> str:
+    """SHA-256 of a preprocessed image's mode, size and pixels, memoized on the image object."""
+    digest = image.info.get("gme_content_sha256")
+    if digest is None:
+        hasher = hashlib.sha256(f"{image.mode}:{image.size}".encode("utf-8"))
+        hasher.update(image.tobytes())
+        digest = hasher.hexdigest()
+        image.info["gme_content_sha256"] = digest
+    return digest
+
+
+class PaddingStats:
+    """Accumulates real and padded token counts over the batches of one embedding call."""
+
+    def __init__(self) -> None:
+        self.per_batch: List[int] = []
+        self.real_tokens: int = 0
+        self.total_tokens: int = 0
+
+    def add(self, real_tokens: int, total_tokens: int) -> None:
+        self.per_batch.append(total_tokens - real_tokens)
+        self.real_tokens += real_tokens
+        self.total_tokens += total_tokens
+
+    def summary(self) -> Dict[str, Any]:
+        padding = self.total_tokens - self.real_tokens
+        return {
+            'batches': len(self.per_batch),
+            'total_tokens': self.total_tokens,
+            'padding_tokens': padding,
+            'padding_ratio': padding / self.total_tokens if self.total_tokens else 0.0,
+            'padding_tokens_per_batch': self.per_batch,
+        }
+
+
+def quantize_linear_int8(model: GmeQwen2VL) -> GmeQwen2VL:
+    """
+    Applies PyTorch dynamic int8 quantization to the Linear layers of the language model (CPU only).
+    Weights are stored as int8 and activations quantized on the fly, so the model must be float32.
+    The vision tower stays in float32: `Qwen2VisionTransformerPretrainedModel.get_dtype` reads a
+    Linear weight tensor, which quantized layers no longer expose.
+    """
+    if model.dtype != torch.float32:
+        raise ValueError("Dynamic int8 quantization requires a float32 model, load it with dtype='float32'")
+    torch.ao.quantization.quantize_dynamic(model.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model
+
 
 def custom_collate_fn(batch):
     return batch
@@ -291,6 +558,7 @@ def smart_resize(
     return h_bar, w_bar
 
 
+@tracing.traced("fetch_image")
 def fetch_image(image: str | Image.Image, size_factor: int = IMAGE_FACTOR) -> Image.Image:
     image_obj = None
     if isinstance(image, Image.Image):
@@ -328,6 +596,144 @@ def fetch_image(image: str | Image.Image, size_factor: int = IMAGE_FACTOR) -> Im
         max_pixels=MAX_PIXELS,
     )
     image = image.resize((resized_width, resized_height))
+    # PIL copies `info` across convert/resize; never carry a content hash over to new pixels
+    image.info.pop("gme_content_sha256", None)
 
     return image
-###
\ No newline at end of file
+###
+
+class _PreprocessedImage:
+    """Cache entry of `ImagePreprocessor`: the pending or finished load and its decoded size."""
+
+    __slots__ = ("future", "nbytes", "consumed")
+
+    def __init__(self, future: Future, consumed: bool) -> None:
+        self.future = future
+        self.nbytes = 0  # charged once the load finishes
+        self.consumed = consumed  # False until a fetch uses an entry started by prefetch
+
+
+class ImagePreprocessor:
+    """
+    Persistent thread pool plus LRU cache in front of `fetch_image`.
+
+    Local files are cached under (path, mtime, size factor, pixel bounds), so re-embedding
+    the same file skips decoding and resizing. The cache holds futures: `prefetch` starts
+    work for an upcoming batch in the pool, and a later `fetch` of the same path waits on
+    it instead of starting over. This lets preprocessing overlap with model execution
+    without spawning worker processes per call. PIL releases the GIL while decoding and
+    resizing, so threads parallelize well here.
+
+    The cache is bounded by the decoded pixel bytes of the finished images, since one
+    image at MAX_PIXELS alone takes about 38 MB. Hits and misses are counted per `fetch`
+    (or `map` item); a fetch served by the prefetch of its own request is a miss.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, cache_bytes: int = 512 * 1024 ** 2) -> None:
+        self.max_workers = max_workers or max(1, min(math.floor((os.cpu_count() or 2) / 2), 8))
+        self.cache_bytes = cache_bytes
+        self.cache: OrderedDict = OrderedDict()  # key -> _PreprocessedImage, LRU order
+        self.bytes_held = 0
+        self.hits = 0
+        self.misses = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="gme-image")
+        return self._executor
+
+    @staticmethod
+    def cache_key(image: Any, size_factor: int = IMAGE_FACTOR) -> Optional[tuple]:
+        """Returns the cache key of a local image path, or None for anything that cannot be cached."""
+        if not isinstance(image, str) or image.startswith(("http://", "https://", "data:image")):
+            return None
+        path = image[7:] if image.startswith("file://") else image
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        return (os.path.abspath(path), mtime, size_factor, MIN_PIXELS, MAX_PIXELS)
+
+    def _submit(self, image: Any, size_factor: int, consume: bool) -> Future:
+        """Returns the load of `image`, starting it if needed. `consume` marks a lookup that counts in the stats."""
+        key = self.cache_key(image, size_factor)
+        with self._lock:
+            entry = self.cache.get(key) if key is not None else None
+            if entry is not None:
+                self.cache.move_to_end(key)
+                if consume:
+                    if entry.consumed:
+                        self.hits += 1
+                    else:
+                        self.misses += 1
+                        entry.consumed = True
+                return entry.future
+            if consume:
+                self.misses += 1
+            future = self.executor.submit(fetch_image, image, size_factor)
+            if key is None or self.cache_bytes <= 0:
+                return future
+            entry = _PreprocessedImage(future, consumed=consume)
+            self.cache[key] = entry
+        future.add_done_callback(lambda f, key=key, entry=entry: self._settle(key, entry, f))
+        return future
+
+    def _settle(self, key: tuple, entry: _PreprocessedImage, future: Future) -> None:
+        """Charges a finished image to the byte budget; failed loads are dropped so the next request retries."""
+        with self._lock:
+            if self.cache.get(key) is not entry:
+                return
+            if future.cancelled() or future.exception() is not None:
+                del self.cache[key]
+                return
+            image = future.result()
+            entry.nbytes = image.width * image.height * len(image.getbands())
+            self.bytes_held += entry.nbytes
+            while self.bytes_held > self.cache_bytes and self.cache:
+                _, evicted = self.cache.popitem(last=False)
+                self.bytes_held -= evicted.nbytes
+
+    def prefetch(self, images: List[Any], size_factor: int = IMAGE_FACTOR) -> List[Future]:
+        """Starts preprocessing `images` in the background and returns their futures."""
+        return [
+            self._submit(image, size_factor, consume=False)
+            for image in images
+            if image is not None and not isinstance(image, Image.Image)
+        ]
+
+    def fetch(self, image: Any, size_factor: int = IMAGE_FACTOR) -> Image.Image:
+        if isinstance(image, Image.Image):
+            return fetch_image(image, size_factor)
+        return self._submit(image, size_factor, consume=True).result()
+
+    def map(self, images: List[Any], size_factor: int = IMAGE_FACTOR) -> List[Image.Image]:
+        """Preprocesses a list of images in parallel, preserving order."""
+        futures = [
+            None if isinstance(image, Image.Image) else self._submit(image, size_factor, consume=True)
+            for image in images
+        ]
+        return [
+            fetch_image(image, size_factor) if future is None else future.result()
+            for image, future in zip(images, futures)
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.cache),
+                "bytes_held": self.bytes_held,
+                "cache_bytes": self.cache_bytes,
+                "workers": self.max_workers,
+            }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -2,8 +2,12 @@ import os
 import base64
 import json
 import time
-from openai import OpenAI
-from typing import Optional, Dict, Any, List
+import random
+import asyncio
+import threading
+from openai import OpenAI, AsyncOpenAI, APIStatusError, APIConnectionError, APITimeoutError
+from typing import Optional, Dict, Any, List, Tuple
+from tracing import span, traced
 
 # It's recommended to set the API key as an environment variable
 # export OPENAI_API_KEY='your_api_key'
@@ -36,43 +40,115 @@ def is_valid_schema(data: Dict[str, Any], required_keys: List[str]) -> bool:
     """Validates if the dictionary contains all required keys."""
     return all(key in data for key in required_keys)
 
+def build_system_prompt() -> str:
+    # --- Reinforced System Prompt ---
+    # Explicitly list the required keys in the prompt for redundancy.
+    required_keys_str = ", ".join(f'"{key}"' for key in JSON_SCHEMA['required'])
+    return (
+        "You are an expert AI research assistant. Your task is to analyze the provided text (a research paper abstract) "
+        "and an optional image. Extract the required information and return it STRICTLY in the specified JSON format. "
+        f"The JSON object MUST contain the following keys: {required_keys_str}. "
+        "Do not include any explanatory text outside of the JSON object."
+    )
+
+
+def build_user_content(text: str, image_path: Optional[str] = None) -> List[Dict[str, Any]]:
+    user_content = [{"type": "text", "text": text}]
+    if image_path:
+        base64_image = image_to_base64(image_path)
+        if base64_image:
+            user_content.append({
+                "type": "image_url",
+                "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}
+            })
+    return user_content
+
+
+def parse_extraction(content: str) -> Dict[str, Any]:
+    """Parses and validates a model reply; raises ValueError if it does not match the schema."""
+    extracted_data = json.loads(content)
+    if not isinstance(extracted_data, dict) or not is_valid_schema(extracted_data, JSON_SCHEMA['required']):
+        raise ValueError(f"Returned JSON is missing required keys. Content: {extracted_data}")
+    return extracted_data
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """The server's requested wait from `retry-after-ms` / `retry-after` headers, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass  # HTTP-date form; fall back to our own backoff
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, timeouts, connection and 5xx errors are retried; other API errors (auth, bad request) are not."""
+    if isinstance(error, APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    # Connection problems and malformed or incomplete replies are worth another attempt
+    return isinstance(error, (APIConnectionError, APITimeoutError, ValueError))
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None, base_delay: float = 1.0, max_delay: float = 60.0) -> float:
+    """Exponential backoff with full jitter, never shorter than the server's Retry-After."""
+    delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+    return max(delay, retry_after or 0.0)
+
+
+_clients: Dict[Tuple[Optional[str], Optional[str]], OpenAI] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key: Optional[str] = None, base_url: Optional[str] = None) -> OpenAI:
+    """Shared synchronous client per (api_key, base_url), so connections are pooled across calls."""
+    key = (api_key or None, base_url or None)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            # Retries are handled here, with backoff that honors Retry-After
+            client = OpenAI(api_key=key[0], base_url=key[1], max_retries=0)
+            _clients[key] = client
+    return client
+
+
+@traced("extract_information")
 def extract_information(
     text: str, 
     image_path: Optional[str] = None,
     api_key: Optional[str] = None,
     base_url: Optional[str] = None,
     model_name: str = "gpt-4o-latest",
-    retry_times: int = 3
+    retry_times: int = 3,
+    cache=None
 ) -> Optional[Dict[str, Any]]:
     """
     Extracts structured information using an LLM, with schema validation and retries.
+
+    If an `ExtractionCache` is given, a request already answered for the same text, image,
+    model, prompt and schema is served from it without calling the API.
     """
+    system_prompt = build_system_prompt()
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.key_for(model_name, system_prompt, JSON_SCHEMA, text, image_path)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
     try:
-        client = OpenAI(api_key=api_key, base_url=base_url)
+        client = get_client(api_key, base_url)
     except Exception as e:
         return {"error": f"Client initialization failed: {e}"}
 
     if not client.api_key:
         return {"error": "API key not set"}
 
-    # --- Reinforced System Prompt ---
-    # Explicitly list the required keys in the prompt for redundancy.
-    required_keys_str = ", ".join(f'"{key}"' for key in JSON_SCHEMA['required'])
-    system_prompt = (
-        "You are an expert AI research assistant. Your task is to analyze the provided text (a research paper abstract) "
-        "and an optional image. Extract the required information and return it STRICTLY in the specified JSON format. "
-        f"The JSON object MUST contain the following keys: {required_keys_str}. "
-        "Do not include any explanatory text outside of the JSON object."
-    )
-    
-    user_content = [{"type": "text", "text": text}]
-    if image_path:
-        base64_image = image_to_base64(image_path)
-        if base64_image:
-            user_content.append({
-                "type": "image_url",
-                "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}
-            })
+    user_content = build_user_content(text, image_path)
 
     for attempt in range(retry_times):
         try:
@@ -86,28 +162,357 @@ def extract_information(
                 response_format={"type": "json_object", "schema": JSON_SCHEMA},
                 temperature=0.1,
             )
-            
-            extracted_data = json.loads(response.choices[0].message.content)
-
-            # --- Validation Step ---
-            if is_valid_schema(extracted_data, JSON_SCHEMA['required']):
-                print("API call and schema validation successful.")
-                return extracted_data
-            else:
-                # This will be caught by the exception block's 'else' part
-                raise ValueError(f"Returned JSON is missing required keys. Content: {extracted_data}")
+            extracted_data = parse_extraction(response.choices[0].message.content)
+            print("API call and schema validation successful.")
+            if cache is not None:
+                cache.put(cache_key, extracted_data)
+            return extracted_data
 
         except Exception as e:
             print(f"An error occurred (attempt {attempt + 1}): {e}")
+            if not is_retryable(e):
+                return {"error": f"API call failed: {e}"}
             if attempt < retry_times - 1:
-                print("Retrying in 3 seconds...")
-                time.sleep(3)
+                delay = backoff_delay(attempt, retry_after_seconds(e))
+                print(f"Retrying in {delay:.1f} seconds...")
+                time.sleep(delay)
             else:
                 print("Max retries reached. API call failed.")
                 return {"error": f"API call failed after {retry_times} attempts: {e}"}
     
     return {"error": "An unknown error occurred after all retries."}
 
+
+class TokenBucket:
+    """Refills continuously at `per_minute / 60` units per second, up to `capacity` (one minute's worth by default)."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if they are now)."""
+        self._refill()
+        amount = min(amount, self.capacity)  # an oversized request waits for a full bucket, not forever
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        """Returns (positive) or charges (negative) units once the real cost of a request is known."""
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budgets shared by all concurrent extractions.
+
+    A request proceeds only when both buckets can pay for it. A 429 from the server
+    pauses every caller until its Retry-After has passed, not just the one that got it.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.paused_until = 0.0
+        self._lock = None
+
+    async def acquire(self, estimated_tokens: int):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # Waiters queue on the lock, so requests are admitted in arrival order
+        async with self._lock:
+            while True:
+                wait = max(
+                    self.paused_until - time.monotonic(),
+                    self.requests.wait_time(1),
+                    self.tokens.wait_time(estimated_tokens),
+                )
+                if wait <= 0:
+                    self.requests.consume(1)
+                    self.tokens.consume(estimated_tokens)
+                    return
+                await asyncio.sleep(wait)
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        if actual_tokens is not None:
+            self.tokens.adjust(estimated_tokens - actual_tokens)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+# Rough request cost used for admission before the server reports real usage
+IMAGE_TOKEN_ESTIMATE = 1000
+OUTPUT_TOKEN_ESTIMATE = 400
+
+
+def estimate_tokens(system_prompt: str, text: str, has_image: bool) -> int:
+    # ~4 characters per token for English text
+    return (len(system_prompt) + len(text or "")) // 4 + (IMAGE_TOKEN_ESTIMATE if has_image else 0) + OUTPUT_TOKEN_ESTIMATE
+
+
+def build_batch_system_prompt() -> str:
+    required_keys_str = ", ".join(f'"{key}"' for key in JSON_SCHEMA['required'])
+    return (
+        "You are an expert AI research assistant. You will receive several research paper abstracts, each introduced "
+        "by a line of the form '### Item <id>'. Analyze every abstract independently and return STRICTLY one JSON "
+        "object of the form {\"results\": [...]}, with exactly one element per item, in any order. "
+        f"Each element MUST contain the key \"id\" (the item's id, as a string) and the following keys: {required_keys_str}. "
+        f"Follow this JSON schema for every element: {json.dumps(JSON_SCHEMA['properties'])}. "
+        "Do not include any explanatory text outside of the JSON object."
+    )
+
+
+def build_batch_user_content(items: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """One text part listing the (id, text) items, each under an '### Item <id>' header."""
+    return [{"type": "text", "text": "\n\n".join(f"### Item {item_id}\n{text}" for item_id, text in items)}]
+
+
+def parse_batch_extraction(content: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Maps item id -> extracted data for every valid element of a batched reply.
+
+    Elements without an id or missing required keys are left out (their items fall back
+    to single requests); only a reply that is not a JSON object with a list raises.
+    """
+    reply = json.loads(content)
+    elements = reply.get("results") if isinstance(reply, dict) else reply
+    if not isinstance(elements, list):
+        raise ValueError(f"Batched reply has no results list. Content: {reply}")
+    valid = {}
+    for element in elements:
+        if not isinstance(element, dict) or "id" not in element:
+            continue
+        data = {key: value for key, value in element.items() if key != "id"}
+        if is_valid_schema(data, JSON_SCHEMA['required']):
+            valid[str(element["id"])] = data
+    return valid
+
+
+def estimate_batch_tokens(system_prompt: str, texts: List[str]) -> int:
+    return (len(system_prompt) + sum(len(text) + 16 for text in texts)) // 4 + OUTPUT_TOKEN_ESTIMATE * len(texts)
+
+
+class AsyncExtractor:
+    """
+    Asynchronous extraction engine around one pooled `AsyncOpenAI` client.
+
+    At most `max_concurrency` requests are in flight, and admission is paced by the
+    shared RPM/TPM token buckets, so many callers can saturate the quota without
+    tripping it. Failures are retried with exponential backoff and full jitter, and
+    never sooner than the server's Retry-After. `extract` returns the same dicts as
+    `extract_information` (the data, or {"error": ...}). With an `ExtractionCache`, repeated
+    requests are answered from it and never reach the API.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        model_name: str = "gpt-4o-latest",
+        max_concurrency: int = 16,
+        requests_per_minute: float = 500,
+        tokens_per_minute: float = 200000,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        timeout: float = 120.0,
+        cache=None,
+    ):
+        self.api_key = api_key or None
+        self.base_url = base_url or None
+        self.timeout = timeout
+        self.client = None
+        self.model_name = model_name
+        self.max_concurrency = max_concurrency
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.system_prompt = build_system_prompt()
+        self.batch_system_prompt = build_batch_system_prompt()
+        self.cache = cache
+        self._semaphore = None
+        self._inflight = {}  # cache key -> future of the request already running for it
+        self.stats = {
+            "cache_hits": 0, "coalesced": 0, "requests": 0, "succeeded": 0, "failed": 0, "retries": 0,
+            "rate_limited": 0, "tokens": 0, "batch_requests": 0, "batch_items": 0, "batch_fallbacks": 0,
+        }
+
+    def _get_client(self) -> AsyncOpenAI:
+        if self.client is None:
+            # Created on first use so a missing key surfaces as an extraction error, not at startup
+            self.client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0, timeout=self.timeout)
+        return self.client
+
+    def _cached(self, text, image_path, system_prompt=None):
+        """Cache key and cached result of an item; the key includes the prompt that produces the result."""
+        key = self.cache.key_for(self.model_name, system_prompt or self.system_prompt, JSON_SCHEMA, text, image_path)
+        return key, self.cache.get(key)
+
+    def _cached_for_batch(self, text):
+        """
+        Batch results are stored under the batch prompt, so single-item callers never get
+        them. A batch caller also accepts a single-item result, from the dedicated prompt.
+        Returns the batch key and the cached result.
+        """
+        key, cached = self._cached(text, None, self.batch_system_prompt)
+        if cached is None:
+            _, cached = self._cached(text, None)
+        return key, cached
+
+    @traced("extract")
+    async def extract(self, text: str, image_path: Optional[str] = None) -> Dict[str, Any]:
+        if self.cache is not None:
+            # Hashing the image and the SQLite lookup are blocking
+            cache_key, cached = await asyncio.to_thread(self._cached, text, image_path)
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                return cached
+            # Identical requests arriving while one is in flight share its result
+            pending = self._inflight.get(cache_key)
+            if pending is not None:
+                self.stats["coalesced"] += 1
+                return await asyncio.shield(pending)
+            pending = asyncio.get_running_loop().create_future()
+            self._inflight[cache_key] = pending
+            try:
+                result = await self._request(text, image_path)
+                if "error" not in result:
+                    await asyncio.to_thread(self.cache.put, cache_key, result)
+                pending.set_result(result)
+                return result
+            except BaseException as e:
+                pending.set_exception(e)
+                raise
+            finally:
+                del self._inflight[cache_key]
+        return await self._request(text, image_path)
+
+    async def _request(self, text: str, image_path: Optional[str]) -> Dict[str, Any]:
+        # Reading and encoding the image is blocking file I/O
+        user_content = await asyncio.to_thread(build_user_content, text, image_path)
+        estimated = estimate_tokens(self.system_prompt, text, len(user_content) > 1)
+        result, error, attempts = await self._complete(
+            self.system_prompt, user_content, estimated, parse_extraction, {"type": "json_object", "schema": JSON_SCHEMA}
+        )
+        if error is not None:
+            return {"error": f"API call failed after {attempts} attempts: {error}" if attempts else error}
+        self.stats["succeeded"] += 1
+        return result
+
+    async def _complete(self, system_prompt, user_content, estimated, parse, response_format):
+        """
+        Sends one chat completion, with rate limiting and retries.
+
+        Returns (parse(reply), None, attempts) on success, or (None, last error, attempts).
+        """
+        try:
+            client = self._get_client()
+        except Exception as e:
+            return None, f"Client initialization failed: {e}", 0
+        if not client.api_key:
+            return None, "API key not set", 0
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.stats["retries"] += 1
+                await asyncio.sleep(backoff_delay(attempt - 1, retry_after_seconds(error), self.base_delay, self.max_delay))
+            with span("llm.rate_limit_wait"):
+                await self.limiter.acquire(estimated)
+            async with self._semaphore:
+                self.stats["requests"] += 1
+                try:
+                    with span("llm.completion"):
+                        response = await client.chat.completions.create(
+                            model=self.model_name,
+                            messages=[
+                                {"role": "system", "content": system_prompt},
+                                {"role": "user", "content": user_content}
+                            ],
+                            response_format=response_format,
+                            temperature=0.1,
+                        )
+                    usage = getattr(response, "usage", None)
+                    actual = getattr(usage, "total_tokens", None)
+                    self.limiter.settle(estimated, actual)
+                    self.stats["tokens"] += actual or estimated
+                    return parse(response.choices[0].message.content), None, attempt + 1
+                except Exception as e:
+                    error = e
+                    if isinstance(e, APIStatusError) and e.status_code == 429:
+                        self.stats["rate_limited"] += 1
+                        retry_after = retry_after_seconds(e)
+                        if retry_after:
+                            self.limiter.pause(retry_after)
+                    if not is_retryable(e):
+                        break
+        self.stats["failed"] += 1
+        return None, error, attempt + 1
+
+    async def extract_batch(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Extracts several text-only items with one request, returning results in input order.
+
+        The items are sent together with per-item ids. Every element of the reply is
+        validated on its own; items that are missing or invalid, or all items if the whole
+        request fails, fall back to single-item `extract` calls.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+        keys: List[Optional[str]] = [None] * len(texts)
+        if self.cache is not None:
+            for i, text in enumerate(texts):
+                keys[i], results[i] = await asyncio.to_thread(self._cached_for_batch, text)
+                if results[i] is not None:
+                    self.stats["cache_hits"] += 1
+        todo = [i for i in range(len(texts)) if results[i] is None]
+
+        if len(todo) > 1:
+            items = [(str(n), texts[i]) for n, i in enumerate(todo)]
+            estimated = estimate_batch_tokens(self.batch_system_prompt, [text for _, text in items])
+            parsed, error, _ = await self._complete(
+                self.batch_system_prompt, build_batch_user_content(items), estimated, parse_batch_extraction,
+                {"type": "json_object"}
+            )
+            self.stats["batch_requests"] += 1
+            for (item_id, _), i in zip(items, todo):
+                data = (parsed or {}).get(item_id)
+                if data is not None:
+                    results[i] = data
+                    self.stats["batch_items"] += 1
+                    self.stats["succeeded"] += 1
+                    if self.cache is not None:
+                        await asyncio.to_thread(self.cache.put, keys[i], data)
+
+        fallback = [i for i in todo if results[i] is None]
+        self.stats["batch_fallbacks"] += len(fallback) if len(todo) > 1 else 0
+        for i, data in zip(fallback, await asyncio.gather(*[self.extract(texts[i]) for i in fallback])):
+            results[i] = data
+        return results
+
+    async def extract_many(self, items: List[Tuple[str, Optional[str]]]) -> List[Dict[str, Any]]:
+        """Extracts (text, image_path) pairs concurrently, returning results in input order."""
+        return await asyncio.gather(*[self.extract(text, image_path) for text, image_path in items])
+
+    async def aclose(self):
+        if self.client is not None:
+            await self.client.close()
+
+
 if __name__ == '__main__':
     # Example usage for testing the extractor directly
     sample_text = (
@@ -0,0 +1,140 @@
+import numpy as np
+
+
+class ScalarInt8Quantizer:
+    """
+    Symmetric per-dimension int8 quantization.
+
+    Each dimension is scaled by its largest absolute value in the training sample, so a
+    3584-d float32 vector (14 KB) becomes 3.5 KB of codes. Queries stay in float32 and are
+    scored against the codes directly (asymmetric distance).
+    """
+
+    def __init__(self):
+        self.scale = None  # (D,) float32
+
+    @property
+    def trained(self):
+        return self.scale is not None
+
+    def config(self):
+        return {}
+
+    def state(self):
+        return {"scale": self.scale}
+
+    def load_state(self, state):
+        self.scale = state["scale"]
+
+    def train(self, vectors):
+        max_abs = np.abs(np.asarray(vectors, dtype=np.float32)).max(axis=0)
+        self.scale = np.maximum(max_abs, 1e-8) / 127.0
+
+    def encode(self, vectors):
+        codes = np.rint(np.asarray(vectors, dtype=np.float32) / self.scale)
+        return np.clip(codes, -127, 127).astype(np.int8)
+
+    def decode(self, codes):
+        return codes.astype(np.float32) * self.scale
+
+    def scores(self, queries, codes):
+        """Returns (Q, N) approximate inner products between float queries and int8 codes."""
+        return (queries * self.scale) @ codes.astype(np.float32).T
+
+    def code_bytes(self, n_vectors):
+        return n_vectors * self.scale.shape[0]
+
+
+class ProductQuantizer:
+    """
+    Product quantization with `n_subspaces` sub-vectors of 256 centroids each (one byte per sub-vector).
+
+    Scoring builds a per-query lookup table of sub-vector/centroid inner products, so a
+    candidate's score is a sum of `n_subspaces` table lookups (asymmetric distance).
+    """
+
+    def __init__(self, n_subspaces=64, n_centroids=256, n_iter=20, seed=0):
+        if n_centroids > 256:
+            raise ValueError("n_centroids must fit in one byte (<= 256)")
+        self.n_subspaces = n_subspaces
+        self.n_centroids = n_centroids
+        self.n_iter = n_iter
+        self.seed = seed
+        self.centroids = None  # (M, K, D / M)
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def config(self):
+        """Settings a saved codebook must match to be reused."""
+        return {"n_subspaces": self.n_subspaces, "n_centroids": self.n_centroids}
+
+    def state(self):
+        return {"centroids": self.centroids}
+
+    def load_state(self, state):
+        self.centroids = state["centroids"]
+
+    def _split(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n, dim = vectors.shape
+        if dim % self.n_subspaces:
+            raise ValueError(f"Dimension {dim} is not divisible by n_subspaces={self.n_subspaces}")
+        return vectors.reshape(n, self.n_subspaces, dim // self.n_subspaces)
+
+    def train(self, vectors):
+        sub_vectors = self._split(vectors)
+        rng = np.random.default_rng(self.seed)
+        n = sub_vectors.shape[0]
+        k = min(self.n_centroids, n)
+        centroids = []
+        for m in range(self.n_subspaces):
+            data = sub_vectors[:, m, :]
+            centers = data[rng.choice(n, size=k, replace=False)].copy()
+            for _ in range(self.n_iter):
+                assignment = _nearest(data, centers)
+                for c in range(k):
+                    members = data[assignment == c]
+                    if len(members):
+                        centers[c] = members.mean(axis=0)
+                    else:
+                        centers[c] = data[rng.integers(n)]  # re-seed empty clusters
+            centroids.append(centers)
+        self.centroids = np.stack(centroids)
+
+    def encode(self, vectors):
+        sub_vectors = self._split(vectors)
+        codes = np.empty((sub_vectors.shape[0], self.n_subspaces), dtype=np.uint8)
+        for m in range(self.n_subspaces):
+            codes[:, m] = _nearest(sub_vectors[:, m, :], self.centroids[m])
+        return codes
+
+    def decode(self, codes):
+        parts = [self.centroids[m][codes[:, m]] for m in range(self.n_subspaces)]
+        return np.concatenate(parts, axis=1)
+
+    def scores(self, queries, codes):
+        """Returns (Q, N) approximate inner products via per-query lookup tables."""
+        sub_queries = self._split(queries)
+        # (Q, M, K): inner product of each query sub-vector with every centroid
+        tables = np.einsum('qmd,mkd->qmk', sub_queries, self.centroids)
+        scores = np.zeros((sub_queries.shape[0], codes.shape[0]), dtype=np.float32)
+        for m in range(self.n_subspaces):
+            scores += tables[:, m, codes[:, m]]
+        return scores
+
+    def code_bytes(self, n_vectors):
+        return n_vectors * self.n_subspaces
+
+
+def _nearest(data, centers):
+    """Index of the nearest center (L2) for each row of `data`."""
+    distances = (centers ** 2).sum(axis=1)[np.newaxis, :] - 2.0 * data @ centers.T
+    return distances.argmin(axis=1)
+
+
+QUANTIZERS = {
+    'int8': ScalarInt8Quantizer,
+    'pq': ProductQuantizer,
+}
@@ -1,56 +1,396 @@
 import torch
-from modeling_gme_qwen2vl import GmeQwen2VL
+from modeling_gme_qwen2vl import DEFAULT_INSTRUCTION, GmeQwen2VL, quantize_linear_int8
 from PIL import Image
 import numpy as np
 from database import Database
+from embedding_cache import EmbeddingCache, QueryEmbeddingCache, content_payload, make_cache_key, read_image_bytes
+import atexit
+import os
+import hashlib
 import io
 import base64
+import threading
+import time
+from sparse_index import reciprocal_rank_fusion
+from tracing import span
+
+DTYPES = {
+    'float16': torch.float16,
+    'bfloat16': torch.bfloat16,
+    'float32': torch.float32,
+}
+
+
+def resolve_device_settings(device=None, dtype=None, num_threads=None, quantize=None):
+    """
+    Fills unset inference options from the environment, then from defaults.
+
+    Environment variables: GME_DEVICE ('cuda' or 'cpu'), GME_DTYPE ('float16', 'bfloat16'
+    or 'float32'), GME_NUM_THREADS (CPU threads for torch) and GME_QUANTIZE ('int8').
+    Defaults: CUDA with float16 when a GPU is available, otherwise CPU with float32.
+    """
+    device = device or os.environ.get('GME_DEVICE') or ('cuda' if torch.cuda.is_available() else 'cpu')
+    dtype = dtype or os.environ.get('GME_DTYPE') or ('float16' if device.startswith('cuda') else 'float32')
+    if num_threads is None and os.environ.get('GME_NUM_THREADS'):
+        num_threads = int(os.environ['GME_NUM_THREADS'])
+    quantize = quantize or os.environ.get('GME_QUANTIZE') or None
+
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported dtype '{dtype}'. Choose from: {', '.join(DTYPES)}")
+    if quantize not in (None, 'int8'):
+        raise ValueError(f"Unsupported quantization '{quantize}'. Only 'int8' is available")
+    if quantize and (not device.startswith('cpu') or dtype != 'float32'):
+        raise ValueError("int8 dynamic quantization is only supported with device='cpu' and dtype='float32'")
+    return device, dtype, num_threads, quantize
+
+
+def load_model(model_name, device=None, dtype=None, num_threads=None, quantize=None):
+    """Loads GmeQwen2VL on the requested device/dtype, optionally int8-quantizing its Linear layers."""
+    device, dtype, num_threads, quantize = resolve_device_settings(device, dtype, num_threads, quantize)
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    print(f"Model settings: device={device}, dtype={dtype}, threads={torch.get_num_threads()}, quantize={quantize}")
+    model = GmeQwen2VL.from_pretrained(
+        model_name,
+        torch_dtype=DTYPES[dtype], device_map=device, trust_remote_code=True
+    )
+    if quantize == 'int8':
+        model = quantize_linear_int8(model)
+    return model
+
 
 class Retriever:
-    def __init__(self, model_name='Alibaba-NLP/gme-Qwen2-VL-7B-Instruct', db_path='database.json'):
-        print("Loading model... This may take a while.")
-        self.model = GmeQwen2VL.from_pretrained(
-            "Alibaba-NLP/gme-Qwen2-VL-7B-Instruct",
-            torch_dtype="float16", device_map='cuda', trust_remote_code=True
-        )
-        self.db = Database(path="./database")
+    def __init__(self, model_name='Alibaba-NLP/gme-Qwen2-VL-7B-Instruct', db_path='./database',
+                 embedding_cache_dir='./embedding_cache', embedding_cache_capacity=50000,
+                 query_cache_size=1024, query_cache_ttl=None, vector_backend='chroma',
+                 vector_backend_options=None, device=None, dtype=None, num_threads=None, quantize=None,
+                 lazy_load=False, model=None):
+        """
+        With `lazy_load=True` the model is loaded on the first embedding, so keyword-only use never needs it.
+        `model` replaces GmeQwen2VL with any object exposing the same `get_*_embeddings` methods
+        (e.g. a CPU stand-in for benchmarks); `model_name` then only namespaces cache keys.
+        """
+        self.model_name = model_name
+        self._model = model
+        # Read by cache keys, which must not load a lazily loaded model
+        self.default_instruction = getattr(model, 'default_instruction', DEFAULT_INSTRUCTION)
+        self._model_options = dict(device=device, dtype=dtype, num_threads=num_threads, quantize=quantize)
+        self._model_lock = threading.Lock()
+        if not lazy_load:
+            self._load_model()
+        self.db = Database(path=db_path, backend=vector_backend, backend_options=vector_backend_options)
         self.search_instruction = 'Find a document that matches the given query.'
-        print("Model loaded successfully.")
+        # Pass embedding_cache_dir=None to disable the on-disk embedding cache
+        self.embedding_cache = None
+        if embedding_cache_dir:
+            self.embedding_cache = EmbeddingCache(embedding_cache_dir, capacity=embedding_cache_capacity)
+            if self.embedding_cache.disabled:
+                self.embedding_cache = None  # the directory is locked by another process
+            else:
+                atexit.register(self.embedding_cache.flush)
+        # In-process LRU for repeated search queries (query_cache_size=0 disables it)
+        self.query_cache = QueryEmbeddingCache(max_entries=query_cache_size, ttl=query_cache_ttl)
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._load_model()
+        return self._model
+
+    def _load_model(self):
+        with self._model_lock:
+            if self._model is None:
+                print("Loading model... This may take a while.")
+                self._model = load_model(self.model_name, **self._model_options)
+                print("Model loaded successfully.")
+
+    def _cache_key(self, modality, payload, is_query, instruction):
+        """Returns the embedding cache key, or None if the cache is disabled or the input is not hashable."""
+        if self.embedding_cache is None or payload is None:
+            return None
+        # Mirror GmeQwen2VL.embed: documents and instruction-less queries use the default instruction
+        if not is_query or instruction is None:
+            instruction = self.default_instruction
+        return make_cache_key(self.model_name, instruction, is_query, modality, payload)
+
+    def _cached_embedding(self, key, compute_fn):
+        if key is not None:
+            embedding = self.embedding_cache.get(key)
+            if embedding is not None:
+                return embedding
+        embedding = compute_fn()
+        if key is not None:
+            self.embedding_cache.put(key, embedding)
+        return embedding
 
     def get_text_embedding(self, text, is_query=False, instruction=None):
-        with torch.no_grad():
+        key = self._cache_key('text', content_payload('text', text), is_query, instruction)
+        return self._cached_embedding(key, lambda: self._embed_text(text, is_query, instruction))
+
+    def _embed_text(self, text, is_query, instruction):
+        with span("model.embed"), torch.no_grad():
             embedding_tensor = self.model.get_text_embeddings(texts=[text], is_query=is_query, instruction=instruction)
-            return embedding_tensor[0].cpu().numpy()
+            return embedding_tensor[0].float().cpu().numpy()
+
+    def get_text_embeddings(self, texts, is_query=False, instruction=None, batch_size=32, token_budget=None):
+        """
+        Embeds a list of texts in batches and returns an (N, D) numpy array. Only cache misses hit the model.
+        With `token_budget`, texts are sorted by token length and batched under that padded-token budget.
+        """
+        texts = list(texts)
+        keys = [self._cache_key('text', content_payload('text', text), is_query, instruction) for text in texts]
+        embeddings = [None] * len(texts)
+        if self.embedding_cache is not None:
+            embeddings = [self.embedding_cache.get(key) for key in keys]
+
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            with span("model.embed"), torch.no_grad():
+                embedding_tensor = self.model.get_text_embeddings(
+                    texts=[texts[i] for i in missing], is_query=is_query, instruction=instruction,
+                    batch_size=batch_size, token_budget=token_budget
+                )
+            computed = embedding_tensor.float().cpu().numpy()
+            for i, embedding in zip(missing, computed):
+                embeddings[i] = embedding
+                if keys[i] is not None:
+                    self.embedding_cache.put(keys[i], embedding)
+        return np.stack(embeddings).astype(np.float32) if embeddings else np.empty((0, 0), dtype=np.float32)
 
     def get_image_embedding(self, image_path, is_query=False, instruction=None):
-        with torch.no_grad():
+        key = self._cache_key('image', content_payload('image', image=image_path), is_query, instruction)
+        return self._cached_embedding(key, lambda: self._embed_image(image_path, is_query, instruction))
+
+    def _embed_image(self, image_path, is_query, instruction):
+        with span("model.embed"), torch.no_grad():
             embedding_tensor = self.model.get_image_embeddings(images=[image_path], is_query=is_query, instruction=instruction)
-            return embedding_tensor[0].cpu().numpy()
+            return embedding_tensor[0].float().cpu().numpy()
 
     def get_image_text_embedding(self, image_path, text, is_query=False, instruction=None):
-        with torch.no_grad():
+        key = self._cache_key('image-text', content_payload('image-text', text, image_path), is_query, instruction)
+        return self._cached_embedding(key, lambda: self._embed_image_text(image_path, text, is_query, instruction))
+
+    def _embed_image_text(self, image_path, text, is_query, instruction):
+        with span("model.embed"), torch.no_grad():
             embedding_tensor = self.model.get_fused_embeddings(texts=[text], images=[image_path], is_query=is_query, instruction=instruction)
-            return embedding_tensor[0].cpu().numpy()
+            return embedding_tensor[0].float().cpu().numpy()
+
+    def embed_batch(self, texts=None, images=None, is_query=False, instruction=None):
+        """
+        Embeds N items of one modality in a single model call and returns an (N, D) numpy array.
+        Pass `texts`, `images`, or both (image-text); cached items are not recomputed.
+        """
+        n_items = len(texts) if texts is not None else len(images)
+        if texts is not None and images is not None:
+            modality = 'image-text'
+        else:
+            modality = 'text' if texts is not None else 'image'
+
+        keys = [
+            self._cache_key(
+                modality,
+                content_payload(modality, texts[i] if texts is not None else None, images[i] if images is not None else None),
+                is_query, instruction
+            )
+            for i in range(n_items)
+        ]
+        embeddings = [None] * n_items
+        if self.embedding_cache is not None:
+            embeddings = [self.embedding_cache.get(key) if key is not None else None for key in keys]
+
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            with span("model.embed"), torch.no_grad():
+                embedding_tensor = self.model.get_fused_embeddings(
+                    texts=[texts[i] for i in missing] if texts is not None else None,
+                    images=[images[i] for i in missing] if images is not None else None,
+                    is_query=is_query, instruction=instruction, batch_size=len(missing)
+                )
+            for i, embedding in zip(missing, embedding_tensor.float().cpu().numpy()):
+                embeddings[i] = embedding
+                if keys[i] is not None:
+                    self.embedding_cache.put(keys[i], embedding)
+        return np.stack(embeddings).astype(np.float32)
 
     def _cosine_similarity(self, v1, v2):
         return np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
 
-    def search(self, query, image_query_path=None, top_k=5):
-        query_embedding = None
+    def query_cache_stats(self):
+        """Returns hit rate, evictions, entries and bytes held by the query embedding cache."""
+        return self.query_cache.stats()
+
+    def _query_cache_key(self, query, image_query_path):
+        if not image_query_path:
+            return ('text', query)
+        image_bytes = read_image_bytes(image_query_path)
+        if image_bytes is None:
+            return None
+        image_hash = hashlib.sha256(image_bytes).hexdigest()
+        return ('image-text', image_hash, query) if query else ('image', image_hash)
+
+    def embed_query(self, query, image_query_path=None):
+        """Embeds a text, image or image-text search query, going through the query cache."""
+        if not query and not image_query_path:
+            return None
+
+        key = self._query_cache_key(query, image_query_path)
+        if key is not None:
+            query_embedding = self.query_cache.get(key)
+            if query_embedding is not None:
+                return query_embedding
+
         if image_query_path:
             if query:  # image-text query
                 query_embedding = self.get_image_text_embedding(image_query_path, query, is_query=True, instruction=self.search_instruction)
             else:  # image query
                 query_embedding = self.get_image_embedding(image_query_path, is_query=True, instruction=self.search_instruction)
-        elif query:  # text query
+        else:  # text query
             query_embedding = self.get_text_embedding(query, is_query=True, instruction=self.search_instruction)
-        else:
-            return [] # No query provided
 
+        if key is not None and query_embedding is not None:
+            self.query_cache.put(key, query_embedding)
+        return query_embedding
+
+    def search(self, query, image_query_path=None, top_k=5, filters=None, mode='dense'):
+        """
+        Searches with `mode` 'dense' (GME embedding), 'sparse' (BM25 keywords, text only,
+        no model needed) or 'hybrid' (both, fused with reciprocal rank fusion).
+        """
+        if mode == 'sparse':
+            return self.search_sparse(query, top_k=top_k, filters=filters)
+        if mode not in ('dense', 'hybrid'):
+            raise ValueError(f"Unknown search mode '{mode}'. Choose from: dense, sparse, hybrid")
+        query_embedding = self.embed_query(query, image_query_path)
         if query_embedding is None:
             return []
+        if mode == 'hybrid':
+            return self.search_hybrid_by_embedding(query, query_embedding, top_k=top_k, filters=filters)
+        return self.search_by_embedding(query_embedding, top_k=top_k, filters=filters)
+
+    def search_batch(self, queries, images=None, top_k=5, filters=None, batch_size=32):
+        """
+        Searches many queries with batched embedding and a single multi-query index lookup.
+
+        Args:
+            queries (list): Query texts (None or "" for image-only queries).
+            images (list): Query image paths aligned with `queries`, or None for text-only.
+            top_k (int): Results per query.
+            filters (dict): Applied to every query, see `metadata_schema.build_where`.
+            batch_size (int): Queries per model call.
+
+        Returns:
+            (results, timings): `results[i]` is the [(similarity, item_dict), ...] list of
+            query i, in input order ([] for an empty query). `timings` holds the milliseconds
+            spent per stage ('embed_ms', 'search_ms', 'format_ms', 'total_ms') and how many
+            queries were served from the query cache or embedded by the model (repeated
+            queries are embedded once).
+        """
+        t_start = time.perf_counter()
+        images = images if images is not None else [None] * len(queries)
+        if len(images) != len(queries):
+            raise ValueError(f"Got {len(images)} images for {len(queries)} queries")
+
+        # Query cache first, then one embed_batch call per modality and chunk
+        embeddings = [None] * len(queries)
+        keys = [None] * len(queries)
+        groups = {}
+        duplicates = {}  # index -> index of the identical query that is embedded
+        first_index = {}
+        cache_hits = 0
+        for i, (query, image) in enumerate(zip(queries, images)):
+            if not query and not image:
+                continue
+            key = self._query_cache_key(query, image)
+            cached = self.query_cache.get(key) if key is not None else None
+            if cached is not None:
+                embeddings[i] = cached
+                cache_hits += 1
+                continue
+            if key is not None and key in first_index:
+                duplicates[i] = first_index[key]
+                continue
+            keys[i] = key
+            if key is not None:
+                first_index[key] = i
+            modality = 'image-text' if query and image else ('image' if image else 'text')
+            groups.setdefault(modality, []).append(i)
+        for modality, indices in groups.items():
+            for start in range(0, len(indices), batch_size):
+                chunk = indices[start:start + batch_size]
+                batch = self.embed_batch(
+                    texts=[queries[i] for i in chunk] if modality != 'image' else None,
+                    images=[images[i] for i in chunk] if modality != 'text' else None,
+                    is_query=True, instruction=self.search_instruction
+                )
+                for i, embedding in zip(chunk, batch):
+                    embeddings[i] = embedding
+                    if keys[i] is not None:
+                        self.query_cache.put(keys[i], embedding)
+        for i, source in duplicates.items():
+            embeddings[i] = embeddings[source]
+        t_embedded = time.perf_counter()
+
+        searched = [i for i, embedding in enumerate(embeddings) if embedding is not None]
+        results = [[] for _ in queries]
+        if searched:
+            found = self.db.query_many(np.stack([embeddings[i] for i in searched]), top_k=top_k, filters=filters)
+        t_searched = time.perf_counter()
+
+        if searched:
+            for i, ids, metadatas, distances in zip(searched, found['ids'], found['metadatas'], found['distances']):
+                results[i] = [(1 - distance, dict(metadata, id=item_id))
+                              for item_id, metadata, distance in zip(ids, metadatas, distances)]
+        t_end = time.perf_counter()
+
+        timings = {
+            'n_queries': len(queries),
+            'cache_hits': cache_hits,
+            'embedded': len(searched) - cache_hits - len(duplicates),
+            'embed_ms': (t_embedded - t_start) * 1000,
+            'search_ms': (t_searched - t_embedded) * 1000,
+            'format_ms': (t_end - t_searched) * 1000,
+            'total_ms': (t_end - t_start) * 1000,
+        }
+        return results, timings
+
+    def search_sparse(self, query, top_k=5, filters=None):
+        """BM25 keyword search over titles, text and extracted fields. Returns [(bm25_score, item_dict), ...]."""
+        if not query:
+            return []
+        results = self.db.sparse_query(query, top_k=top_k, filters=filters)
+        return [
+            (score, dict(metadata, id=item_id))
+            for item_id, metadata, score in zip(results['ids'][0], results['metadatas'][0], results['scores'][0])
+        ]
+
+    def search_hybrid_by_embedding(self, query, query_embedding, top_k=5, filters=None, candidate_k=50, rrf_k=60):
+        """
+        Fuses the dense ranking of `query_embedding` with the BM25 ranking of the `query` text.
+
+        Each side contributes its best `candidate_k` items; they are merged with reciprocal
+        rank fusion, so the returned scores are fused RRF scores rather than similarities.
+        An image-only query (no text) falls back to the dense ranking.
+        """
+        n_candidates = max(top_k, candidate_k)
+        dense = self.search_by_embedding(query_embedding, top_k=n_candidates, filters=filters)
+        if not query:
+            return dense[:top_k]
+        sparse = self.search_sparse(query, top_k=n_candidates, filters=filters)
+        items = {item['id']: item for _, item in sparse}
+        items.update((item['id'], item) for _, item in dense)
+        fused = reciprocal_rank_fusion(
+            [[item['id'] for _, item in dense], [item['id'] for _, item in sparse]], top_k, k=rrf_k
+        )
+        return [(score, items[item_id]) for item_id, score in fused]
+
+    def search_by_embedding(self, query_embedding, top_k=5, filters=None):
+        """
+        Looks up an already-embedded query and returns [(similarity, item_dict), ...].
 
-        results = self.db.query(query_embedding, top_k=top_k)
+        `filters` restricts results by type, date range or extracted fields, e.g.
+        {"type": "image", "date_from": "2024-01-01", "primary_task": "Image Classification"}.
+        """
+        results = self.db.query(query_embedding, top_k=top_k, filters=filters)
 
         # Format results to be consistent with the old structure: (similarity, item_dict)
         formatted_results = []
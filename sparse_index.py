@@ -0,0 +1,170 @@
+import json
+import math
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+# Words with inner '-' or '.' ("resnet-50", "gpt-4.0") are kept whole and also split into
+# their parts, so both "ResNet-50" and "ResNet" match. CJK text is indexed per character.
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*|[\u4e00-\u9fff]")
+PART_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Fields of `extracted_info` whose values are indexed with the title and text
+EXTRACTED_TEXT_FIELDS = ("model_name", "primary_task", "key_contribution", "datasets_used",
+                         "evaluation_metrics", "one_sentence_summary")
+
+
+def tokenize(text):
+    tokens = []
+    for token in TOKEN_PATTERN.findall((text or "").lower()):
+        tokens.append(token)
+        if "-" in token or "." in token:
+            tokens.extend(PART_PATTERN.findall(token))
+    return tokens
+
+
+def document_text(metadata, title_weight=2):
+    """The text indexed for one record: its title (repeated `title_weight` times), text and extracted fields."""
+    try:
+        info = json.loads(metadata.get("extracted_info") or "{}")
+    except (TypeError, ValueError):
+        info = {}
+    if not isinstance(info, dict) or "error" in info:
+        info = {}
+    parts = [metadata.get("title") or ""] * title_weight + [metadata.get("text") or ""]
+    for field in EXTRACTED_TEXT_FIELDS:
+        value = info.get(field)
+        if isinstance(value, list):
+            parts.extend(str(v) for v in value)
+        elif value:
+            parts.append(str(value))
+    return "\n".join(parts)
+
+
+class BM25Index:
+    """
+    In-memory inverted index with Okapi BM25 scoring, updated one document at a time.
+
+    Postings map each term to {slot: term frequency}. Every document owns a slot; an
+    update replaces its postings in place and a removal empties the slot. Scoring reads
+    per-term numpy arrays that are rebuilt only for terms changed since the last query,
+    so a query costs one vectorized pass per query term.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # term -> {slot: tf}
+        self.slots = {}  # id -> slot
+        self.ids = []  # slot -> id, None for removed documents
+        self.doc_terms = []  # slot -> Counter of term frequencies
+        self.lengths = np.zeros(0, dtype=np.float32)
+        self.total_length = 0
+        self._arrays = {}  # term -> (slots, tfs), dropped when the term's postings change
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.slots)
+
+    def add(self, ids, texts):
+        """Indexes (or re-indexes) the given ids with their texts."""
+        with self._lock:
+            for item_id, text in zip(ids, texts):
+                terms = Counter(tokenize(text))
+                # A re-indexed document keeps its slot
+                slot = self.slots.get(item_id)
+                if slot is None:
+                    slot = len(self.ids)
+                    self.ids.append(None)
+                    self.doc_terms.append({})
+                else:
+                    self._remove_locked(item_id)
+                self.ids[slot] = item_id
+                self.doc_terms[slot] = terms
+                self.slots[item_id] = slot
+                if slot >= len(self.lengths):
+                    grown = np.zeros(max(1024, 2 * len(self.lengths)), dtype=np.float32)
+                    grown[:len(self.lengths)] = self.lengths
+                    self.lengths = grown
+                length = sum(terms.values())
+                self.lengths[slot] = length
+                self.total_length += length
+                for term, tf in terms.items():
+                    self.postings.setdefault(term, {})[slot] = tf
+                    self._arrays.pop(term, None)
+
+    def remove(self, ids):
+        with self._lock:
+            for item_id in ids:
+                self._remove_locked(item_id)
+
+    def _remove_locked(self, item_id):
+        slot = self.slots.pop(item_id, None)
+        if slot is None:
+            return
+        for term in self.doc_terms[slot]:
+            postings = self.postings[term]
+            del postings[slot]
+            if not postings:
+                del self.postings[term]
+            self._arrays.pop(term, None)
+        self.total_length -= int(self.lengths[slot])
+        self.lengths[slot] = 0
+        self.ids[slot] = None
+        self.doc_terms[slot] = {}
+
+    def _term_arrays(self, term):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self.postings[term]
+            arrays = (np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                      np.fromiter(postings.values(), dtype=np.float32, count=len(postings)))
+            self._arrays[term] = arrays
+        return arrays
+
+    def scores(self, query):
+        """BM25 score of every slot for a query string (0 for slots matching no query term)."""
+        with self._lock:
+            n_docs = len(self.slots)
+            scores = np.zeros(len(self.ids), dtype=np.float32)
+            if n_docs == 0:
+                return scores
+            avg_length = self.total_length / n_docs
+            for term in set(tokenize(query)):
+                if term not in self.postings:
+                    continue
+                slots, tfs = self._term_arrays(term)
+                idf = math.log(1.0 + (n_docs - len(slots) + 0.5) / (len(slots) + 0.5))
+                norm = self.k1 * (1.0 - self.b + self.b * self.lengths[slots] / avg_length)
+                scores[slots] += idf * tfs * (self.k1 + 1.0) / (tfs + norm)
+            return scores
+
+    def search(self, query, top_k, allowed_ids=None):
+        """Returns ([ids], [scores]) of the best top_k documents with a positive score, among `allowed_ids` if given."""
+        if top_k <= 0:
+            return [], []
+        scores = self.scores(query)
+        if allowed_ids is not None:
+            mask = np.zeros(len(scores), dtype=bool)
+            mask[[self.slots[item_id] for item_id in allowed_ids if item_id in self.slots]] = True
+            scores[~mask] = 0.0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [self.ids[slot] for slot in order], scores[order].tolist()
+
+
+def reciprocal_rank_fusion(rankings, top_k, k=60):
+    """
+    Fuses several ranked id lists with reciprocal rank fusion: score(id) = sum of 1 / (k + rank).
+
+    Returns [(id, fused_score), ...] of the best top_k, best first.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            fused[item_id] = fused.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda pair: pair[1], reverse=True)[:top_k]
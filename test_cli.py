@@ -17,7 +17,6 @@ def handle_add(args):
     image_path = args.image_path
 
     embedding = None
-    final_content = content
 
     print(f"Processing item type: {item_type}")
     if item_type == "text":
@@ -26,7 +25,7 @@ def handle_add(args):
             return
         print(f"Generating text embedding for: {title}")
         embedding = retriever.get_text_embedding(content)
-        final_content = content
+        image_path = ""
 
     elif item_type == "image":
         if not image_path:
@@ -37,7 +36,7 @@ def handle_add(args):
             return
         print(f"Generating image embedding for: {image_path}")
         embedding = retriever.get_image_embedding(image_path)
-        final_content = image_path 
+        content = ""
 
     elif item_type == "image-text":
         if not image_path or not content:
@@ -48,7 +47,6 @@ def handle_add(args):
             return
         print(f"Generating image-text embedding for: {content} | {image_path}")
         embedding = retriever.get_image_text_embedding(image_path, content)
-        final_content = f"{content} | {image_path}"
     
     else:
         print(f"Error: Unknown item type '{item_type}'", file=sys.stderr)
@@ -56,7 +54,7 @@ def handle_add(args):
 
     if embedding is not None:
         current_date = datetime.now().isoformat()
-        db.add(item_type, title, final_content, url, current_date, embedding)
+        db.add(item_type, title, content, image_path, url, current_date, embedding)
         print(f"\\nSuccessfully added '{title}' to the database.")
     else:
         print("\\nFailed to add item.", file=sys.stderr)
@@ -65,7 +63,8 @@ def handle_add(args):
 def handle_search(args):
     """Handles the 'search' command."""
     print("Initializing retriever for searching...")
-    retriever = Retriever()
+    # Keyword search never embeds, so it does not load the model
+    retriever = Retriever(lazy_load=args.mode == 'sparse')
 
     query = args.query
     image_query_path = args.image_query_path
@@ -79,8 +78,15 @@ def handle_search(args):
         print(f"Error: Image path does not exist: {image_query_path}", file=sys.stderr)
         return
 
-    print(f"\nSearching for query: '{query}' with image: '{image_query_path}' (top_k={top_k})...")
-    results = retriever.search(query, image_query_path, top_k)
+    filters = {
+        key: value for key, value in {
+            'type': args.type, 'date_from': args.date_from, 'date_to': args.date_to,
+            'primary_task': args.primary_task, 'model_name': args.model_name, 'datasets_used': args.dataset,
+        }.items() if value
+    }
+
+    print(f"\nSearching for query: '{query}' with image: '{image_query_path}' (top_k={top_k}, mode={args.mode}, filters={filters})...")
+    results = retriever.search(query, image_query_path, top_k, filters=filters or None, mode=args.mode)
 
     if not results:
         print("\nNo results found.")
@@ -89,15 +95,41 @@ def handle_search(args):
     print("\n--- Search Results ---")
     for i, (sim, item) in enumerate(results):
         print(f"\nResult {i+1}:")
-        print(f"  Similarity: {sim:.4f}")
+        print(f"  Score: {sim:.4f}")
         print(f"  Title: {item.get('title', 'N/A')}")
         print(f"  Type: {item.get('type', 'N/A')}")
-        print(f"  Content: {item.get('content', 'N/A')}")
+        print(f"  Content: {item.get('text') or 'N/A'}")
+        if item.get('image_path'):
+            print(f"  Image: {item['image_path']}")
         print(f"  URL: {item.get('url', 'N/A')}")
         print(f"  Date: {item.get('date', 'N/A')}")
     print("----------------------")
 
 
+def handle_search_batch(args):
+    """Handles the 'search_batch' command: one query per line of a text file."""
+    with open(args.queries_file, 'r', encoding='utf-8') as f:
+        queries = [line.strip() for line in f if line.strip()]
+    if not queries:
+        print("Error: The queries file is empty.", file=sys.stderr)
+        return
+
+    print("Initializing retriever for searching...")
+    retriever = Retriever()
+    print(f"\nSearching {len(queries)} queries (top_k={args.top_k}, batch_size={args.batch_size})...")
+    results, timings = retriever.search_batch(queries, top_k=args.top_k, batch_size=args.batch_size)
+
+    for query, hits in zip(queries, results):
+        print(f"\nQuery: {query}")
+        for i, (sim, item) in enumerate(hits):
+            print(f"  {i+1}. [{sim:.4f}] {item.get('title', 'N/A')}")
+
+    print("\n--- Timings ---")
+    print(f"  Queries: {timings['n_queries']} ({timings['cache_hits']} from cache, {timings['embedded']} embedded)")
+    print(f"  Embed: {timings['embed_ms']:.1f} ms | Index lookup: {timings['search_ms']:.1f} ms | "
+          f"Format: {timings['format_ms']:.1f} ms | Total: {timings['total_ms']:.1f} ms")
+
+
 def main():
     """Main function to parse arguments and call handlers."""
     parser = argparse.ArgumentParser(description="Command-line interface for the Multimodal Retrieval System.")
@@ -117,8 +149,25 @@ def main():
     parser_search.add_argument('--query', help='The text query to search for.')
     parser_search.add_argument('--image_query_path', help='Path to an image for the query.')
     parser_search.add_argument('--top_k', type=int, default=5, help='Number of top results to return.')
+    parser_search.add_argument('--mode', choices=['dense', 'sparse', 'hybrid'], default='dense',
+                               help='dense: embedding search; sparse: BM25 keywords only (no model); hybrid: both, fused.')
+    parser_search.add_argument('--type', action='append', choices=['text', 'image', 'image-text'],
+                               help='Only return items of this type (repeatable).')
+    parser_search.add_argument('--date_from', help='Only return items added on or after this ISO date.')
+    parser_search.add_argument('--date_to', help='Only return items added on or before this ISO date.')
+    parser_search.add_argument('--primary_task', help='Only return items with this extracted primary task.')
+    parser_search.add_argument('--model_name', help='Only return items with this extracted model name.')
+    parser_search.add_argument('--dataset', action='append',
+                               help='Only return items whose extracted datasets include this one (repeatable).')
     parser_search.set_defaults(func=handle_search)
 
+    # --- Batch search command ---
+    parser_batch = subparsers.add_parser('search_batch', help='Search many text queries in one batched pass')
+    parser_batch.add_argument('queries_file', help='Text file with one query per line.')
+    parser_batch.add_argument('--top_k', type=int, default=5, help='Number of top results per query.')
+    parser_batch.add_argument('--batch_size', type=int, default=32, help='Queries per model call.')
+    parser_batch.set_defaults(func=handle_search_batch)
+
     args = parser.parse_args()
     args.func(args)
 
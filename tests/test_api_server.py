@@ -0,0 +1,96 @@
+import http.client
+import json
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+# Make the project modules importable when running from the tests/ directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_server import ApiHandler, SearchService
+from benchmarks.fake_embedder import HashingEmbedder
+from embedding_server import QueueFullError
+from retriever import Retriever
+
+
+@pytest.fixture
+def api(tmp_path):
+    """(service, request function) for an API server on a free port, backed by the hashing embedder."""
+    (tmp_path / "images").mkdir()
+    retriever = Retriever(db_path=str(tmp_path / "db"), embedding_cache_dir=None, model=HashingEmbedder(dim=32))
+    retriever.db.add("text", "Vision transformers", "vision transformer image classification", "", "", "2024-01-01",
+                     retriever.get_text_embedding("vision transformer image classification"))
+    service = SearchService(retriever, image_root=str(tmp_path / "images"))
+    ApiHandler.service = service
+    ApiHandler.slots = threading.BoundedSemaphore(4)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ApiHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def request(method, path, body=None):
+        connection = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=10)
+        data = body if isinstance(body, (str, bytes)) or body is None else json.dumps(body)
+        connection.request(method, path, body=data)
+        response = connection.getresponse()
+        payload = json.loads(response.read() or b"null")
+        connection.close()
+        return response, payload
+
+    yield service, request
+    server.shutdown()
+    server.server_close()
+
+
+def test_search_returns_results(api):
+    _, request = api
+    response, payload = request("POST", "/search", {"query": "vision transformer", "top_k": 3})
+    assert response.status == 200
+    assert int(response.getheader("Content-Length")) > 0
+    assert payload["results"][0]["title"] == "Vision transformers"
+
+
+@pytest.mark.parametrize("body", [
+    "not json",
+    "[1, 2]",
+    {},
+    {"query": "x", "mode": "fuzzy"},
+    {"query": "x", "filters": {"colour": "red"}},
+    {"image_path": "/etc/passwd"},
+    {"image_path": "../outside.png"},
+])
+def test_bad_search_requests_get_400(api, body):
+    _, request = api
+    response, payload = request("POST", "/search", body)
+    assert response.status == 400
+    assert "error" in payload
+
+
+def test_bad_batch_and_item_requests_get_400(api):
+    _, request = api
+    assert request("POST", "/search/batch", {"queries": "vision"})[0].status == 400
+    assert request("POST", "/search/batch", {"queries": [{"query": "x"}, {}]})[0].status == 400
+    assert request("POST", "/items", {"type": "image", "title": "t", "image_path": "missing.png"})[0].status == 400
+
+
+def test_full_concurrency_slots_get_503(api):
+    _, request = api
+    ApiHandler.slots = threading.BoundedSemaphore(1)
+    ApiHandler.slots.acquire()
+    response, payload = request("POST", "/search", {"query": "vision"})
+    assert response.status == 503
+    assert response.getheader("Retry-After") == "1"
+
+
+def test_full_embedding_queue_gets_503(api, monkeypatch):
+    service, request = api
+
+    async def shed(*args):
+        raise QueueFullError("Embedding queue is full (0 requests waiting)")
+
+    monkeypatch.setattr(service.batcher, "embed_query", shed)
+    response, payload = request("POST", "/search", {"query": "vision"})
+    assert response.status == 503
+    assert "error" in payload
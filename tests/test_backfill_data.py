@@ -0,0 +1,58 @@
+import asyncio
+import json
+import os
+import sys
+
+# Make the project modules importable when running from the tests/ directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backfill_data import BackfillJournal, BatchedUpdater, item_outcome
+
+
+def test_resumed_journal_skips_done_items_and_tolerates_a_torn_line(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = BackfillJournal(path, resume=False)
+    journal.record([{"id": "a", "status": "done"}, {"id": "b", "status": "failed", "error": "timeout"}])
+    journal.record([{"id": "b", "status": "done"}, {"id": "c", "status": "failed"}])
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"id": "d", "sta')  # crash mid-write
+
+    resumed = BackfillJournal(path, resume=True)
+    assert resumed.done == {"a", "b"}
+    assert resumed.failed == {"c"}
+    resumed.close()
+    assert BackfillJournal(path, resume=False).done == set()
+
+
+def test_items_are_journaled_only_after_their_update_is_written(tmp_path):
+    class Db:
+        def __init__(self):
+            self.updates = []
+
+        def update_metadata(self, ids, metadatas):
+            assert not journal.done & set(ids)
+            self.updates.append(list(ids))
+
+    journal = BackfillJournal(str(tmp_path / "journal.jsonl"), resume=False)
+    db = Db()
+    updater = BatchedUpdater(db, journal, batch_size=2)
+
+    async def run():
+        for item_id in "xyz":
+            await updater.add(item_id, {"title": item_id})
+        assert journal.done == {"x", "y"}
+        await updater.flush()
+
+    asyncio.run(run())
+    assert db.updates == [["x", "y"], ["z"]]
+    assert journal.done == {"x", "y", "z"}
+
+
+def test_outcome_of_a_v1_record_is_upgraded():
+    metadata = {"type": "image-text", "title": "T", "content": "caption | /img/a.png", "date": "2024-01-01"}
+    status, _, _, new_metadata = item_outcome("1", metadata, "T", {"model_name": "ViT"})
+    assert status == "Updated"
+    assert (new_metadata["text"], new_metadata["image_path"]) == ("caption", "/img/a.png")
+    assert new_metadata["info_model_name"] == "ViT"
+    assert json.loads(new_metadata["extracted_info"]) == {"model_name": "ViT"}
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import numpy as np
+
+# Make the project modules importable when running from the tests/ directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_cache import EmbeddingCache
+
+
+def release(cache):
+    """Drops the directory lock, as a crashed process would."""
+    if cache._lock_file is not None:
+        cache._lock_file.close()
+
+
+def test_reused_row_is_not_served_under_the_evicted_key(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), capacity=2)
+    a, b, c = (np.full(4, value, dtype=np.float32) for value in (1.0, 2.0, 3.0))
+    cache.put("a", a)
+    cache.put("b", b)
+    cache.flush()
+    cache.put("c", c)  # evicts "a" and rewrites its row; the index on disk still maps "a" there
+    release(cache)
+
+    reopened = EmbeddingCache(str(tmp_path), capacity=2)
+    assert reopened.get("a") is None
+    np.testing.assert_array_equal(reopened.get("b"), b)
+    # "c" was never flushed, so its row is free again rather than owned by a stale key
+    assert reopened.get("c") is None
+    assert len(reopened.free_rows) == 1
+
+
+def test_second_process_gets_a_disabled_cache(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), capacity=2)
+    other = EmbeddingCache(str(tmp_path), capacity=2)
+    assert not cache.disabled and other.disabled
+    other.put("a", np.ones(4))
+    assert other.get("a") is None
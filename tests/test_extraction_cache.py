@@ -0,0 +1,41 @@
+import os
+import sys
+
+# Make the project modules importable when running from the tests/ directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extraction_cache import ExtractionCache
+
+
+def table_totals(cache):
+    return cache._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions").fetchone()
+
+
+def test_evicts_least_recently_used_entries(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache.sqlite"), max_entries=3)
+    for key in "abc":
+        cache.put(key, {"model_name": key})
+    assert cache.get("a") is not None  # "b" is now the least recently used
+    cache.put("d", {"model_name": "d"})
+
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in "acd")
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert (stats["entries"], stats["bytes"]) == table_totals(cache)
+
+
+def test_byte_bound_and_overwrites_keep_the_totals_exact(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ExtractionCache(path, max_bytes=100)
+    for i in range(10):
+        cache.put(f"k{i}", {"text": "x" * 20})
+    cache.put("k9", {"text": "y"})
+    assert cache.stats()["bytes"] <= 100
+    assert (cache.stats()["entries"], cache.stats()["bytes"]) == table_totals(cache)
+
+    cache.put("error", {"error": "timeout"})
+    cache.close()
+    reopened = ExtractionCache(path, max_bytes=100)
+    assert (reopened.stats()["entries"], reopened.stats()["bytes"]) == table_totals(reopened)
+    assert reopened.get("error") is None
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import numpy as np
+
+# Make the project modules importable when running from the tests/ directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from metadata_schema import SCHEMA_VERSION, build_where, date_timestamp
+from migrate_metadata import migrate
+
+
+def test_date_only_date_to_includes_the_whole_day():
+    where = build_where({"date_to": "2025-06-30"})
+    assert where == {"date_ts": {"$lt": date_timestamp("2025-07-01")}}
+
+
+def test_date_to_with_a_time_is_an_inclusive_bound():
+    where = build_where({"date_to": "2025-06-30T12:00"})
+    assert where == {"date_ts": {"$lte": date_timestamp("2025-06-30T12:00")}}
+
+
+def test_date_to_matches_items_later_that_day(tmp_path):
+    db = Database(path=str(tmp_path))
+    rng = np.random.default_rng(0)
+    for i, date in enumerate(["2025-06-30T10:00", "2025-06-30T23:59:59", "2025-07-01T00:00"]):
+        db.add("text", f"Item {i}", "text", "", "", date, rng.standard_normal(8))
+    results = db.query(rng.standard_normal(8), top_k=5, filters={"date_from": "2025-06-30", "date_to": "2025-06-30"})
+    assert sorted(m["date"] for m in results["metadatas"][0]) == ["2025-06-30T10:00", "2025-06-30T23:59:59"]
+
+
+def test_migration_clears_legacy_content(tmp_path):
+    db = Database(path=str(tmp_path))
+    db.collection.add(ids=["v1"], embeddings=[[1.0, 0.0, 0.0]],
+                      metadatas=[{"type": "text", "title": "Old", "content": "legacy text", "date": "2024-01-01"}])
+    migrate(str(tmp_path), "retrieval_collection", page_size=10, dry_run=False)
+    metadata = db.collection.get(ids=["v1"], include=["metadatas"])["metadatas"][0]
+    assert metadata["text"] == "legacy text"
+    assert metadata["content"] == ""
+    assert metadata["schema_version"] == SCHEMA_VERSION
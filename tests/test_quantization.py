@@ -0,0 +1,53 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Make the project modules importable when running from the tests/ directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import FlatBackend, QuantizedBackend
+from quantization import ProductQuantizer, ScalarInt8Quantizer
+from vector_store import FlatVectorStore
+
+
+def make_store(path, n=600, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    store = FlatVectorStore(str(path))
+    store.append([str(i) for i in range(n)], rng.standard_normal((n, dim)))
+    return store, rng
+
+
+@pytest.mark.parametrize("quantizer", [ScalarInt8Quantizer, lambda: ProductQuantizer(n_subspaces=4, n_iter=5)])
+def test_quantized_recall_matches_exact_search(tmp_path, quantizer):
+    store, rng = make_store(tmp_path / "store")
+    backend = QuantizedBackend(store, quantizer(), train_size=500, rerank_k=50)
+    queries = rng.standard_normal((20, 16))
+    exact = FlatBackend(store).search(queries, 10)['ids']
+    found = backend.search(queries, 10)['ids']
+    recall = np.mean([len(set(e) & set(f)) / 10 for e, f in zip(exact, found)])
+    assert recall >= 0.9
+
+
+def test_saved_index_is_reused_and_caught_up(tmp_path, monkeypatch):
+    store, rng = make_store(tmp_path / "store")
+    index_path = str(tmp_path / "index")
+    QuantizedBackend(store, ScalarInt8Quantizer(), train_size=500, path=index_path)
+
+    store.append(["new"], rng.standard_normal((1, 16)))
+    store.delete(["0"])
+    monkeypatch.setattr(ScalarInt8Quantizer, "train", lambda self, vectors: pytest.fail("retrained"))
+    reopened = QuantizedBackend(FlatVectorStore(str(tmp_path / "store")), ScalarInt8Quantizer(),
+                                train_size=500, path=index_path)
+    assert sorted(reopened.ids) == sorted(store.locations)
+    assert reopened.search(store.get_vectors(["new"]), 1)['ids'] == [["new"]]
+
+
+def test_saved_index_with_other_settings_is_retrained(tmp_path):
+    store, _ = make_store(tmp_path / "store")
+    index_path = str(tmp_path / "index")
+    QuantizedBackend(store, ProductQuantizer(n_subspaces=4, n_iter=2), train_size=500, path=index_path)
+    reopened = QuantizedBackend(store, ProductQuantizer(n_subspaces=8, n_iter=2), train_size=500, path=index_path)
+    assert reopened.quantizer.centroids.shape[0] == 8
+    assert len(reopened.ids) == len(store)
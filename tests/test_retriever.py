@@ -0,0 +1,22 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Make the project modules importable when running from the tests/ directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import retriever
+from embedding_cache import content_payload
+
+
+def test_cache_hit_does_not_load_a_lazy_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(retriever, "load_model", lambda *args, **kwargs: pytest.fail("model loaded"))
+    r = retriever.Retriever(db_path=str(tmp_path / "db"), embedding_cache_dir=str(tmp_path / "cache"),
+                            lazy_load=True)
+    cached = np.arange(8, dtype=np.float32)
+    r.embedding_cache.put(r._cache_key('text', content_payload('text', "hello"), False, None), cached)
+
+    np.testing.assert_array_equal(r.get_text_embedding("hello"), cached)
+    np.testing.assert_array_equal(r.get_text_embeddings(["hello"]), cached[np.newaxis, :])
@@ -0,0 +1,109 @@
+import os
+import sys
+import threading
+
+import numpy as np
+
+# Make the project modules importable when running from the tests/ directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import Database, FlatBackend
+from vector_store import FlatVectorStore
+
+
+def unit_rows(rng, n, dim=8):
+    rows = rng.standard_normal((n, dim)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def test_reopen_truncates_rows_past_the_manifest(tmp_path):
+    rng = np.random.default_rng(0)
+    store = FlatVectorStore(str(tmp_path))
+    vectors = unit_rows(rng, 3)
+    store.append(["a", "b", "c"], vectors)
+    segment = store.segments[-1]
+
+    # A write that crashed before its manifest commit leaves torn bytes behind
+    with open(segment.vectors_file, "ab") as f:
+        f.write(b"\x01" * 11)
+    with open(segment.ids_file, "ab") as f:
+        f.write(b"torn")
+
+    reopened = FlatVectorStore(str(tmp_path))
+    assert len(reopened) == 3
+    assert os.path.getsize(segment.vectors_file) == 3 * 8 * 2
+    reopened.append(["d"], unit_rows(rng, 1))
+    reopened = FlatVectorStore(str(tmp_path))
+    assert reopened.segments[-1].ids == ["a", "b", "c", "d"]
+    np.testing.assert_allclose(reopened.get_vectors(["a", "b", "c"]), vectors, atol=1e-3)
+
+
+def test_tombstones_survive_compaction_and_reopen(tmp_path):
+    rng = np.random.default_rng(1)
+    store = FlatVectorStore(str(tmp_path), segment_rows=4, compact_ratio=1.0)
+    ids = [str(i) for i in range(10)]
+    store.append(ids, unit_rows(rng, 10))
+    store.delete(["1", "2"])
+    store.compact()
+    store.delete(["3"])
+    readded = unit_rows(rng, 1)
+    store.append(["2"], readded)
+
+    reopened = FlatVectorStore(str(tmp_path), segment_rows=4, compact_ratio=1.0)
+    assert sorted(reopened.locations) == sorted(set(ids) - {"1", "3"})
+    np.testing.assert_allclose(reopened.get_vectors(["2"]), readded, atol=1e-3)
+    assert not os.path.exists(os.path.join(str(tmp_path), "seg-000000.f16"))
+
+
+def test_search_during_compaction(tmp_path):
+    rng = np.random.default_rng(2)
+    store = FlatVectorStore(str(tmp_path), segment_rows=256, compact_ratio=0.3)
+    backend = FlatBackend(store, block_rows=64)
+    ids = [str(i) for i in range(1000)]
+    store.append(ids, unit_rows(rng, 1000, 16))
+
+    errors, stop = [], threading.Event()
+
+    def reader(seed):
+        query_rng = np.random.default_rng(seed)
+        while not stop.is_set():
+            try:
+                results = backend.search(query_rng.standard_normal((2, 16)), 5)
+                assert all(len(found) == 5 for found in results["ids"])
+                assert store.get_vectors(ids[-10:]).shape == (10, 16)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=reader, args=(seed,)) for seed in range(4)]
+    for thread in threads:
+        thread.start()
+    for _ in range(20):
+        # Rewriting 40% of the ids pushes the dead fraction over the ratio every other round
+        store.append(ids[:400], unit_rows(rng, 400, 16))
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    assert store.generation > 0
+    assert errors == []
+
+
+def test_store_is_synced_only_when_the_counts_differ(tmp_path, monkeypatch):
+    rng = np.random.default_rng(3)
+    calls = []
+    sync = database.sync_store_with_collection
+    monkeypatch.setattr(database, "sync_store_with_collection", lambda *args: calls.append(1) or sync(*args))
+
+    chroma_db = Database(path=str(tmp_path))
+    chroma_db.add("text", "a", "a", "", "", "2025-01-01", rng.standard_normal(8))
+    assert len(Database(path=str(tmp_path), backend="flat").backend) == 1
+    assert len(calls) == 1
+
+    flat_db = Database(path=str(tmp_path), backend="flat")
+    flat_db.add("text", "b", "b", "", "", "2025-01-01", rng.standard_normal(8))
+    assert len(Database(path=str(tmp_path), backend="flat").backend) == 2
+    assert len(calls) == 1
+
+    Database(path=str(tmp_path), backend="flat", full_sync=True)
+    assert len(calls) == 2
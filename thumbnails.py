@@ -0,0 +1,115 @@
+import base64
+import hashlib
+import os
+import threading
+
+from PIL import Image, ImageOps
+
+# Output formats: keep transparency as PNG/WebP, everything else becomes JPEG
+MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp", "GIF": "image/gif"}
+EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}
+
+
+def image_mime_type(image_path):
+    """MIME type from the image's actual format (not its file extension), or None if unreadable."""
+    try:
+        with Image.open(image_path) as img:
+            return MIME_TYPES.get(img.format, Image.MIME.get(img.format))
+    except (OSError, ValueError):
+        return None
+
+
+def file_content_hash(image_path):
+    digest = hashlib.sha256()
+    with open(image_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ThumbnailCache:
+    """
+    On-disk thumbnail cache keyed by the source image's content hash.
+
+    Thumbnails live in `path` as `<sha256>-<max_side>.<ext>`, so identical images share one
+    file and editing an image produces a new key. The (path, size, mtime) -> hash lookups
+    are memoized, so repeated searches do not re-read the original files.
+    """
+
+    def __init__(self, path="./thumbnails", max_side=512, jpeg_quality=85):
+        self.path = path
+        self.max_side = max_side
+        self.jpeg_quality = jpeg_quality
+        os.makedirs(path, exist_ok=True)
+        self._hashes = {}  # (abs path, size, mtime_ns) -> content hash
+        self._lock = threading.Lock()
+        self.created = 0
+        self.hits = 0
+
+    def content_hash(self, image_path):
+        st = os.stat(image_path)
+        stat_key = (os.path.abspath(image_path), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            digest = self._hashes.get(stat_key)
+        if digest is None:
+            digest = file_content_hash(image_path)
+            with self._lock:
+                self._hashes[stat_key] = digest
+        return digest
+
+    def _existing(self, digest):
+        for ext in EXTENSIONS.values():
+            candidate = os.path.join(self.path, f"{digest}-{self.max_side}{ext}")
+            if os.path.exists(candidate):
+                return candidate
+        return None
+
+    def get(self, image_path):
+        """Returns the thumbnail file for `image_path`, creating it on first use. None if the image is unreadable."""
+        try:
+            digest = self.content_hash(image_path)
+        except OSError:
+            return None
+        existing = self._existing(digest)
+        if existing is not None:
+            self.hits += 1
+            return existing
+        try:
+            return self._create(image_path, digest)
+        except (OSError, ValueError) as e:
+            print(f"Error creating thumbnail for {image_path}: {e}")
+            return None
+
+    def _create(self, image_path, digest):
+        with Image.open(image_path) as img:
+            img = ImageOps.exif_transpose(img)  # also loads the first frame of animated images
+            img.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+            has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+            if has_alpha:
+                fmt, img = "PNG", img.convert("RGBA")
+            else:
+                fmt, img = "JPEG", img.convert("RGB")
+            target = os.path.join(self.path, f"{digest}-{self.max_side}{EXTENSIONS[fmt]}")
+            tmp_file = f"{target}.{threading.get_ident()}.tmp"
+            save_options = {"quality": self.jpeg_quality, "optimize": True} if fmt == "JPEG" else {"optimize": True}
+            img.save(tmp_file, format=fmt, **save_options)
+        os.replace(tmp_file, target)
+        self.created += 1
+        return target
+
+    def data_uri(self, image_path):
+        """Small inline preview as a data URI with the thumbnail's real MIME type, or '' on failure."""
+        thumbnail = self.get(image_path)
+        if thumbnail is None:
+            return ""
+        fmt = next(f for f, ext in EXTENSIONS.items() if thumbnail.endswith(ext))
+        with open(thumbnail, "rb") as f:
+            return f"data:{MIME_TYPES[fmt]};base64,{base64.b64encode(f.read()).decode()}"
+
+    def url(self, image_path, prefix):
+        """URL of the thumbnail file under a static-file route such as Gradio's `/gradio_api/file=`."""
+        thumbnail = self.get(image_path)
+        return f"{prefix}{os.path.abspath(thumbnail)}" if thumbnail else ""
+
+    def stats(self):
+        return {"created": self.created, "hits": self.hits, "hashed_files": len(self._hashes)}
@@ -0,0 +1,243 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_HELP = {
+    "gme_span_duration_seconds": "Duration of an instrumented stage.",
+    "gme_span_errors_total": "Instrumented stages that raised.",
+    "gme_request_duration_seconds": "End-to-end duration of a traced request.",
+    "gme_requests_total": "Traced requests by outcome.",
+}
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms keyed by metric name and label set."""
+
+    def __init__(self):
+        self.counters = {}  # name -> {labels tuple: value}
+        self.histograms = {}  # name -> {labels tuple: Histogram}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{format_labels(labels)} {value:g}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f"{name}_bucket{format_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+registry = MetricsRegistry()
+
+_enabled = os.environ.get("GME_TRACING", "") not in ("", "0")
+_trace_log_path = os.environ.get("GME_TRACE_LOG") or None
+_trace_log_lock = threading.Lock()
+_current_trace = contextvars.ContextVar("gme_current_trace", default=None)
+
+
+def configure(enabled=True, trace_log=None):
+    """
+    Turns recording on or off. With `trace_log`, every finished request trace is appended
+    to that file as one JSON line. Also settable through GME_TRACING=1 and GME_TRACE_LOG.
+    """
+    global _enabled, _trace_log_path
+    _enabled = enabled
+    _trace_log_path = trace_log
+
+
+def is_enabled():
+    return _enabled
+
+
+class _NoopScope:
+    """Returned while tracing is disabled, so an instrumented block costs one flag check."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopScope()
+
+
+class Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        registry.observe("gme_span_duration_seconds", duration, span=self.name)
+        if exc_type is not None:
+            registry.inc("gme_span_errors_total", span=self.name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append({
+                "span": self.name,
+                "start_ms": round((self.start - trace.start) * 1000, 3),
+                "ms": round(duration * 1000, 3),
+                "thread": threading.current_thread().name,
+            })
+        return False
+
+
+class RequestTrace:
+    """Spans recorded while one request is handled, in the context that handles it."""
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.id = uuid.uuid4().hex[:16]
+        self.attributes = attributes
+        self.spans = []
+        self.start = time.perf_counter()
+        self._token = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self._token = _current_trace.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        _current_trace.reset(self._token)
+        status = "error" if exc_type is not None else "ok"
+        registry.observe("gme_request_duration_seconds", duration, request=self.name)
+        registry.inc("gme_requests_total", request=self.name, status=status)
+        if _trace_log_path:
+            record = {"trace_id": self.id, "request": self.name, "status": status, "time": time.time(),
+                      "total_ms": round(duration * 1000, 3), "attributes": self.attributes, "spans": self.spans}
+            line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+            with _trace_log_lock, open(_trace_log_path, "a", encoding="utf-8") as f:
+                f.write(line)
+        return False
+
+
+def span(name):
+    """Context manager timing one stage into `gme_span_duration_seconds{span=name}` and the current trace."""
+    return Span(name) if _enabled else _NOOP
+
+
+def trace_request(name, **attributes):
+    """Context manager collecting the spans of one request. Spans in threads started with
+    `asyncio.to_thread` (which copies the context) are included; those on other executors are only counted."""
+    return RequestTrace(name, attributes) if _enabled else _NOOP
+
+
+def traced(name, request=False):
+    """Decorator form of `span` (or of `trace_request` with `request=True`) for sync and async functions."""
+    scope = trace_request if request else span
+
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with scope(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with scope(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def prometheus_text():
+    return registry.render()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve_metrics(port, host="0.0.0.0"):
+    """Serves `GET /metrics` from a daemon thread. Returns the server."""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"Prometheus metrics at http://{host}:{port}/metrics")
+    return server
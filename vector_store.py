@@ -0,0 +1,302 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+
+class Segment:
+    """One append-only segment: a raw float16 vector file plus an ids sidecar (one id per row)."""
+
+    def __init__(self, directory, name, dim, count):
+        self.name = name
+        self.vectors_file = os.path.join(directory, f"{name}.f16")
+        self.ids_file = os.path.join(directory, f"{name}.ids")
+        self.dim = dim
+        self.count = count
+        self.ids = []
+        self.ids_bytes = 0  # length of the committed part of the ids file
+        self.live = np.zeros(0, dtype=bool)
+        self.vectors = None
+
+    def open(self):
+        """Maps the first `count` rows read-only and cuts off rows past the manifest count."""
+        with open(self.ids_file, "rb") as f:
+            lines = f.read().split(b"\n")[:self.count]
+        self.ids = [line.decode("utf-8") for line in lines]
+        self.ids_bytes = sum(len(line) + 1 for line in lines)
+        self.live = np.ones(self.count, dtype=bool)
+        self._truncate()
+        self._map()
+
+    def _truncate(self):
+        """Drops bytes past the committed rows, left by a write that crashed before its manifest commit."""
+        for path, size in ((self.vectors_file, self.count * self.dim * 2), (self.ids_file, self.ids_bytes)):
+            if os.path.getsize(path) > size:
+                os.truncate(path, size)
+
+    def _map(self, count=None):
+        count = self.count if count is None else count
+        if count == 0:
+            self.vectors = np.zeros((0, self.dim), dtype=np.float16)
+        else:
+            self.vectors = np.memmap(self.vectors_file, dtype=np.float16, mode="r", shape=(count, self.dim))
+
+    def append(self, ids, vectors):
+        # Appending after torn bytes would shift the new rows away from their ids
+        self._truncate()
+        with open(self.vectors_file, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float16).tobytes())
+        ids_data = "".join(f"{item_id}\n" for item_id in ids).encode("utf-8")
+        with open(self.ids_file, "ab") as f:
+            f.write(ids_data)
+        self.ids_bytes += len(ids_data)
+        # Readers scan up to `count` without the store lock, so the rows, ids and live
+        # flags must all be in place before the new count is published
+        self._map(self.count + len(ids))
+        self.ids.extend(ids)
+        self.live = np.concatenate([self.live, np.ones(len(ids), dtype=bool)])
+        self.count += len(ids)
+
+    def remove_files(self):
+        for path in (self.vectors_file, self.ids_file):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class FlatVectorStore:
+    """
+    Native on-disk vector store made of append-only float16 segments.
+
+    Layout of `path`:
+      - `manifest.json`: embedding width and the committed row count of every segment.
+      - `seg-NNNNNN.f16` / `seg-NNNNNN.ids`: raw vectors and their ids, row for row.
+      - `deletes.jsonl`: tombstones, each killing every earlier row of an id.
+
+    Segments are opened with `np.memmap`, so startup reads no vector data and several
+    processes opening the same store share one copy in the page cache. Overwriting an
+    id appends a new row; `compact` rewrites only the live rows once enough are dead.
+    """
+
+    def __init__(self, path, segment_rows=65536, compact_ratio=0.3):
+        self.path = path
+        self.segment_rows = segment_rows
+        self.compact_ratio = compact_ratio
+        self.manifest_file = os.path.join(path, "manifest.json")
+        self.deletes_file = os.path.join(path, "deletes.jsonl")
+        os.makedirs(path, exist_ok=True)
+
+        self.dim = None
+        self.segments = []
+        self.next_segment = 0
+        self.generation = 0  # bumped by every compaction
+        self.locations = {}  # id -> (segment index, row)
+        self._unlink_pending = []  # compacted-away segments whose files could not be removed yet
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.manifest_file):
+            return
+        with open(self.manifest_file, "r") as f:
+            manifest = json.load(f)
+        self.dim = manifest["dim"]
+        self.next_segment = manifest["next_segment"]
+        self.generation = manifest["generation"]
+        for entry in manifest["segments"]:
+            segment = Segment(self.path, entry["name"], self.dim, entry["count"])
+            segment.open()
+            self.segments.append(segment)
+        # Files of segments compacted away before a crash, or whose removal was deferred.
+        # Numbers from `next_segment` on may belong to a segment another writer is creating.
+        names = {segment.name for segment in self.segments}
+        stale = {f"seg-{number:06d}" for number in range(self.next_segment)} - names
+        for file_name in os.listdir(self.path):
+            stem, ext = os.path.splitext(file_name)
+            if stem in stale and ext in (".f16", ".ids"):
+                try:
+                    os.remove(os.path.join(self.path, file_name))
+                except OSError:
+                    pass
+
+        # Later rows of the same id supersede earlier ones
+        for seg_index, segment in enumerate(self.segments):
+            for row, item_id in enumerate(segment.ids):
+                previous = self.locations.get(item_id)
+                if previous is not None:
+                    self.segments[previous[0]].live[previous[1]] = False
+                self.locations[item_id] = (seg_index, row)
+
+        if os.path.exists(self.deletes_file):
+            with open(self.deletes_file, "r") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    tombstone = json.loads(line)
+                    if tombstone["generation"] != self.generation:
+                        continue  # Written before a compaction that already dropped the row
+                    location = self.locations.get(tombstone["id"])
+                    if location is not None and tuple(location) < tuple(tombstone["before"]):
+                        self.segments[location[0]].live[location[1]] = False
+                        del self.locations[tombstone["id"]]
+
+    def _write_manifest(self):
+        tmp_file = self.manifest_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump({
+                "dim": self.dim,
+                "next_segment": self.next_segment,
+                "generation": self.generation,
+                "segments": [{"name": s.name, "count": s.count} for s in self.segments],
+            }, f)
+        os.replace(tmp_file, self.manifest_file)
+
+    def _new_segment(self):
+        segment = Segment(self.path, f"seg-{self.next_segment:06d}", self.dim, 0)
+        self.next_segment += 1
+        # Start from empty files in case a crashed write left bytes behind
+        segment.remove_files()
+        open(segment.vectors_file, "wb").close()
+        open(segment.ids_file, "w").close()
+        self.segments.append(segment)
+        return segment
+
+    def append(self, ids, embeddings):
+        """Appends L2-normalized rows; an id that already exists is superseded by its new row."""
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.maximum(norms, 1e-12)
+        ids = list(ids)
+        with self._lock:
+            if self.dim is None:
+                self.dim = embeddings.shape[1]
+            elif embeddings.shape[1] != self.dim:
+                raise ValueError(f"Embedding has dimension {embeddings.shape[1]}, store holds {self.dim}")
+
+            self._append_rows(ids, embeddings)
+            # Committing the new counts is what makes the appended rows visible after a restart
+            self._write_manifest()
+        self.maybe_compact()
+
+    def delete(self, ids):
+        with self._lock:
+            tombstones = []
+            for item_id in ids:
+                location = self.locations.pop(item_id, None)
+                if location is None:
+                    continue
+                self.segments[location[0]].live[location[1]] = False
+                # Kills every row written so far, but not rows appended after this delete
+                last = self.segments[-1]
+                tombstones.append({
+                    "id": item_id,
+                    "generation": self.generation,
+                    "before": [len(self.segments) - 1, last.count],
+                })
+            if tombstones:
+                with open(self.deletes_file, "a") as f:
+                    f.write("".join(json.dumps(t) + "\n" for t in tombstones))
+        self.maybe_compact()
+
+    def __len__(self):
+        return len(self.locations)
+
+    def __contains__(self, item_id):
+        return item_id in self.locations
+
+    def get_vectors(self, ids):
+        """Returns the live vectors of `ids` as an (N, D) float32 array, reading only those rows."""
+        with self._lock:
+            locations = [self.locations[item_id] for item_id in ids]
+            segments = self.segments
+        vectors = np.empty((len(locations), self.dim or 0), dtype=np.float32)
+        for i, (seg_index, row) in enumerate(locations):
+            vectors[i] = segments[seg_index].vectors[row]
+        return vectors
+
+    def iter_live(self, block_rows=16384):
+        """Yields (ids, float16 vectors) for the live rows, one block at a time."""
+        with self._lock:
+            segments = list(self.segments)
+        return self._iter_segments_live(segments, block_rows)
+
+    def _iter_segments_live(self, segments, block_rows=16384):
+        for segment in segments:
+            for start in range(0, segment.count, block_rows):
+                end = min(start + block_rows, segment.count)
+                rows = np.flatnonzero(segment.live[start:end]) + start
+                if len(rows):
+                    yield [segment.ids[row] for row in rows], np.asarray(segment.vectors[rows])
+
+    def position(self):
+        """(segment index, row) where the next appended row will land in the current generation."""
+        with self._lock:
+            if not self.segments:
+                return (0, 0)
+            return (len(self.segments) - 1, self.segments[-1].count)
+
+    def iter_live_since(self, position, block_rows=16384):
+        """Yields (ids, float16 vectors) for the live rows appended at or after `position`."""
+        with self._lock:
+            segments = list(self.segments)
+        first_segment, first_row = position
+        for seg_index in range(first_segment, len(segments)):
+            segment = segments[seg_index]
+            start_row = first_row if seg_index == first_segment else 0
+            for start in range(start_row, segment.count, block_rows):
+                end = min(start + block_rows, segment.count)
+                rows = np.flatnonzero(segment.live[start:end]) + start
+                if len(rows):
+                    yield [segment.ids[row] for row in rows], np.asarray(segment.vectors[rows])
+
+    def total_rows(self):
+        return sum(segment.count for segment in self.segments)
+
+    def maybe_compact(self):
+        """Compacts when the fraction of dead rows exceeds `compact_ratio`."""
+        total = self.total_rows()
+        if total and (total - len(self)) / total > self.compact_ratio:
+            self.compact()
+
+    def compact(self):
+        """
+        Rewrites the live rows into fresh segments and drops the old files and tombstones.
+
+        The new segments replace the old ones under the lock, so a reader sees either set
+        in full. Readers still scanning an old snapshot keep their segment objects and
+        memmaps, which stay readable after the files are unlinked; where the OS refuses
+        to delete a mapped file, removal is retried at the next compaction or open.
+        """
+        with self._lock:
+            old_segments = self.segments
+            self.segments = []
+            self.locations = {}
+            for ids, vectors in self._iter_segments_live(old_segments):
+                self._append_rows(ids, vectors)
+            self.generation += 1
+            self._write_manifest()
+            if os.path.exists(self.deletes_file):
+                os.remove(self.deletes_file)
+            pending, self._unlink_pending = self._unlink_pending + old_segments, []
+            for segment in pending:
+                try:
+                    segment.remove_files()
+                except OSError:
+                    self._unlink_pending.append(segment)
+
+    def _append_rows(self, ids, vectors):
+        start = 0
+        while start < len(ids):
+            segment = self.segments[-1] if self.segments else None
+            if segment is None or segment.count >= self.segment_rows:
+                segment = self._new_segment()
+            end = min(len(ids), start + self.segment_rows - segment.count)
+            seg_index = len(self.segments) - 1
+            first_row = segment.count
+            segment.append(ids[start:end], vectors[start:end])
+            for offset, item_id in enumerate(ids[start:end]):
+                previous = self.locations.get(item_id)
+                if previous is not None:
+                    self.segments[previous[0]].live[previous[1]] = False
+                self.locations[item_id] = (seg_index, first_row + offset)
+            start = end